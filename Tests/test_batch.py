@@ -0,0 +1,85 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+from io import StringIO
+
+from pysmell.batch import completeBatch, completeMain
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        self.path = os.path.join(self.directory, 'Other.py')
+        open(self.path, 'w').write('x = 1\nbc\n')
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        shutil.rmtree(self.directory)
+
+
+    def batch(self, *requests):
+        output = StringIO()
+        counts = completeBatch(StringIO('\n'.join(requests) + '\n'), output)
+        return counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+    def testBatch(self):
+        noTags = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, noTags)
+        counts, responses = self.batch(
+            json.dumps({'id': 1, 'path': self.path, 'positions': [{'line': 2, 'column': 2}, {'line': 2, 'column': 1}]}),
+            json.dumps({'id': 2, 'path': self.path, 'source': 'x.bc', 'limit': 1,
+                        'positions': [{'line': 1, 'column': 4}, {'line': 3, 'column': 0}]}),
+            '',
+            json.dumps({'id': 3, 'path': os.path.join(self.directory, 'NotThere.py'), 'positions': []}),
+            'not json',
+            json.dumps({'id': 4, 'path': os.path.join(noTags, 'x.py'), 'source': 'b',
+                        'positions': [{'line': 1, 'column': 1}]}))
+        self.assertEqual(counts, (4, 5))
+        self.assertEqual([response['id'] for response in responses], [1, 2, 3, None, 4])
+
+        first = responses[0]['results']
+        self.assertEqual([completion['word'] for completion in first[0]['completions']], ['bconst'])
+        self.assertEqual(first[0]['start'], 0)
+        self.assertEqual([completion['word'] for completion in first[1]['completions']], ['b', 'bconst'])
+
+        second = responses[1]['results']
+        self.assertEqual(len(second[0]['completions']), 1)
+        self.assertEqual(second[0]['start'], 2)
+        self.assertEqual(second[1], {'completions': [], 'start': 0})
+
+        self.assertTrue(responses[2]['error'].startswith('FileNotFoundError'))
+        self.assertTrue(responses[3]['error'].startswith('invalid request'))
+        self.assertEqual(responses[4]['results'], [{'completions': [], 'start': 0}])
+
+
+    def testMain(self):
+        requests = os.path.join(self.directory, 'requests.jsonl')
+        open(requests, 'w').write(json.dumps({'id': 1, 'path': self.path, 'positions': [{'line': 2, 'column': 2}]}))
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        completeMain(['--batch', requests])
+        self.assertEqual(json.loads(sys.stdout.getvalue())['results'][0]['completions'][0]['word'], 'bconst')
+        report = sys.stderr.getvalue().splitlines()[-1]
+        self.assertTrue(report.startswith('1 positions in 1 files, '))
+        self.assertTrue(report.endswith(' positions/s'))
+
+        sys.stdout = StringIO()
+        completeMain([self.path, '2', '1', '-m', 'case-sensitive'])
+        self.assertEqual(sys.stdout.getvalue(), 'b\nbconst\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+from pysmell.benchload import benchLoad, benchLoadMain, openTags, sampleQueries
+from pysmell.sections import writeSections, SectionedTags
+from pysmell.tagsfile import PICKLE, SECTIONED
+from pysmell.outputHandlers.ShardedOut import ShardedOut
+from pysmell.outputHandlers.PickleOut import PickleOut
+from pysmell import tags
+
+
+class BenchLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant', 'Module.bconst'],
+                'FUNCTIONS' : [('Module.b', ['arg'], '')],
+                'CLASSES' : {
+                    'Module.aClass': {
+                        'constructor': [],
+                        'bases': ['object'],
+                        'properties': ['aprop'],
+                        'methods': [('am', ['self'], '')],
+                    },
+                    'Module.bClass': {
+                        'constructor': [],
+                        'bases': ['Module.aClass'],
+                        'properties': ['bprop'],
+                        'methods': [('bm', ['self'], '')],
+                    },
+                },
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {},
+            }
+        self.directory = tempfile.mkdtemp()
+        self.tagsPath = os.path.join(self.directory, 'PYSMELLTAGS')
+        tags.FORMATS[PICKLE](self.tagsPath).write(self.pysmelldict)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testOpenTags(self):
+        self.assertEqual(openTags(self.tagsPath), (PICKLE, self.pysmelldict))
+        sectioned = os.path.join(self.directory, 'sectioned')
+        writeSections(sectioned, self.pysmelldict)
+        tagsFormat, PYSMELLDICT = openTags(sectioned)
+        self.assertEqual(tagsFormat, SECTIONED)
+        self.assertTrue(isinstance(PYSMELLDICT, SectionedTags))
+
+
+    def testOpenTagsReadsOnce(self):
+        from pysmell import benchload
+        from pysmell.tagslog import appendToLog, splitByModule
+        appendToLog(self.tagsPath, splitByModule({'CONSTANTS': ['Other.LOGGED'], 'FUNCTIONS': [], 'CLASSES': {},
+                                                  'HIERARCHY': ['Other'], 'POINTERS': {}}))
+        loaded = []
+        original = benchload.loadTags
+        def loadTags(path):
+            loaded.append(path)
+            return original(path)
+        benchload.loadTags = loadTags
+        try:
+            tagsFormat, PYSMELLDICT = openTags(self.tagsPath)
+        finally:
+            benchload.loadTags = original
+        self.assertEqual(loaded, [self.tagsPath])
+        self.assertEqual(tagsFormat, PICKLE)
+        self.assertTrue('Other.LOGGED' in PYSMELLDICT['CONSTANTS'])
+
+
+    def testSampleQueries(self):
+        queries = sampleQueries(self.pysmelldict)
+        self.assertEqual([query['type'] for query in queries], ['TOPLEVEL', 'INSTANCE', 'INSTANCE', 'MODULE'])
+        self.assertEqual(queries[2]['options']['klass'], 'Module.aClass')
+
+
+    def testBenchLoad(self):
+        queries = [{'type': 'TOPLEVEL', 'base': 'b'},
+                   {'type': 'INSTANCE', 'base': '', 'options': {'klass': 'Module.bClass', 'parents': []}}]
+        results = benchLoad(self.tagsPath, queries, repeat=2)
+        self.assertEqual(results['format'], PICKLE)
+        self.assertEqual(results['bytes'], os.path.getsize(self.tagsPath))
+        self.assertEqual(sorted(results['load']), ['cold', 'warm'])
+        self.assertEqual([query['results'] for query in results['queries']], [3, 4])
+        self.assertEqual(json.loads(json.dumps(results)), results)
+
+
+    def testShardedTags(self):
+        ShardedOut(self.tagsPath, PickleOut).write(self.pysmelldict)
+        queries = [{'type': 'TOPLEVEL', 'base': 'b'}]
+        results = benchLoad(self.tagsPath, queries, repeat=1)
+        self.assertEqual(results['queries'][0]['results'], 3)
+        self.assertEqual(results['queries'][0]['shardsLoaded'], 1)
+        self.assertEqual(results['shards']['count'], 1)
+        rate = results['shards']['filters']['PYSMELLTAGS.Module']['falsePositiveRate']
+        self.assertTrue(0 <= rate < 0.1, rate)
+
+
+    def testOutputIsAppended(self):
+        output = os.path.join(self.directory, 'results')
+        benchLoadMain([self.tagsPath, '-r', '1', '-o', output])
+        benchLoadMain([self.tagsPath, '-r', '1', '-o', output])
+        lines = open(output).read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['format'], PICKLE)
+
+
+if __name__ == '__main__':
+    unittest.main()
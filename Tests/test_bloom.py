@@ -0,0 +1,48 @@
+import unittest
+
+from pysmell.bloom import filterFor, fromTuple, shardKeys, moduleKey, nameKey, prefixKey
+
+
+class BloomTest(unittest.TestCase):
+    def testNoFalseNegatives(self):
+        keys = ['name:%d' % i for i in range(1000)]
+        bloom = filterFor(keys)
+        for key in keys:
+            self.assertTrue(key in bloom)
+
+
+    def testFalsePositiveRate(self):
+        bloom = filterFor(['name:%d' % i for i in range(1000)], falsePositiveRate=0.01)
+        falsePositives = len([i for i in range(10000) if 'other:%d' % i in bloom])
+        self.assertTrue(falsePositives < 300, falsePositives)
+        self.assertTrue(bloom.falsePositiveRate() < 0.03, bloom.falsePositiveRate())
+
+
+    def testRoundTrip(self):
+        bloom = filterFor(['a', 'b'])
+        copy = fromTuple(bloom.toTuple())
+        self.assertEqual((copy.bits, copy.hashes, copy.data), (bloom.bits, bloom.hashes, bloom.data))
+        self.assertTrue('a' in copy)
+
+
+    def testShardKeys(self):
+        shard = {
+            'HIERARCHY': ['Lib.sub'],
+            'CONSTANTS': ['Lib.sub.CONST'],
+            'FUNCTIONS': [('Lib.func', [], '')],
+            'CLASSES': {'Lib.deep.Klass': {}},
+            'POINTERS': {'Lib.other.name': 'Other.name'},
+        }
+        keys = shardKeys(shard)
+        for module in ['Lib', 'Lib.sub', 'Lib.deep', 'Lib.other']:
+            self.assertTrue(moduleKey(module) in keys, module)
+        for name in ['CONST', 'func', 'Klass']:
+            self.assertTrue(nameKey(name) in keys, name)
+        self.assertFalse(nameKey('name') in keys)
+        self.assertEqual(prefixKey('KLASSES'), prefixKey('kla'))
+        for prefix in ['f', 'fu', 'fun', 'k', 'kl', 'kla', 'c', 'co', 'con']:
+            self.assertTrue(prefixKey(prefix) in keys, prefix)
+
+
+if __name__ == '__main__':
+    unittest.main()
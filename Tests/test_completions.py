@@ -111,6 +111,28 @@ class CompletionTest(unittest.TestCase):
         self.assertEqual(compls, [orig])
 
 
+    def testCompleteArgumentListsTwice(self):
+        options = CompletionOptions(Types.FUNCTION, klass=None, parents=[], name='b', rindex=-1)
+        findCompletions('b(', self.pysmelldict, options)
+        options = CompletionOptions(Types.TOPLEVEL)
+        compls = findCompletions('b', self.pysmelldict, options)
+        self.assertEqual(compls[0], compFunc('b', 'arg1, arg2'))
+
+
+    def testPrivateNamesSortLast(self):
+        self.pysmelldict['CONSTANTS'].extend(['Module._aconstant', 'Module.__bconst'])
+        options = CompletionOptions(Types.TOPLEVEL)
+        compls = findCompletions('', self.pysmelldict, options)
+        self.assertEqual([comp['word'] for comp in compls],
+            ['a', 'aClass', 'aconstant', 'arg', 'b', 'bClass', 'bconst', '_aconstant', '__bconst'])
+
+
+    def testLimit(self):
+        options = CompletionOptions(Types.TOPLEVEL)
+        compls = findCompletions('', self.pysmelldict, options, limit=2)
+        self.assertEqual(compls, [compFunc('a'), compClass('aClass')])
+
+
     def testCompleteWithSelfInfer(self):
         options = CompletionOptions(Types.INSTANCE, klass='Module.aClass', parents=[])
         compls = findCompletions('', self.pysmelldict, options)
@@ -0,0 +1,76 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.tagsfile import loadTags, PICKLE, EVAL, STRINGTABLE, SECTIONED, SQLITE
+from pysmell.tagslog import appendToLog
+from pysmell.tagdb import TagDB, isTagDB
+from pysmell import tags
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant'],
+                'FUNCTIONS' : [('Module.a', ['arg'], 'a doc')],
+                'CLASSES' : {
+                    'Module.aClass': {
+                        'constructor': [],
+                        'bases': ['object'],
+                        'properties': ['aprop'],
+                        'methods': [('am', ['self'], '')],
+                        'docstring': '',
+                    },
+                    'Module.bClass': {
+                        'constructor': ['x'],
+                        'bases': ['Module.aClass'],
+                        'properties': [],
+                        'methods': [],
+                        'docstring': 'b doc',
+                    },
+                },
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {'Module.imported': 'Other.b'},
+            }
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'PYSMELLTAGS')
+        tags.FORMATS[EVAL](self.source).write(self.pysmelldict)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testConvertBetweenFormats(self):
+        source = self.source
+        for outputFormat in (PICKLE, STRINGTABLE, SECTIONED, EVAL):
+            output = os.path.join(self.directory, outputFormat)
+            done = tags.convert(source, output, outputFormat)
+            self.assertEqual(loadTags(output), (outputFormat, self.pysmelldict))
+            self.assertEqual(done['outputFormat'], outputFormat)
+            self.assertEqual(done['outputBytes'], os.path.getsize(output))
+            source = output
+
+
+    def testConvertAppliesTheLog(self):
+        appendToLog(self.source, {}, ['Module'])
+        output = os.path.join(self.directory, 'converted')
+        done = tags.convert(self.source, output, PICKLE)
+        self.assertEqual(done['sourceFormat'], EVAL)
+        self.assertEqual(loadTags(output)[1]['HIERARCHY'], [])
+
+
+    def testConvertToSQLite(self):
+        output = os.path.join(self.directory, 'db')
+        tags.convert(self.source, output, SQLITE)
+        self.assertTrue(isTagDB(output))
+        db = TagDB(output)
+        try:
+            self.assertEqual(sorted(db['CLASSES']), ['Module.aClass', 'Module.bClass'])
+        finally:
+            db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.docstore import stripDocstrings, writeDocstrings, symbolOf, DOCSFILE
+from pysmell.idehelper import findDocstring
+
+
+class DocStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant'],
+                'FUNCTIONS' : [('Module.a', [], 'a doc'), ('Module.b', ['arg'], '')],
+                'CLASSES' : {
+                    'Module.aClass': {
+                        'constructor': [],
+                        'bases': ['object'],
+                        'properties': ['aprop'],
+                        'methods': [('am', ['self'], 'am doc'), ('bm', ['self'], '')],
+                        'docstring': 'aClass doc',
+                    },
+                },
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {},
+            }
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testStripDocstrings(self):
+        docs = stripDocstrings(self.pysmelldict)
+        self.assertEqual(docs, {'Module.a': 'a doc', 'Module.aClass': 'aClass doc', 'Module.aClass.am': 'am doc'})
+        self.assertEqual(self.pysmelldict['FUNCTIONS'], [('Module.a', [], ''), ('Module.b', ['arg'], '')])
+        klassDict = self.pysmelldict['CLASSES']['Module.aClass']
+        self.assertEqual(klassDict['methods'], [('am', ['self'], ''), ('bm', ['self'], '')])
+        self.assertEqual(klassDict['docstring'], '')
+
+
+    def testFindDocstringInTheSideStore(self):
+        writeDocstrings(os.path.join(self.directory, DOCSFILE), stripDocstrings(self.pysmelldict))
+        open(os.path.join(self.directory, 'PYSMELLTAGS'), 'w').close()
+        os.mkdir(os.path.join(self.directory, 'Module'))
+        filename = os.path.join(self.directory, 'Module', 'script.py')
+        self.assertEqual(findDocstring(filename, 'Module.aClass.am'), 'am doc')
+        self.assertEqual(findDocstring(filename, 'Module.aClass'), 'aClass doc')
+        self.assertEqual(findDocstring(filename, 'Module.b'), None)
+
+
+    def testFindInlineDocstring(self):
+        filename = os.path.join(self.directory, 'script.py')
+        self.assertEqual(findDocstring(filename, 'Module.a', self.pysmelldict), 'a doc')
+        self.assertEqual(findDocstring(filename, 'Module.aClass.am', self.pysmelldict), 'am doc')
+        self.assertEqual(findDocstring(filename, 'Module.aClass', self.pysmelldict), 'aClass doc')
+        self.assertEqual(findDocstring(filename, 'Module.missing', self.pysmelldict), None)
+
+
+    def testSymbolOf(self):
+        self.assertEqual(symbolOf(dict(word='am', menu='Module:aClass')), 'Module.aClass.am')
+        self.assertEqual(symbolOf(dict(word='a', menu='Module')), 'Module.a')
+        self.assertEqual(symbolOf(dict(word='Module')), 'Module')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell import emacshelper
+from pysmell.emacshelper import Buffer, sync_buffer, forget_buffer, get_buffer_completions, get_docstring
+from pysmell.docstore import DOCSFILE, writeDocstrings
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+class BufferSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        self.path = os.path.join(self.directory, 'Other.py')
+
+
+    def tearDown(self):
+        forget_buffer(1)
+        shutil.rmtree(self.directory)
+
+
+    def testApply(self):
+        buffer = Buffer('a\nb\nc\n', 1)
+        self.assertEqual(buffer.lines, ['a', 'b', 'c', ''])
+        buffer.apply(1, 2, 'B\nB2', 2)
+        self.assertEqual(buffer.source(), 'a\nB\nB2\nc\n')
+        buffer.apply(0, 0, '', 3)
+        self.assertEqual(buffer.source(), '')
+        self.assertRaises(ValueError, buffer.apply, 1, 1, 'x', 4)
+
+
+    def testSync(self):
+        self.assertTrue(sync_buffer(1, None, 5, 0, 0, 'x = 1\ny = 2\n'))
+        self.assertTrue(sync_buffer(1, 5, 6, 1, 1, 'y = 3\nz = 4'))
+        self.assertEqual(emacshelper._buffers[1].source(), 'x = 1\ny = 3\nz = 4\n')
+        # pysmell lost track, the whole buffer has to be sent again
+        self.assertFalse(sync_buffer(1, 5, 7, 0, 1, 'x'))
+        self.assertFalse(sync_buffer(1, 6, 7, 3, 2, 'x'))
+        self.assertFalse(sync_buffer(2, 6, 7, 0, 1, 'x'))
+        self.assertEqual(emacshelper._buffers[1].tick, 6)
+
+
+    def testCompletions(self):
+        sync_buffer(1, None, 1, 0, 0, 'x = 1\n')
+        sync_buffer(1, 1, 2, 1, 0, 'b')
+        self.assertEqual(get_buffer_completions(1, self.path, 2, 1, None), ['b', 'bconst'])
+        sync_buffer(1, 2, 3, 1, 0, 'a')
+        self.assertEqual(get_buffer_completions(1, self.path, 2, 1, None), ['aconstant'])
+        self.assertEqual(get_buffer_completions(2, self.path, 2, 1, None), None)
+
+
+    def testDocstring(self):
+        writeDocstrings(os.path.join(self.directory, DOCSFILE), {'Module.b': 'b doc'})
+        self.assertEqual(get_docstring(self.path, 'b'), None)
+        sync_buffer(1, None, 1, 0, 0, 'x = 1\n')
+        sync_buffer(1, 1, 2, 1, 0, 'b')
+        get_buffer_completions(1, self.path, 2, 1, None)
+        self.assertEqual(get_docstring(self.path, 'b'), 'b doc')
+        self.assertEqual(get_docstring(self.path, 'bconst'), None)
+        self.assertEqual(get_docstring(os.path.join(self.directory, 'Another.py'), 'b'), None)
+
+
+    def testTrackChangedLines(self):
+        buffer = Buffer('a\nb\nc\nd', 1)
+        self.assertEqual(buffer.context(2, 1, 'b'), None)
+        buffer.mark()
+        self.assertEqual(buffer.context(2, 1, 'b'), (1, '', ''))
+        buffer.apply(1, 2, 'bc', 2)
+        self.assertEqual(buffer.context(2, 2, 'bc'), (1, '', ''))
+        self.assertEqual(buffer.context(2, 2, 'c'), (1, 'b', ''))
+        buffer.apply(2, 0, 'c\nd', 3)
+        self.assertEqual(buffer.context(2, 2, 'bc'), None)
+
+        buffer.mark()
+        buffer.apply(1, 1, 'bc\nx', 4)
+        self.assertEqual(buffer.context(2, 2, 'bc'), None)
+        buffer.apply(1, 1, 'bc', 5)
+        self.assertEqual(buffer.lines, ['a', 'bc', 'd'])
+        self.assertEqual(buffer.context(2, 2, 'bc'), None)
+
+
+    def testRefiningDoesntJoinTheBuffer(self):
+        sync_buffer(1, None, 1, 0, 0, 'x = 1\n')
+        sync_buffer(1, 1, 2, 1, 0, 'b')
+        joined = []
+        buffer = emacshelper._buffers[1]
+        source = buffer.source
+        buffer.source = lambda: joined.append(buffer.tick) or source()
+        self.assertEqual(get_buffer_completions(1, self.path, 2, 1, None), ['b', 'bconst'])
+        sync_buffer(1, 2, 3, 1, 0, 'bc')
+        self.assertEqual(get_buffer_completions(1, self.path, 2, 2, None), ['bconst'])
+        self.assertEqual(joined, [2])
+
+        sync_buffer(1, 3, 4, 0, 1, 'y = 1')
+        self.assertEqual(get_buffer_completions(1, self.path, 2, 2, None), ['bconst'])
+        self.assertEqual(joined, [2, 4])
+
+
+    def testParseOncePerTick(self):
+        parsed = []
+        buffer = Buffer('x = 1\n', 1)
+        original = emacshelper.idehelper.parseSource
+        def parseSource(source):
+            parsed.append(source)
+            return original(source)
+        emacshelper.idehelper.parseSource = parseSource
+        try:
+            analysis = buffer.analysis(self.path, buffer.source())
+            analysis.tree(1)
+            self.assertTrue(buffer.analysis(self.path, buffer.source()) is analysis)
+            analysis.tree(1)
+            buffer.apply(1, 0, 'y = 2', 2)
+            buffer.analysis(self.path, buffer.source()).tree(1)
+        finally:
+            emacshelper.idehelper.parseSource = original
+        self.assertEqual(parsed, ['x = 1\n', 'x = 1\ny = 2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
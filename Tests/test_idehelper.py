@@ -3,8 +3,10 @@ import os
 import unittest
 from textwrap import dedent
 
+from pysmell.index import getIndex
 from pysmell.idehelper import (inferClass, detectCompletionType,
-    CompletionOptions, findPYSMELLDICT, Types, findBase, getSafeTree)
+    CompletionOptions, findPYSMELLDICT, Types, findBase, getSafeTree, CompletionSession,
+    findCompletions, completePositions)
 
 NESTEDDICT = {
         'CONSTANTS' : [],
@@ -255,7 +257,7 @@ class DetectOptionsTest(unittest.TestCase):
 
 
 
-    def testInferShouldUpdatePYSMELLDICT(self):
+    def testInferShouldUseTheEditedBuffer(self):
         source = dedent("""\
             from Nested.Package.Module import Class
             class FreshClass(Class):
@@ -271,7 +273,8 @@ class DetectOptionsTest(unittest.TestCase):
             source, 5, len(line), '', copiedDict)
         expected = CompletionOptions(Types.INSTANCE, klass='PackageA.Module.FreshClass', parents=['Nested.Package.Module.Class'])
         self.assertEqual(options, expected) #sanity
-        klass = copiedDict['CLASSES']['PackageA.Module.FreshClass']
+        self.assertEqual(copiedDict, self.pysmelldict, 'the buffer should not be merged into the tags')
+        klass = getIndex(copiedDict).PYSMELLDICT['CLASSES']['PackageA.Module.FreshClass']
         self.assertEqual(klass['bases'], ['Nested.Package.Module.Class'])
         self.assertEqual(klass['properties'], ['something'])
         self.assertEqual(klass['methods'], [('sth', [], "")])
@@ -508,5 +511,105 @@ class FindBaseTest(unittest.TestCase):
         index = findBase('    hehe.bbbb', 11)
         self.assertEqual(index, 9)
 
+
+class CompletionSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant', 'Module.bconst', 'Module.bother'],
+                'FUNCTIONS' : [('Module.b', ['arg1', 'arg2'], '')],
+                'CLASSES' : {},
+                'POINTERS' : {},
+                'HIERARCHY' : ['Module'],
+            }
+        self.session = CompletionSession()
+
+
+    def complete(self, source, lineNo, col, base):
+        words = self.session.complete('Module.py', source, lineNo, col, base, self.pysmelldict)
+        return [comp['word'] for comp in words]
+
+
+    def addConstant(self, constant):
+        self.pysmelldict = dict(self.pysmelldict, CONSTANTS=self.pysmelldict['CONSTANTS'] + [constant])
+
+
+    def testRefinesPreviousCompletions(self):
+        self.assertEqual(self.complete('x = 1\nb', 2, 1, 'b'), ['b', 'bconst', 'bother'])
+        # the tags aren't consulted while the session lasts
+        self.addConstant('Module.bnew')
+        self.assertEqual(self.complete('x = 1\nbo', 2, 2, 'bo'), ['bother'])
+        self.assertEqual(self.session.base, 'bo')
+        self.assertEqual(self.complete('x = 1\nbot', 2, 3, 'bot'), ['bother'])
+
+
+    def testNewSessions(self):
+        self.complete('x = 1\nb', 2, 1, 'b')
+        self.addConstant('Module.bnew')
+        # the buffer changed outside of the completed word
+        self.assertEqual(self.complete('x = 2\nbn', 2, 2, 'bn'), ['bnew'])
+
+        self.complete('x = 1\nbo', 2, 2, 'bo')
+        # backspace
+        self.assertEqual(self.complete('x = 1\nb', 2, 1, 'b'), ['b', 'bconst', 'bnew', 'bother'])
+        # another line
+        self.assertEqual(self.complete('b\nx = 1\nb', 1, 1, 'b'), ['b', 'bconst', 'bnew', 'bother'])
+        self.assertEqual(self.session.key, ('Module.py', 1, 0, None))
+
+
+class CompletePositionsTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant', 'Module.bconst'],
+                'FUNCTIONS' : [('Module.b', ['arg1', 'arg2'], '')],
+                'CLASSES' : {},
+                'POINTERS' : {},
+                'HIERARCHY' : ['Module'],
+            }
+        self.source = 'from Module import \nb\nx = b(\nbc'
+        self.positions = [(2, 1, 'b'), (1, 19, ''), (3, 6, 'b('), (4, 2, 'bc'), (2, 1, 'b')]
+
+
+    def count(self, name):
+        "count the calls to idehelper.name until the test ends"
+        import pysmell.idehelper
+        calls = []
+        original = getattr(pysmell.idehelper, name)
+        def counting(*args):
+            calls.append(args)
+            return original(*args)
+        setattr(pysmell.idehelper, name, counting)
+        self.addCleanup(setattr, pysmell.idehelper, name, original)
+        return calls
+
+
+    def testSameAsOneByOne(self):
+        expected = []
+        for lineNo, col, base in self.positions:
+            options = detectCompletionType('Module.py', self.source, lineNo, col, base, self.pysmelldict)
+            expected.append(findCompletions(base, self.pysmelldict, options))
+        self.assertEqual(completePositions('Module.py', self.source, self.positions, self.pysmelldict), expected)
+        self.assertEqual(expected[0], expected[4])
+        self.assertEqual([completion['word'] for completion in expected[3]], ['bconst'])
+
+
+    def testParsesOnce(self):
+        parsed = self.count('parseSource')
+        completePositions('Module.py', self.source, self.positions, self.pysmelldict)
+        self.assertEqual(len(parsed), 1)
+
+
+    def testPatchesEachLineOnce(self):
+        patched = self.count('getPatchedTree')
+        source = 'x = (\nb'
+        completePositions('Module.py', source, [(2, 1, 'b'), (2, 1, 'b'), (1, 5, '')], self.pysmelldict)
+        self.assertEqual(sorted(lineNo for _, lineNo in patched), [1, 2])
+
+
+    def testLinesOutside(self):
+        self.assertEqual(completePositions('Module.py', 'b', [(0, 0, ''), (2, 0, ''), (1, 1, 'b')], self.pysmelldict,
+                                           limit=1),
+                         [[], [], [findCompletions('b', self.pysmelldict, CompletionOptions(Types.TOPLEVEL))[0]]])
+
+
 if __name__ == '__main__':
     unittest.main()
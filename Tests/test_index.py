@@ -0,0 +1,239 @@
+import unittest
+import gc
+import pickle
+import weakref
+
+from pysmell import index as indexModule
+from pysmell.index import TagsDict, sortKey, getIndex, invalidateIndex, Completion
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module._hidden', 'Module.bconst', 'Module.__magic__', 'Module.aconst'],
+                'FUNCTIONS' : [('Module.b', [], ''), ('Module._a', [], ''), ('Module.a', ['arg'], '')],
+                'CLASSES' : {
+                    'Module.aClass': {
+                        'constructor': [],
+                        'bases': ['object'],
+                        'properties': ['_zprop', 'aprop'],
+                        'methods': [('__init__', [], ''), ('am', [], '')]
+                    },
+                },
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {}
+            }
+
+
+    def testSortKey(self):
+        words = ['__magic__', '_b', 'b', '_a', 'a', 'B', '___deep']
+        words.sort(key=sortKey)
+        self.assertEqual(words, ['B', 'a', 'b', '_a', '_b', '__magic__', '___deep'])
+
+
+    def testCompletionRecords(self):
+        record = Completion('am', 'm', 'Module:aClass', 'am()')
+        self.assertEqual(record.key, (0, 'am'))
+        self.assertEqual(record.toDict(), dict(word='am', kind='m', menu='Module:aClass', abbr='am()', dup='1'))
+        self.assertEqual(Completion('Sub', 't').toDict(), dict(word='Sub', kind='t', dup='1'))
+
+        members = getIndex(self.pysmelldict).classMembers('Module.aClass')
+        self.assertTrue(members[0].menu is members[1].menu)
+
+
+    def testTopLevelIsSorted(self):
+        words = [record.word for record in getIndex(self.pysmelldict).topLevel()]
+        self.assertEqual(words, ['a', 'aClass', 'aconst', 'b', 'bconst', '_a', '_hidden', '__magic__'])
+
+
+    def testClassMembersAreSorted(self):
+        words = [record.word for record in getIndex(self.pysmelldict).classMembers('Module.aClass')]
+        self.assertEqual(words, ['am', 'aprop', '_zprop', '__init__'])
+        self.assertEqual(getIndex(self.pysmelldict).classMembers('Module.unknown'), [])
+
+
+    def testIndexIsCached(self):
+        index = getIndex(self.pysmelldict)
+        self.assertTrue(getIndex(self.pysmelldict) is index)
+        self.assertTrue(index.topLevel() is index.topLevel())
+        self.assertFalse(getIndex(dict(self.pysmelldict)) is index)
+
+        invalidateIndex(self.pysmelldict)
+        self.assertFalse(getIndex(self.pysmelldict) is index)
+
+
+    def testTagsDictKeepsItsIndex(self):
+        tags = TagsDict(self.pysmelldict)
+        index = getIndex(tags)
+        for number in range(indexModule.MAXINDEXES * 2):
+            getIndex(dict(self.pysmelldict))
+        self.assertTrue(getIndex(tags) is index)
+
+        copied = pickle.loads(pickle.dumps(tags))
+        self.assertEqual(type(copied), TagsDict)
+        self.assertEqual(copied, tags)
+        self.assertFalse(getIndex(copied) is index)
+
+        held = weakref.ref(tags)
+        del tags, index
+        gc.collect()
+        self.assertTrue(held() is None)
+
+
+    def testAncestorsAreFlattenedAndUnique(self):
+        classes = self.pysmelldict['CLASSES']
+        for name, bases in [('Module.Left', ['Module.aClass']), ('Module.Right', ['Module.aClass']),
+                            ('Module.Diamond', ['Module.Left', 'Module.Right', 'object'])]:
+            classes[name] = dict(constructor=[], bases=bases, properties=[], methods=[])
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(index.ancestors('Module.Diamond'), ['Module.Left', 'Module.aClass', 'Module.Right'])
+        self.assertEqual(index.ancestors('Module.aClass'), [])
+        self.assertEqual(index.ancestors('Module.unknown'), [])
+
+
+    def testCyclicAncestors(self):
+        classes = self.pysmelldict['CLASSES']
+        for name, bases in [('Module.A', ['Module.B']), ('Module.B', ['Module.C', 'Module.A']),
+                            ('Module.C', ['Module.aClass']), ('Module.Self', ['Module.Self'])]:
+            classes[name] = dict(constructor=[], bases=bases, properties=[], methods=[])
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(index.ancestors('Module.A'), ['Module.B', 'Module.C', 'Module.aClass'])
+        self.assertEqual(index.ancestors('Module.B'), ['Module.C', 'Module.aClass', 'Module.A'])
+        self.assertEqual(index.ancestors('Module.Self'), [])
+
+
+    def testMembersAreInvalidatedPerModule(self):
+        classes = self.pysmelldict['CLASSES']
+        classes['Other.Child'] = dict(constructor=[], bases=['Module.aClass'], properties=['cprop'], methods=[])
+        classes['Other.Unrelated'] = dict(constructor=[], bases=[], properties=['uprop'], methods=[])
+        index = getIndex(self.pysmelldict)
+        child = index.members('Other.Child')
+        unrelated = index.members('Other.Unrelated')
+        self.assertEqual([record.word for record in child], ['am', 'aprop', 'cprop', '_zprop', '__init__'])
+
+        classes['Module.aClass']['properties'].append('newprop')
+        index.invalidateModules(['Module'])
+        self.assertTrue(index.members('Other.Unrelated') is unrelated)
+        self.assertEqual([record.word for record in index.members('Other.Child')],
+                         ['am', 'aprop', 'cprop', 'newprop', '_zprop', '__init__'])
+
+
+
+    def testModuleTree(self):
+        self.pysmelldict['HIERARCHY'].extend(['Package.Sub.Leaf', 'Package.Other'])
+        self.pysmelldict['POINTERS'].update({'Package.Sub.Leaf.imported': 'Module.a',
+                                             'Package.Sub.Leaf.*': 'Module.*'})
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(sorted(index.findModule('Package').listedChildren()), ['Other', 'Sub'])
+        self.assertEqual(index.findModule('Package.Sub.Leaf').pointers, {'imported': 'Module.a'})
+        self.assertEqual(index.findModule('Package.Sub.Leaf').stars, ['Module'])
+        self.assertEqual([record.word for record in index.findModule('Module').members],
+                         ['a', 'aClass', 'aconst', 'b', 'bconst'])
+        self.assertEqual(index.findModule('Package.Missing'), None)
+
+
+    def testModuleCompletionsFollowStarImportCycles(self):
+        self.pysmelldict['HIERARCHY'].append('Other')
+        self.pysmelldict['CONSTANTS'].append('Other.OTHER')
+        self.pysmelldict['POINTERS'].update({'Module.*': 'Other.*', 'Other.*': 'Module.*'})
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(index.starImports('Module'), ['Other'])
+        records = index.moduleCompletions('Other', True)
+        self.assertEqual([record.word for record in records],
+                         ['OTHER', 'a', 'aClass', 'aconst', 'b', 'bconst'])
+        self.assertTrue(index.moduleCompletions('Other', True) is records)
+
+
+    def testQualifyFollowsPointerChains(self):
+        self.pysmelldict['POINTERS'].update({
+            'Api.Thing': 'Api.impl.Thing',
+            'Api.impl.Thing': 'Module.aClass',
+            'Loop.a': 'Loop.b',
+            'Loop.b': 'Loop.a',
+        })
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(index.qualify('Api.Thing'), 'Module.aClass')
+        self.assertEqual(index.qualify('Module.aClass'), 'Module.aClass')
+        self.assertEqual(index.qualify('Loop.a'), 'Loop.b')
+        self.assertEqual(index.qualify('Unknown.name'), 'Unknown.name')
+
+
+    def testQualifyHopLimit(self):
+        from pysmell.index import MAXPOINTERHOPS
+        for hop in range(MAXPOINTERHOPS + 5):
+            self.pysmelldict['POINTERS']['Chain.n%d' % hop] = 'Chain.n%d' % (hop + 1)
+        self.assertEqual(getIndex(self.pysmelldict).qualify('Chain.n0'), 'Chain.n%d' % MAXPOINTERHOPS)
+
+
+    def testQualifyStarImports(self):
+        self.pysmelldict['HIERARCHY'].extend(['Star', 'Star.Sub', 'Empty'])
+        self.pysmelldict['POINTERS'].update({
+            'Star.*': 'Empty.*',
+            'Star.Sub.*': 'Module.*',
+            'Starfish.*': 'Nowhere.*',
+        })
+        index = getIndex(self.pysmelldict)
+        self.assertEqual(index.starTable()['Star.Sub'], ['Module'])
+        self.assertEqual(index.qualify('Star.Sub.aClass'), 'Module.aClass')
+        self.assertEqual(index.qualify('Star.Thing'), 'Empty.Thing')
+        self.assertEqual(index.qualify('StarTrek.Thing'), 'StarTrek.Thing')
+
+
+    def testOverlayShadowsItsModule(self):
+        self.pysmelldict['CONSTANTS'].append('Other.OTHER')
+        self.pysmelldict['HIERARCHY'].append('Other')
+        overlay = {
+                'CONSTANTS' : ['Module.fresh'],
+                'FUNCTIONS' : [('Module.newfunc', [], '')],
+                'CLASSES' : {
+                    'Module.bClass': {
+                        'constructor': [],
+                        'bases': ['Module.aClass'],
+                        'properties': ['bprop'],
+                        'methods': []
+                    },
+                },
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {'Module.imported': 'Other.OTHER'}
+            }
+        index = getIndex(self.pysmelldict, overlay)
+        self.assertTrue(index.overlay is overlay)
+        self.assertTrue(index.base is getIndex(self.pysmelldict))
+        self.assertEqual([record.word for record in index.topLevel()],
+                         ['OTHER', 'bClass', 'fresh', 'newfunc'])
+        # aClass isn't in the edited buffer anymore, so bClass only has its own members
+        self.assertEqual([record.word for record in index.members('Module.bClass')], ['bprop'])
+        self.assertEqual([record.word for record in index.moduleCompletions('Module', True)],
+                         ['bClass', 'fresh', 'imported', 'newfunc'])
+        self.assertEqual(index.qualify('Module.imported'), 'Other.OTHER')
+
+        self.assertFalse(getIndex(self.pysmelldict, overlay) is index)
+        self.assertEqual(len(self.pysmelldict['CONSTANTS']), 5)
+        self.assertEqual([record.word for record in getIndex(self.pysmelldict).functions()], ['a', 'b', '_a'])
+
+
+    def testOverlayInheritsFromTheTags(self):
+        overlay = {
+                'CONSTANTS' : [],
+                'FUNCTIONS' : [],
+                'CLASSES' : {
+                    'Fresh.Child': {
+                        'constructor': [],
+                        'bases': ['Module.aClass'],
+                        'properties': ['cprop'],
+                        'methods': []
+                    },
+                },
+                'HIERARCHY' : ['Fresh'],
+                'POINTERS': {}
+            }
+        index = getIndex(self.pysmelldict, overlay)
+        self.assertEqual(index.ancestors('Fresh.Child'), ['Module.aClass'])
+        self.assertEqual([record.word for record in index.members('Fresh.Child')],
+                         ['am', 'aprop', 'cprop', '_zprop', '__init__'])
+        self.assertEqual([record.word for record in index.moduleCompletions('', False)], ['Fresh', 'Module'])
+        self.assertTrue('Fresh.Child' in index.PYSMELLDICT['CLASSES'])
+        self.assertFalse('Fresh.Child' in self.pysmelldict['CLASSES'])
+
+if __name__ == '__main__':
+    unittest.main()
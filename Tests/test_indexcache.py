@@ -0,0 +1,139 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from pysmell import indexcache
+from pysmell.indexcache import _replace, dumpIndex, loadIndex, snapshotPath, readRecent, addRecent, canSnapshot
+from pysmell.index import getIndex, getBaseIndex, Completion
+from pysmell.tagscache import TagsCache, tagsStamp
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+def writeTags(directory, module):
+    PickleOut(os.path.join(directory, 'PYSMELLTAGS')).write({
+        'CONSTANTS': ['%s.aconstant' % module, '%s.bconst' % module],
+        'FUNCTIONS': [('%s.b' % module, ['arg1', 'arg2'], '')],
+        'CLASSES': {'%s.Klass' % module: {'constructor': [], 'bases': [], 'properties': ['prop'],
+                                         'methods': [('method', [], '')], 'docstring': ''}},
+        'HIERARCHY': [module],
+        'POINTERS': {},
+    })
+
+
+class IndexCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cacheDirectory = os.path.join(self.directory, 'cache')
+        self.projects = []
+        for name in ('One', 'Two'):
+            project = os.path.join(self.directory, name)
+            os.mkdir(project)
+            writeTags(project, name)
+            self.projects.append(project)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testCompletionPickles(self):
+        record = Completion('_word', 'f', 'Module', 'word()')
+        copy = pickle.loads(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy, record)
+        self.assertEqual(copy.key, record.key)
+
+
+    def testDumpAndLoad(self):
+        cache = TagsCache()
+        PYSMELLDICT = cache.get(os.path.join(self.projects[0], 'x.py'))
+        self.assertTrue(canSnapshot(PYSMELLDICT))
+        getIndex(PYSMELLDICT).precompute()
+        stamp = tagsStamp(self.projects[0])
+        path = snapshotPath(self.cacheDirectory, stamp)
+        dumpIndex(path, PYSMELLDICT, stamp)
+
+        restored = loadIndex(path, stamp)
+        self.assertEqual(restored, PYSMELLDICT)
+        restoredIndex = getIndex(restored)
+        self.assertTrue(restoredIndex is getBaseIndex(restored))
+        self.assertTrue('TOPLEVEL' in restoredIndex._sections)
+        self.assertEqual(restoredIndex.topLevel(), getIndex(PYSMELLDICT).topLevel())
+        self.assertEqual(restoredIndex.members('One.Klass'), getIndex(PYSMELLDICT).members('One.Klass'))
+
+        # the tags changed since
+        self.assertEqual(loadIndex(path, [(stamp[0][0], stamp[0][1] + 1)]), None)
+        open(path, 'wb').write(b'broken')
+        self.assertEqual(loadIndex(path, stamp), None)
+        self.assertEqual(loadIndex(path + '.missing', stamp), None)
+
+
+    def testReplace(self):
+        path = os.path.join(self.cacheDirectory, 'file')
+        _replace(path, lambda newFile: newFile.write(b'old'))
+        def broken(newFile):
+            newFile.write(b'half')
+            raise IOError('disk full')
+        self.assertRaises(IOError, _replace, path, broken)
+        self.assertEqual(open(path, 'rb').read(), b'old')
+
+        # another process writing the same file meanwhile
+        def interrupted(newFile):
+            _replace(path, lambda otherFile: otherFile.write(b'other'))
+            newFile.write(b'new')
+        _replace(path, interrupted)
+        self.assertEqual(open(path, 'rb').read(), b'new')
+        self.assertEqual(os.listdir(self.cacheDirectory), ['file'])
+
+
+    def testSaveAndRestart(self):
+        cache = TagsCache(self.cacheDirectory)
+        cache.get(os.path.join(self.projects[0], 'x.py'))
+        cache.save()
+
+        restarted = TagsCache(self.cacheDirectory)
+        PYSMELLDICT = restarted.get(os.path.join(self.projects[0], 'x.py'))
+        self.assertTrue('TOPLEVEL' in getBaseIndex(PYSMELLDICT)._sections)
+
+        # tags written after the snapshot are read instead
+        time.sleep(0.01)
+        writeTags(self.projects[0], 'Changed')
+        os.utime(os.path.join(self.projects[0], 'PYSMELLTAGS'), (time.time() + 5, time.time() + 5))
+        PYSMELLDICT = TagsCache(self.cacheDirectory).get(os.path.join(self.projects[0], 'x.py'))
+        self.assertEqual(PYSMELLDICT['HIERARCHY'], ['Changed'])
+        self.assertEqual(getBaseIndex(PYSMELLDICT)._sections, {})
+
+
+    def testRecent(self):
+        stamps = [tagsStamp(project) for project in self.projects]
+        addRecent(self.cacheDirectory, self.projects[0], stamps[0])
+        addRecent(self.cacheDirectory, self.projects[1], stamps[1])
+        self.assertEqual(readRecent(self.cacheDirectory), [self.projects[1], self.projects[0]])
+        addRecent(self.cacheDirectory, self.projects[0], stamps[0])
+        self.assertEqual(readRecent(self.cacheDirectory), [self.projects[0], self.projects[1]])
+        for number in range(indexcache.RECENT + 2):
+            addRecent(self.cacheDirectory, '/nowhere/%d' % number, [('/nowhere/%d/PYSMELLTAGS' % number, 0)])
+        self.assertEqual(len(readRecent(self.cacheDirectory)), indexcache.RECENT)
+        self.assertEqual(readRecent(os.path.join(self.directory, 'nocache')), [])
+
+
+    def testPrewarm(self):
+        cache = TagsCache(self.cacheDirectory)
+        for project in self.projects:
+            cache.get(os.path.join(project, 'x.py'))
+        addRecent(self.cacheDirectory, os.path.join(self.directory, 'gone'), [('gone', 0)])
+
+        prewarmed = TagsCache(self.cacheDirectory)
+        prewarmed.prewarm()
+        self.assertEqual(sorted(prewarmed.directories), self.projects)
+        for project in self.projects:
+            PYSMELLDICT = prewarmed.directories[project].current.PYSMELLDICT
+            self.assertTrue('TOPLEVEL' in getBaseIndex(PYSMELLDICT)._sections)
+        self.assertEqual(readRecent(self.cacheDirectory)[:2], [self.projects[1], self.projects[0]])
+        self.assertEqual(TagsCache().prewarm(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell import indexer
+from pysmell.indexer import Indexer, Cancelled, readStatus, writeStatus, statusPath, isRunning
+from pysmell.tagsfile import readTags
+from pysmell.outputHandlers.PickleOut import PickleOut
+from pysmell.tags import process
+from pysmell.tagslog import appendToLog, logPath, splitByModule
+
+
+class IndexerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'PYSMELLTAGS')
+        self.statusFile = statusPath(self.output)
+        self.package = os.path.join('TestData', 'PackageA')
+        self.files = sorted(os.path.join(os.path.abspath(path), name)
+                            for path, _, names in os.walk(self.package)
+                            for name in names if name.endswith('.py'))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testProcessReportsProgress(self):
+        calls = []
+        process([self.package], progress=lambda *args: calls.append(args))
+        total = len(self.files)
+        self.assertEqual([done for done, _, _ in calls], list(range(total + 1)))
+        self.assertEqual(set(count for _, count, _ in calls), set([total]))
+        self.assertEqual(sorted(path for _, _, path in calls[:-1]), self.files)
+        self.assertEqual(calls[-1], (total, total, None))
+
+
+    def testRun(self):
+        statuses = []
+        status = Indexer([self.package], self.output, progress=statuses.append, statusFile=self.statusFile).run()
+        self.assertEqual(status['state'], indexer.DONE)
+        self.assertEqual(status['done'], len(self.files))
+        self.assertEqual(status['total'], len(self.files))
+        self.assertEqual(statuses[0]['state'], indexer.RUNNING)
+        self.assertEqual(sorted(status['current'] for status in statuses if status['current']), self.files)
+        self.assertEqual(readStatus(self.statusFile), status)
+        self.assertFalse(isRunning(status))
+        self.assertEqual(readTags(self.output), process([self.package]))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['.PYSMELLTAGS.status', 'PYSMELLTAGS'])
+
+
+    def testForgetsTheLog(self):
+        PickleOut(self.output).write(process([self.package]))
+        appendToLog(self.output, splitByModule({'CONSTANTS': ['Stale.CONSTANT'], 'FUNCTIONS': [], 'CLASSES': {},
+                                                'HIERARCHY': ['Stale'], 'POINTERS': {}}))
+        self.assertTrue(os.path.exists(logPath(self.output)))
+        status = Indexer([self.package], self.output).run()
+        self.assertEqual(status['state'], indexer.DONE)
+        self.assertFalse(os.path.exists(logPath(self.output)))
+        self.assertEqual(readTags(self.output), process([self.package]))
+
+
+    def testCancel(self):
+        open(self.output, 'w').write('old tags')
+        def cancelAfterTheFirstFile(status):
+            if status['done'] == 1:
+                runner.cancel()
+        runner = Indexer([self.package], self.output, progress=cancelAfterTheFirstFile, statusFile=self.statusFile)
+        status = runner.run()
+        self.assertEqual(status['state'], indexer.CANCELLED)
+        self.assertEqual(status['done'], 1)
+        self.assertEqual(readStatus(self.statusFile)['state'], indexer.CANCELLED)
+        self.assertEqual(open(self.output).read(), 'old tags')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['.PYSMELLTAGS.status', 'PYSMELLTAGS'])
+
+
+    def testFailure(self):
+        def failingHandler(path):
+            raise IOError('disk full')
+        status = Indexer([self.package], self.output, handlerFactory=failingHandler).run()
+        self.assertEqual(status['state'], indexer.FAILED)
+        self.assertEqual(status['error'], 'OSError: disk full')
+        self.assertFalse(os.path.exists(self.output))
+
+
+    def testInTheBackground(self):
+        runner = Indexer([self.package], self.output).start()
+        self.assertTrue(runner.wait(10))
+        self.assertEqual(runner.status()['state'], indexer.DONE)
+
+
+    def testWriteStatus(self):
+        writeStatus(self.statusFile, {'state': indexer.DONE})
+        self.assertEqual(readStatus(self.statusFile), {'state': indexer.DONE})
+        self.assertRaises(TypeError, writeStatus, self.statusFile, {'state': object()})
+        self.assertEqual(readStatus(self.statusFile), {'state': indexer.DONE})
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(self.statusFile)])
+
+
+    def testIsRunning(self):
+        self.assertFalse(isRunning(None))
+        self.assertTrue(isRunning({'state': indexer.RUNNING, 'pid': os.getpid()}))
+        self.assertFalse(isRunning({'state': indexer.DONE, 'pid': os.getpid()}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from pysmell.lsp import (LanguageServer, readMessage, writeMessage, applyChange, uriToPath,
+    REQUEST_CANCELLED, CONTENT_MODIFIED, METHOD_NOT_FOUND, INVALID_PARAMS)
+from pysmell.docstore import DOCSFILE, writeDocstrings
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+def frame(*messages):
+    stream = BytesIO()
+    for message in messages:
+        writeMessage(stream, message)
+    return stream.getvalue()
+
+
+def request(requestId, method, **params):
+    return {'jsonrpc': '2.0', 'id': requestId, 'method': method, 'params': params}
+
+
+def notification(method, **params):
+    return {'jsonrpc': '2.0', 'method': method, 'params': params}
+
+
+class ScriptedClient(object):
+    "sends messages to a LanguageServer and reads back what it wrote"
+    def __init__(self):
+        self.output = BytesIO()
+        self.server = LanguageServer(self.output)
+        self.read = 0
+
+    def send(self, *messages):
+        for message in messages:
+            self.server.receive(message)
+        self.server.processPending()
+        return self.responses()
+
+    def responses(self):
+        stream = BytesIO(self.output.getvalue()[self.read:])
+        self.read = len(self.output.getvalue())
+        responses = []
+        message = readMessage(stream)
+        while message is not None:
+            responses.append(message)
+            message = readMessage(stream)
+        return responses
+
+
+class LanguageServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        self.uri = 'file://' + os.path.join(self.directory, 'Other.py')
+        self.client = ScriptedClient()
+        self.client.send(request(1, 'initialize', capabilities={}),
+                         notification('initialized'),
+                         notification('textDocument/didOpen',
+                            textDocument={'uri': self.uri, 'languageId': 'python', 'version': 1, 'text': 'x = 1\n'}))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def complete(self, requestId, line, character):
+        return request(requestId, 'textDocument/completion',
+                       textDocument={'uri': self.uri}, position={'line': line, 'character': character})
+
+
+    def change(self, version, line, start, end, text):
+        return notification('textDocument/didChange', textDocument={'uri': self.uri, 'version': version},
+            contentChanges=[{'range': {'start': {'line': line, 'character': start},
+                                       'end': {'line': line, 'character': end}}, 'text': text}])
+
+
+    def testFraming(self):
+        stream = BytesIO(frame({'a': 1}, {'b': [2]}))
+        self.assertEqual(readMessage(stream), {'a': 1})
+        self.assertEqual(readMessage(stream), {'b': [2]})
+        self.assertEqual(readMessage(stream), None)
+
+
+    def testApplyChange(self):
+        text = 'abc\ndef\n'
+        self.assertEqual(applyChange(text, {'text': 'new'}), 'new')
+        change = {'range': {'start': {'line': 1, 'character': 1}, 'end': {'line': 1, 'character': 2}}, 'text': 'XY'}
+        self.assertEqual(applyChange(text, change), 'abc\ndXYf\n')
+        change = {'range': {'start': {'line': 0, 'character': 3}, 'end': {'line': 1, 'character': 0}}, 'text': ''}
+        self.assertEqual(applyChange(text, change), 'abcdef\n')
+
+
+    def testUriToPath(self):
+        self.assertEqual(uriToPath('file:///some/dir%20name/file.py'), os.path.normpath('/some/dir name/file.py'))
+
+
+    def testCompletion(self):
+        responses = self.client.send(self.change(2, 1, 0, 0, 'b'), self.complete(2, 1, 1))
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0]['id'], 2)
+        items = responses[0]['result']['items']
+        self.assertEqual([item['insertText'] for item in items], ['b', 'bconst'])
+        self.assertEqual(items[0]['label'], 'b(arg1, arg2)')
+        self.assertEqual(items[0]['kind'], 3)
+        self.assertEqual(items[0]['detail'], 'Module')
+        self.assertFalse(responses[0]['result']['isIncomplete'])
+
+
+    def testResolve(self):
+        writeDocstrings(os.path.join(self.directory, DOCSFILE), {'Module.b': 'b doc'})
+        responses = self.client.send(self.change(2, 1, 0, 0, 'b'), self.complete(2, 1, 1))
+        items = responses[0]['result']['items']
+        self.assertEqual(items[0]['data'], {'uri': self.uri, 'symbol': 'Module.b'})
+        self.assertFalse('documentation' in items[0])
+        responses = self.client.send(request(3, 'completionItem/resolve', **items[0]),
+                                     request(4, 'completionItem/resolve', **items[1]))
+        self.assertEqual(responses[0]['result']['documentation'], 'b doc')
+        self.assertEqual(responses[0]['result']['insertText'], 'b')
+        self.assertEqual(responses[1]['result'], items[1])
+
+
+    def testTagsStayLoaded(self):
+        self.client.send(self.change(2, 1, 0, 0, 'b'), self.complete(2, 1, 1))
+        server = self.client.server
+        PYSMELLDICT = server.tagsCache.get(uriToPath(self.uri))
+        self.client.send(self.change(3, 1, 0, 1, 'a'), self.complete(3, 1, 1))
+        self.assertTrue(server.tagsCache.get(uriToPath(self.uri)) is PYSMELLDICT)
+
+
+    def testRegeneratedTagsEndTheSession(self):
+        self.client.send(self.change(2, 1, 0, 0, 'b'), self.complete(2, 1, 1))
+        tagsPath = os.path.join(self.directory, 'PYSMELLTAGS')
+        PickleOut(tagsPath).write({
+            'CONSTANTS': ['Module.bnew'],
+            'FUNCTIONS': [],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        later = os.path.getmtime(tagsPath) + 5
+        os.utime(tagsPath, (later, later))
+        responses = self.client.send(self.change(3, 1, 1, 1, 'n'), self.complete(3, 1, 2))
+        self.assertEqual([item['insertText'] for item in responses[0]['result']['items']], ['bnew'])
+
+
+    def testSupersededRequests(self):
+        responses = self.client.send(
+            self.change(2, 1, 0, 0, 'b'),
+            self.complete(2, 1, 1),
+            self.change(3, 1, 1, 1, 'c'),
+            self.complete(3, 1, 2),
+            request(4, 'textDocument/completion', textDocument={'uri': self.uri}, position={'line': 1, 'character': 2}),
+            notification('$/cancelRequest', id=4))
+        self.assertEqual([response['id'] for response in responses], [2, 3, 4])
+        self.assertEqual(responses[0]['error']['code'], CONTENT_MODIFIED)
+        self.assertEqual(responses[1]['error']['code'], CONTENT_MODIFIED)
+        self.assertEqual(responses[2]['error']['code'], REQUEST_CANCELLED)
+
+
+    def testErrors(self):
+        responses = self.client.send(request(2, 'textDocument/hover'),
+            notification('textDocument/didClose', textDocument={'uri': self.uri}),
+            self.complete(3, 0, 0))
+        self.assertEqual(responses[0]['error']['code'], METHOD_NOT_FOUND)
+        self.assertEqual(responses[1]['error']['code'], INVALID_PARAMS)
+
+
+    def testServe(self):
+        output = BytesIO()
+        server = LanguageServer(output)
+        server.serve(BytesIO(frame(request(1, 'initialize', capabilities={}),
+                                   request(2, 'shutdown'), notification('exit'))))
+        responses = [readMessage(BytesIO(output.getvalue()))]
+        self.assertTrue(responses[0]['result']['capabilities']['completionProvider'])
+        self.assertTrue(server.shutdown and server.exited)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.sections import SectionedTags, writeSections, readSections, isSectioned
+from pysmell.tagsfile import readTags, loadTags, SECTIONED
+from pysmell.tagslog import appendToLog, splitByModule
+from pysmell.idehelper import findCompletions, findPYSMELLDICT, CompletionOptions, Types
+from pysmell import tags
+
+from Tests.test_completions import CompletionTest, compFunc, compClass, compConst
+
+
+class SectionedCompletionTest(CompletionTest):
+    "every completion test again, with the tags read a section at a time"
+    def setUp(self):
+        CompletionTest.setUp(self)
+        self.originalDict = self.pysmelldict
+        self.directory = tempfile.mkdtemp()
+        self.pysmelldict = self.toSections(self.pysmelldict, 'pysmell')
+        self.nestedDict = self.toSections(self.nestedDict, 'nested')
+        self.complicatedDict = self.toSections(self.complicatedDict, 'complicated')
+
+
+    def toSections(self, PYSMELLDICT, name):
+        path = os.path.join(self.directory, name)
+        writeSections(path, PYSMELLDICT)
+        return SectionedTags([path])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testReadSections(self):
+        path = os.path.join(self.directory, 'pysmell')
+        self.assertTrue(isSectioned(path))
+        self.assertFalse(isSectioned(os.path.join(self.directory, 'missing')))
+        self.assertEqual(readSections(path, ['POINTERS', 'CONSTANTS']),
+            {'POINTERS': {}, 'CONSTANTS': ['Module.aconstant', 'Module.bconst']})
+        self.assertEqual(loadTags(path), (SECTIONED, self.originalDict))
+        self.assertEqual(readTags(path), self.originalDict)
+
+
+    def testOnlyNeededSectionsAreRead(self):
+        findCompletions('', self.pysmelldict, CompletionOptions(Types.INSTANCE, klass='Module.bClass', parents=[]))
+        self.assertEqual(self.pysmelldict.loadedSections(), ['CLASSES'])
+        findCompletions('b', self.pysmelldict, CompletionOptions(Types.FUNCTION, name='b', rindex=-1))
+        self.assertEqual(self.pysmelldict.loadedSections(), ['CLASSES', 'FUNCTIONS'])
+
+
+    def testLogIsAppliedToEachSection(self):
+        path = os.path.join(self.directory, 'pysmell')
+        changed = {'CONSTANTS': ['Module.cconst'], 'FUNCTIONS': [], 'CLASSES': {},
+                    'HIERARCHY': ['Module'], 'POINTERS': {}}
+        appendToLog(path, splitByModule(changed))
+        PYSMELLDICT = SectionedTags([path])
+        self.assertEqual(PYSMELLDICT['CONSTANTS'], ['Module.cconst'])
+        self.assertEqual(PYSMELLDICT.loadedSections(), ['CONSTANTS'])
+        self.assertEqual(PYSMELLDICT['CLASSES'], {})
+
+
+    def testCompactKeepsTheFormat(self):
+        path = os.path.join(self.directory, 'pysmell')
+        appendToLog(path, {}, ['Module'])
+        tags.compact(path)
+        self.assertEqual(loadTags(path)[0], SECTIONED)
+        self.assertEqual(readTags(path)['HIERARCHY'], [])
+
+
+    def testFindPYSMELLDICT(self):
+        writeSections(os.path.join(self.directory, 'PYSMELLTAGS'), self.originalDict)
+        found = findPYSMELLDICT(os.path.join(self.directory, 'Module.py'))
+        self.assertTrue(isinstance(found, SectionedTags))
+        self.assertEqual(found.loadedSections(), [])
+        compls = findCompletions('b', found, CompletionOptions(Types.TOPLEVEL))
+        self.assertEqual(compls, [compFunc('b', 'arg1, arg2'), compClass('bClass'), compConst('bconst')])
+        self.assertEqual(found.loadedSections(), ['CLASSES', 'FUNCTIONS', 'CONSTANTS'])
+
+
+if __name__ == '__main__':
+    unittest.main()
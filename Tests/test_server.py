@@ -0,0 +1,254 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+
+from pysmell import idehelper, snapshot
+from pysmell.server import CompletionServer, createToken, makePrivate, readToken
+from pysmell.benchserve import benchServe, completionRequest, percentile
+from pysmell.outputHandlers.PickleOut import PickleOut
+from pysmell.outputHandlers.SQLiteOut import SQLiteOut
+from pysmell.tagslog import appendToLog
+
+
+class SlowServer(CompletionServer):
+    def complete(self, request):
+        time.sleep(request.get('sleep', 0))
+        return CompletionServer.complete(self, request)
+
+
+class CompletionServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        self.path = os.path.join(self.directory, 'Other.py')
+        sourceFile = open(self.path, 'w')
+        sourceFile.write('x = 1\nb')
+        sourceFile.close()
+        self.server = SlowServer(workers=2, deadline=5)
+
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+
+    def request(self, requestId, **extra):
+        request = completionRequest(self.path)
+        request['id'] = requestId
+        request.update(extra)
+        return request
+
+
+    def testComplete(self):
+        completions = self.server.complete(self.request(1))
+        self.assertEqual([completion['word'] for completion in completions], ['b', 'bconst'])
+        self.assertEqual(self.server.complete(self.request(1, limit=1))[0]['word'], 'b')
+        self.assertEqual(self.server.complete(self.request(1, line=5)), [])
+
+
+    def exchange(self, *connections):
+        "send the requests of every connection at once and return the responses of each"
+        async def client(host, port, requests):
+            reader, writer = await asyncio.open_connection(host, port)
+            for request in requests:
+                writer.write(request if isinstance(request, bytes) else (json.dumps(request) + '\n').encode('utf-8'))
+            await writer.drain()
+            responses = []
+            for _ in requests:
+                responses.append(json.loads((await reader.readline()).decode('utf-8')))
+            writer.close()
+            return responses
+
+        async def run():
+            server = await self.server.start('127.0.0.1', 0)
+            host, port = server.sockets[0].getsockname()[:2]
+            try:
+                return await asyncio.gather(*[client(host, port, requests) for requests in connections])
+            finally:
+                server.close()
+                await server.wait_closed()
+        return asyncio.run(run())
+
+
+    def testClientsShareTheTags(self):
+        first, second = self.exchange([self.request(1)], [self.request(2), self.request(3)])
+        self.assertEqual([response['id'] for response in first], [1])
+        self.assertEqual(sorted(response['id'] for response in second), [2, 3])
+        for response in first + second:
+            self.assertEqual([completion['word'] for completion in response['completions']], ['b', 'bconst'])
+        self.assertEqual(len(self.server.tagsCache.projects), 1)
+
+
+    def testCompletesWhileReindexing(self):
+        self.assertEqual(len(self.server.complete(self.request(1))), 2)
+        appendToLog(os.path.join(self.directory, 'PYSMELLTAGS'), {'Added': {
+            'CONSTANTS': ['Added.bnew'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Added'], 'POINTERS': {}}})
+        reindexing, release = threading.Event(), threading.Event()
+        deriveIndex = snapshot.deriveIndex
+        def slowDerive(*args):
+            reindexing.set()
+            release.wait(5)
+            return deriveIndex(*args)
+        snapshot.deriveIndex = slowDerive
+        self.addCleanup(setattr, snapshot, 'deriveIndex', deriveIndex)
+
+        reindexed = []
+        thread = threading.Thread(target=lambda: reindexed.append(self.server.complete(self.request(2))))
+        thread.start()
+        try:
+            self.assertTrue(reindexing.wait(5))
+            response = self.exchange([self.request(3)])[0][0]
+            self.assertEqual([completion['word'] for completion in response['completions']], ['b', 'bconst'])
+            self.assertEqual(reindexed, [])
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual([completion['word'] for completion in reindexed[0]], ['b', 'bconst', 'bnew'])
+
+
+    def testRequestsOnTheSameTagsRunTogether(self):
+        self.server.complete(self.request(1))
+        together = threading.Barrier(2, timeout=5)
+        findCompletionRecords = idehelper._findCompletionRecords
+        def meet(*args):
+            together.wait()
+            return findCompletionRecords(*args)
+        idehelper._findCompletionRecords = meet
+        self.addCleanup(setattr, idehelper, '_findCompletionRecords', findCompletionRecords)
+        async def run():
+            return await asyncio.gather(self.server.answer(self.request(2)), self.server.answer(self.request(3)))
+        for response in asyncio.run(run()):
+            self.assertEqual([completion['word'] for completion in response['completions']], ['b', 'bconst'])
+
+
+    def testSQLiteTagsOnManyWorkers(self):
+        directory = os.path.join(self.directory, 'sqlite')
+        os.mkdir(directory)
+        SQLiteOut(os.path.join(directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        path = os.path.join(directory, 'Other.py')
+        server = SlowServer(workers=4, deadline=5)
+        threads = set()
+        def complete(request):
+            threads.add(threading.current_thread())
+            return CompletionServer.complete(server, request)
+        server.complete = complete
+        async def run():
+            # the first request opens the database on one worker, the others run on the rest
+            first = await server.answer(self.request(1, path=path))
+            others = await asyncio.gather(*[server.answer(self.request(requestId, path=path))
+                                            for requestId in range(2, 10)])
+            return [first] + list(others)
+        try:
+            responses = asyncio.run(run())
+        finally:
+            server.close()
+        self.assertTrue(len(threads) > 1)
+        for response in responses:
+            self.assertEqual([completion['word'] for completion in response['completions']], ['b', 'bconst'])
+
+
+    def testToken(self):
+        self.server.token = 'secret'
+        responses = self.exchange([self.request(1), self.request(2, token='wrong'), self.request(3, token='secret')])[0]
+        responses = dict((response['id'], response) for response in responses)
+        self.assertEqual(responses[1]['error'], 'invalid token')
+        self.assertEqual(responses[2]['error'], 'invalid token')
+        self.assertEqual(len(responses[3]['completions']), 2)
+
+
+    def testPrivateSocket(self):
+        directory = os.path.join(self.directory, 'run')
+        makePrivate(directory)
+        makePrivate(directory)
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        os.chmod(directory, 0o755)
+        self.assertRaises(PermissionError, makePrivate, directory)
+        os.chmod(directory, 0o700)
+
+        socketPath = os.path.join(directory, 'serve.sock')
+        async def run():
+            server = await self.server.start(socketPath=socketPath)
+            mode = os.stat(socketPath).st_mode
+            server.close()
+            await server.wait_closed()
+            return mode
+        self.assertEqual(stat.S_IMODE(asyncio.run(run())), 0o600)
+
+        tokenPath = os.path.join(directory, 'token')
+        token = createToken(tokenPath)
+        self.assertEqual(len(token), 32)
+        self.assertEqual(stat.S_IMODE(os.stat(tokenPath).st_mode), 0o600)
+        self.assertEqual(createToken(tokenPath), token)
+        self.assertEqual(readToken(tokenPath), token)
+        os.chmod(tokenPath, 0o644)
+        self.assertRaises(PermissionError, readToken, tokenPath)
+
+
+    def testDeadline(self):
+        responses = self.exchange([self.request(1, sleep=0.5, deadline=0.05), self.request(2)])[0]
+        responses = dict((response['id'], response) for response in responses)
+        self.assertTrue('deadline' in responses[1]['error'])
+        self.assertEqual(len(responses[2]['completions']), 2)
+
+
+    def testInvalidRequests(self):
+        responses = self.exchange([b'not json\n', {'id': 2}])[0]
+        self.assertTrue(responses[0]['error'].startswith('invalid request'))
+        self.assertEqual(responses[1]['id'], 2)
+        self.assertTrue('KeyError' in responses[1]['error'])
+
+
+    def testStdio(self):
+        inputRead, inputWrite = os.pipe()
+        outputRead, outputWrite = os.pipe()
+        os.write(inputWrite, (json.dumps(self.request(1)) + '\n').encode('utf-8') + b'not json\n')
+        os.close(inputWrite)
+        input, output = os.fdopen(inputRead, 'rb'), os.fdopen(outputWrite, 'wb')
+        asyncio.run(self.server.serveStdio(input, output))
+        responseFile = os.fdopen(outputRead, 'rb')
+        try:
+            responses = [json.loads(line.decode('utf-8')) for line in responseFile]
+        finally:
+            responseFile.close()
+            input.close()
+        self.assertEqual(len(responses), 2)
+        responses.sort(key=lambda response: response['id'] is None)
+        self.assertEqual([completion['word'] for completion in responses[0]['completions']], ['b', 'bconst'])
+        self.assertTrue(responses[1]['error'].startswith('invalid request'))
+
+
+    def testBenchServe(self):
+        results = asyncio.run(benchServe(self.request(1), [1, 3], requests=2, workers=2))
+        self.assertEqual([run['clients'] for run in results['runs']], [1, 3])
+        self.assertEqual([run['requests'] for run in results['runs']], [2, 6])
+        self.assertEqual([run['errors'] for run in results['runs']], [0, 0])
+        self.assertTrue(results['runs'][0]['p50'] <= results['runs'][0]['p99'])
+
+
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 100)
+        self.assertEqual(percentile([3], 0.99), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
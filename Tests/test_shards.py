@@ -0,0 +1,136 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.codefinder import ModuleDict
+from pysmell.shards import splitByPackage, getShardSet
+from pysmell.outputHandlers.PickleOut import PickleOut
+from pysmell.outputHandlers.StringTableOut import StringTableOut
+from pysmell.outputHandlers.ShardedOut import ShardedOut
+from pysmell.idehelper import findPYSMELLDICT, findCompletions, requirePackages, CompletionOptions, Types
+
+
+def klass(bases, properties):
+    return dict(constructor=[], bases=bases, properties=properties, methods=[], docstring='')
+
+
+class ShardsTest(unittest.TestCase):
+    def setUp(self):
+        self.modules = ModuleDict()
+        self.modules.update({
+            'HIERARCHY': ['Script', 'Lib', 'Lib.sub', 'Other'],
+            'CONSTANTS': ['Script.VALUE', 'Lib.sub.CONST', 'Other.OTHER'],
+            'FUNCTIONS': [('Lib.func', [], '')],
+            'CLASSES': {
+                'Script.Mine': klass(['Lib.sub.Base'], ['mine']),
+                'Lib.sub.Base': klass(['Other.Root'], ['base']),
+                'Other.Root': klass([], ['root']),
+            },
+            'POINTERS': {'Lib.Base': 'Lib.sub.Base', 'Lib.*': 'Other.*'},
+        })
+        self.directory = tempfile.mkdtemp()
+        ShardedOut(os.path.join(self.directory, 'PYSMELLTAGS'), PickleOut).write(self.modules)
+        self.script = os.path.join(self.directory, 'Script.py')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testSplitByPackage(self):
+        shards = splitByPackage(self.modules)
+        self.assertEqual(sorted(shards.keys()), ['Lib', 'Other', 'Script'])
+        self.assertEqual(shards['Lib']['HIERARCHY'], ['Lib', 'Lib.sub'])
+        self.assertEqual(shards['Lib']['CONSTANTS'], ['Lib.sub.CONST'])
+        self.assertEqual(shards['Lib']['FUNCTIONS'], [('Lib.func', [], '')])
+        self.assertEqual(list(shards['Lib']['CLASSES'].keys()), ['Lib.sub.Base'])
+        self.assertEqual(shards['Lib']['POINTERS'], {'Lib.Base': 'Lib.sub.Base', 'Lib.*': 'Other.*'})
+
+
+    def testShardedOutput(self):
+        self.assertEqual(sorted(os.listdir(self.directory)),
+            ['PYSMELLTAGS', 'PYSMELLTAGS.Lib', 'PYSMELLTAGS.Other', 'PYSMELLTAGS.Script', 'PYSMELLTAGS.manifest'])
+
+
+    def testOnlyTheOwnPackageIsLoaded(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        self.assertEqual(PYSMELLDICT['HIERARCHY'], ['Script'])
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Script'])
+
+        self.assertTrue(requirePackages(PYSMELLDICT, ['Lib']))
+        self.assertFalse(requirePackages(PYSMELLDICT, ['Lib', 'Unknown']))
+        self.assertEqual(PYSMELLDICT['HIERARCHY'], ['Script', 'Lib', 'Lib.sub'])
+
+
+    def testTagsKeepTheirShardSet(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        shardSet = getShardSet(PYSMELLDICT)
+        for number in range(20):
+            findPYSMELLDICT(self.script)
+        self.assertTrue(getShardSet(PYSMELLDICT) is shardSet)
+        self.assertTrue(getShardSet(dict(PYSMELLDICT)) is None)
+        options = CompletionOptions(Types.INSTANCE, klass='Script.Mine', parents=['Lib.sub.Base'])
+        words = [comp['word'] for comp in findCompletions('', PYSMELLDICT, options)]
+        self.assertEqual(words, ['base', 'mine', 'root'])
+
+
+    def testModuleCompletionsLoadStarImports(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        options = CompletionOptions(Types.MODULE, module='Lib', showMembers=True)
+        words = [comp['word'] for comp in findCompletions('', PYSMELLDICT, options)]
+        self.assertEqual(words, ['Base', 'OTHER', 'Root', 'func', 'sub'])
+
+
+    def testInstanceCompletionsLoadAncestors(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        options = CompletionOptions(Types.INSTANCE, klass='Script.Mine', parents=['Lib.sub.Base'])
+        words = [comp['word'] for comp in findCompletions('', PYSMELLDICT, options)]
+        self.assertEqual(words, ['base', 'mine', 'root'])
+
+
+    def testTopLevelLoadsEverything(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        findCompletions('', PYSMELLDICT, CompletionOptions(Types.TOPLEVEL))
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Lib', 'Other', 'Script'])
+
+
+    def testFiltersSkipShardsWithoutTheName(self):
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        words = [comp['word'] for comp in findCompletions('OT', PYSMELLDICT, CompletionOptions(Types.TOPLEVEL))]
+        self.assertEqual(words, ['OTHER'])
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Other', 'Script'])
+
+        options = CompletionOptions(Types.FUNCTION, name='func', rindex=-1)
+        self.assertEqual(len(findCompletions('func', PYSMELLDICT, options)), 1)
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Lib', 'Other', 'Script'])
+
+
+    def testFiltersSkipShardsWithoutTheModule(self):
+        self.modules['HIERARCHY'].append('Library')
+        self.modules['CONSTANTS'].append('Library.LIBRARY')
+        ShardedOut(os.path.join(self.directory, 'PYSMELLTAGS'), PickleOut).write(self.modules)
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        options = CompletionOptions(Types.MODULE, module='Lib.su', showMembers=False)
+        self.assertEqual([comp['word'] for comp in findCompletions('', PYSMELLDICT, options)], ['sub'])
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Lib', 'Script'])
+
+
+    def testManifestsWithoutFilters(self):
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS.manifest')).write(
+            {'Script': 'PYSMELLTAGS.Script', 'Lib': 'PYSMELLTAGS.Lib', 'Other': 'PYSMELLTAGS.Other'})
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        findCompletions('OT', PYSMELLDICT, CompletionOptions(Types.TOPLEVEL))
+        self.assertEqual(sorted(getShardSet(PYSMELLDICT).loaded), ['Lib', 'Other', 'Script'])
+
+
+    def testShardsInAnotherFormat(self):
+        ShardedOut(os.path.join(self.directory, 'PYSMELLTAGS'), StringTableOut).write(self.modules)
+        PYSMELLDICT = findPYSMELLDICT(self.script)
+        options = CompletionOptions(Types.INSTANCE, klass='Script.Mine', parents=['Lib.sub.Base'])
+        words = [comp['word'] for comp in findCompletions('', PYSMELLDICT, options)]
+        self.assertEqual(words, ['base', 'mine', 'root'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import threading
+
+from pysmell.snapshot import SnapshotStore
+from pysmell import index as indexModule
+from pysmell.index import getIndex
+
+
+def moduleTags(module, names, base=None):
+    klass = '%s.%s' % (module, names[0])
+    return {
+        'CONSTANTS': ['%s.%s' % (module, name) for name in names[1:]],
+        'FUNCTIONS': [],
+        'CLASSES': {klass: {'constructor': [], 'bases': base and [base] or [], 'properties': ['prop'],
+                            'methods': [('method', [], '')], 'docstring': ''}},
+        'POINTERS': {},
+        'HIERARCHY': [module],
+    }
+
+
+def merged(*tags):
+    result = {'CONSTANTS': [], 'FUNCTIONS': [], 'CLASSES': {}, 'POINTERS': {}, 'HIERARCHY': []}
+    for partial in tags:
+        for key, value in partial.items():
+            if isinstance(value, dict):
+                result[key].update(value)
+            else:
+                result[key].extend(value)
+    return result
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SnapshotStore(merged(moduleTags('A', ['Base', 'aconst']),
+                                          moduleTags('B', ['Child', 'bconst'], 'A.Base')))
+
+
+    def constants(self, snapshot):
+        return sorted(snapshot.PYSMELLDICT['CONSTANTS'])
+
+
+    def testUpdateSharesUnchangedModules(self):
+        first = self.store.current()
+        second = self.store.update(moduleTags('B', ['Child', 'other']))
+        self.assertTrue(self.store.current() is second)
+        self.assertEqual(second.version, first.version + 1)
+        self.assertTrue(second.modules['A'] is first.modules['A'])
+        self.assertFalse(second.modules['B'] is first.modules['B'])
+        self.assertEqual(self.constants(second), ['A.aconst', 'B.other'])
+
+
+    def testOldSnapshotsDontChange(self):
+        first = self.store.current()
+        index = getIndex(first.PYSMELLDICT)
+        self.store.update(moduleTags('A', ['Base', 'changed']), deleted=['B'])
+        self.assertEqual(self.constants(first), ['A.aconst', 'B.bconst'])
+        self.assertTrue(getIndex(first.PYSMELLDICT) is index)
+        self.assertEqual(sorted(self.store.current().modules), ['A'])
+        self.assertEqual(self.constants(self.store.current()), ['A.changed'])
+
+
+    def testKeepsItsIndex(self):
+        first = self.store.current()
+        index = getIndex(first.PYSMELLDICT)
+        for number in range(indexModule.MAXINDEXES * 2):
+            getIndex(merged(moduleTags('C%d' % number, ['Other'])))
+            self.store.update(moduleTags('C', ['Other', 'c%d' % number]))
+        self.assertTrue(getIndex(first.PYSMELLDICT) is index)
+
+
+    def testIndexStartsFromThePreviousOne(self):
+        self.store.update(moduleTags('C', ['Other', 'cconst']))
+        first = getIndex(self.store.current().PYSMELLDICT)
+        childMembers = first.members('B.Child')
+        otherMembers = first.members('C.Other')
+        self.store.update(moduleTags('C', ['Other', 'cconst']))
+        second = getIndex(self.store.current().PYSMELLDICT)
+        self.assertFalse(second is first)
+        self.assertTrue(second.members('B.Child') is childMembers)
+        self.assertFalse(second.members('C.Other') is otherMembers)
+
+        # changing a base class changes its subclasses
+        self.store.update(moduleTags('A', ['Base']))
+        third = getIndex(self.store.current().PYSMELLDICT)
+        self.assertFalse(third.members('B.Child') is childMembers)
+
+
+    def testReadersDuringUpdates(self):
+        errors = []
+        done = threading.Event()
+        def read():
+            while not done.is_set():
+                snapshot = self.store.current()
+                constants = self.constants(snapshot)
+                try:
+                    self.assertEqual(len(constants), 2)
+                    self.assertEqual(constants, self.constants(snapshot))
+                    getIndex(snapshot.PYSMELLDICT).members('B.Child')
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for version in range(200):
+                self.store.update(moduleTags('B', ['Child', 'b%d' % version], 'A.Base'), precompute=version % 2)
+        finally:
+            done.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.store.current().version, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
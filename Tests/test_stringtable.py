@@ -0,0 +1,60 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.stringtable import encode, decode
+from pysmell.tagsfile import readTags
+from pysmell.outputHandlers.StringTableOut import StringTableOut
+
+
+class StringTableTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant', 'Module.bconst', 'TOPLEVEL'],
+                'FUNCTIONS' : [('Module.a', [], ''), ('Module.b', ['self', '*args', '**kwargs'], 'doc')],
+                'CLASSES' : {
+                    'Module.aClass': {
+                        'constructor': ['self', '*args'],
+                        'bases': ['object', 'Other.Base'],
+                        'properties': ['aprop', 'bprop'],
+                        'methods': [('am', ['self'], ''), ('bm', ['self', '**kwargs'], 'bm doc')],
+                        'docstring': 'aClass doc',
+                    },
+                },
+                'HIERARCHY' : ['Module', 'Other'],
+                'POINTERS': {'Module.Base': 'Other.Base', 'Module.*': 'Other.*'},
+            }
+
+
+    def testRoundTrip(self):
+        self.assertEqual(decode(encode(self.pysmelldict)), self.pysmelldict)
+
+
+    def testStringsAreStoredOnce(self):
+        strings = encode(self.pysmelldict)['STRINGS']
+        self.assertEqual(len(strings), len(set(strings)))
+        self.assertEqual(strings.count('Module'), 1)
+        self.assertTrue('self' in strings)
+        self.assertFalse('Module.aClass' in strings)
+
+
+    def testDecodedStringsAreShared(self):
+        decoded = decode(encode(self.pysmelldict))
+        klass = decoded['CLASSES']['Module.aClass']
+        self.assertTrue(klass['methods'][0][1][0] is decoded['FUNCTIONS'][1][1][0])
+        self.assertTrue(klass['bases'][1] is decoded['POINTERS']['Module.Base'])
+
+
+    def testReadTags(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'PYSMELLTAGS')
+            StringTableOut(path).write(self.pysmelldict)
+            self.assertEqual(readTags(path), self.pysmelldict)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
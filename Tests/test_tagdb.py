@@ -0,0 +1,96 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.tagdb import TagDB, writeTagDB, isTagDB
+from pysmell.index import getIndex
+from pysmell.idehelper import findCompletions, findPYSMELLDICT, CompletionOptions, Types
+
+from Tests.test_completions import CompletionTest, compFunc, compClass, compConst
+
+
+class TagDBCompletionTest(CompletionTest):
+    "every completion test again, with the tags in a database"
+    def setUp(self):
+        CompletionTest.setUp(self)
+        self.originalDict = self.pysmelldict
+        self.directory = tempfile.mkdtemp()
+        self.dbs = []
+        self.pysmelldict = self.toDB(self.pysmelldict, 'pysmell')
+        self.nestedDict = self.toDB(self.nestedDict, 'nested')
+        self.complicatedDict = self.toDB(self.complicatedDict, 'complicated')
+
+
+    def toDB(self, PYSMELLDICT, name):
+        path = os.path.join(self.directory, name)
+        writeTagDB(path, PYSMELLDICT)
+        db = TagDB(path)
+        self.dbs.append(db)
+        return db
+
+
+    def tearDown(self):
+        for db in self.dbs:
+            db.close()
+        shutil.rmtree(self.directory)
+
+
+    def testPrivateNamesSortLast(self):
+        # the database can't be changed in place
+        self.originalDict['CONSTANTS'].extend(['Module._aconstant', 'Module.__bconst'])
+        self.pysmelldict = self.toDB(self.originalDict, 'private')
+        CompletionTest.testPrivateNamesSortLast(self)
+
+
+    def testClassLookups(self):
+        classes = self.pysmelldict['CLASSES']
+        self.assertTrue('Module.aClass' in classes)
+        self.assertFalse('Module.cClass' in classes)
+        self.assertEqual(classes['Module.bClass']['bases'], ['Module.aClass'])
+        self.assertEqual(classes['Module.bClass']['methods'], [('cm', [], ''), ('dm', [], '')])
+        self.assertEqual(sorted(classes.keys()), ['Module.aClass', 'Module.bClass'])
+        self.assertEqual(self.complicatedDict['POINTERS'].get('A.THING'), 'C.CONST_C')
+
+
+    def testPrefixQueries(self):
+        index = getIndex(self.pysmelldict)
+        self.assertEqual([record.word for record in index.candidates('topLevel', 'b', False)],
+                         ['b', 'bClass', 'bconst'])
+        self.assertEqual([record.word for record in index.candidates('topLevel', 'B', True)],
+                         ['b', 'bClass', 'bconst'])
+        self.assertEqual([record.word for record in index.candidates('topLevel', 'B', False)], [])
+        self.assertEqual([record.word for record in index.candidates('allMembers', 'c', False)], ['cm', 'cprop'])
+        # neither is a wildcard
+        self.assertEqual(index.candidates('functions', '_', True), [])
+        self.assertEqual(index.candidates('functions', '*', False), [])
+
+
+    def testOverlayOnTheDatabase(self):
+        overlay = {
+            'CONSTANTS': ['Module.bnew'],
+            'FUNCTIONS': [],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        }
+        options = CompletionOptions(Types.TOPLEVEL)
+        options.overlay = overlay
+        self.assertEqual(findCompletions('b', self.pysmelldict, options), [compConst('bnew')])
+        self.assertEqual(findCompletions('b', self.pysmelldict, CompletionOptions(Types.TOPLEVEL)),
+                         [compFunc('b', 'arg1, arg2'), compClass('bClass'), compConst('bconst')])
+
+
+    def testFindPYSMELLDICT(self):
+        path = os.path.join(self.directory, 'PYSMELLTAGS')
+        writeTagDB(path, self.originalDict)
+        self.assertTrue(isTagDB(path))
+        found = findPYSMELLDICT(os.path.join(self.directory, 'Module.py'))
+        self.dbs.append(found)
+        self.assertTrue(isinstance(found, TagDB))
+        compls = findCompletions('b', found, CompletionOptions(Types.TOPLEVEL))
+        self.assertEqual(compls, [compFunc('b', 'arg1, arg2'), compClass('bClass'), compConst('bconst')])
+
+
+if __name__ == '__main__':
+    unittest.main()
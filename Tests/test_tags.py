@@ -2,6 +2,9 @@ import unittest
 from textwrap import dedent
 import subprocess
 import os
+import shutil
+import sys
+import tempfile
 from pysmell import idehelper
 from pysmell.codefinder import ModuleDict
 from pysmell import tags
@@ -252,6 +255,28 @@ class FunctionalTest(TestCase):
         self.assertEqual(stderr.replace('\r\n', '\n'), expected)
 
 
+    def testPackageNamedLikeACommand(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(directory, 'index'))
+            open(os.path.join(directory, 'index', '__init__.py'), 'w').write('def indexed():\n    pass\n')
+            subprocess.call(["pysmell", "index"], cwd=directory)
+            PYSMELLDICT = eval(open(os.path.join(directory, 'PYSMELLTAGS')).read())
+            self.assertEqual(PYSMELLDICT['HIERARCHY'], ['index'])
+        finally:
+            shutil.rmtree(directory)
+
+
+    def testCommandsAreImportedWhenUsed(self):
+        proc = subprocess.Popen([sys.executable, '-c', dedent("""\
+            import sys
+            import pysmell.tags
+            print([name for name in sys.modules if name.startswith('asyncio') or name in
+                   ('pysmell.server', 'pysmell.batch', 'pysmell.benchload', 'pysmell.benchserve')])
+            """)], stdout=subprocess.PIPE)
+        self.assertEqual(proc.communicate()[0].strip(), b'[]')
+
+
     def DONTtestDunderAll(self):
         self.fail("when doing 'from place import *', do not bring in everything"
         "in the pointers but look for __all__ in the module and add only"
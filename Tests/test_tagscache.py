@@ -0,0 +1,155 @@
+import unittest
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+from pysmell import index, tagscache
+from pysmell.index import getBaseIndex, getIndex
+from pysmell.tagscache import TagsCache
+from pysmell.tagslog import appendToLog, logPath
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+def writeTags(directory, module):
+    PickleOut(os.path.join(directory, 'PYSMELLTAGS')).write({
+        'CONSTANTS': ['%s.aconstant' % module, '%s.bconst' % module],
+        'FUNCTIONS': [('%s.b' % module, ['arg1', 'arg2'], '')],
+        'CLASSES': {},
+        'HIERARCHY': [module],
+        'POINTERS': {},
+    })
+
+
+def touch(path, later):
+    os.utime(path, (time.time() + later, time.time() + later))
+
+
+class TagsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.projects = []
+        for name in ('One', 'Two'):
+            project = os.path.join(self.directory, name)
+            os.mkdir(project)
+            writeTags(project, name)
+            self.projects.append(project)
+        self.cache = TagsCache()
+        self.findPYSMELLDICT = tagscache.idehelper.findPYSMELLDICT
+
+
+    def tearDown(self):
+        tagscache.idehelper.findPYSMELLDICT = self.findPYSMELLDICT
+        shutil.rmtree(self.directory)
+
+
+    def blockLoading(self, project):
+        "make loading the tags of project wait until the returned event is set"
+        loading, release = threading.Event(), threading.Event()
+        def findPYSMELLDICT(path):
+            if path.startswith(project):
+                loading.set()
+                release.wait(5)
+            return self.findPYSMELLDICT(path)
+        tagscache.idehelper.findPYSMELLDICT = findPYSMELLDICT
+        return loading, release
+
+
+    def inThread(self, path):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.cache.get(path)))
+        thread.start()
+        return thread, results
+
+
+    def testGet(self):
+        path = os.path.join(self.projects[0], 'x.py')
+        PYSMELLDICT = self.cache.get(path)
+        self.assertEqual(PYSMELLDICT['HIERARCHY'], ['One'])
+        self.assertTrue(self.cache.get(path) is PYSMELLDICT)
+        self.assertTrue(self.cache.get(os.path.join(self.projects[0], 'sub', 'y.py')) is PYSMELLDICT)
+        self.assertEqual(len(self.cache.projects), 1)
+        self.assertTrue(self.cache.get(os.path.join(self.directory, 'x.py')) is None)
+
+
+    def testLoadingDoesntBlockOtherProjects(self):
+        loading, release = self.blockLoading(self.projects[0])
+        thread, results = self.inThread(os.path.join(self.projects[0], 'x.py'))
+        try:
+            self.assertTrue(loading.wait(5))
+            self.assertEqual(self.cache.get(os.path.join(self.projects[1], 'x.py'))['HIERARCHY'], ['Two'])
+            self.assertEqual(results, [])
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(results[0]['HIERARCHY'], ['One'])
+
+
+    def testStaleTagsWhileReloading(self):
+        path = os.path.join(self.projects[0], 'x.py')
+        PYSMELLDICT = self.cache.get(path)
+        writeTags(self.projects[0], 'Changed')
+        touch(os.path.join(self.projects[0], 'PYSMELLTAGS'), 5)
+        loading, release = self.blockLoading(self.projects[0])
+        thread, results = self.inThread(path)
+        try:
+            self.assertTrue(loading.wait(5))
+            self.assertTrue(self.cache.get(path) is PYSMELLDICT)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(results[0]['HIERARCHY'], ['Changed'])
+        self.assertTrue(self.cache.get(path) is results[0])
+
+
+    def testAppendedLog(self):
+        path = os.path.join(self.projects[0], 'x.py')
+        PYSMELLDICT = self.cache.get(path)
+        getIndex(PYSMELLDICT).precompute()
+        tagsPath = os.path.join(self.projects[0], 'PYSMELLTAGS')
+        appendToLog(tagsPath, {'Added': {'CONSTANTS': ['Added.c'], 'FUNCTIONS': [], 'CLASSES': {},
+                                         'HIERARCHY': ['Added'], 'POINTERS': {}}})
+        tagscache.idehelper.findPYSMELLDICT = None
+
+        appended = self.cache.get(path)
+        self.assertEqual(sorted(appended['HIERARCHY']), ['Added', 'One'])
+        self.assertEqual(PYSMELLDICT['HIERARCHY'], ['One'])
+        self.assertTrue('TOPLEVEL' in getBaseIndex(appended)._sections)
+
+        appendToLog(tagsPath, {}, ['Added'])
+        touch(logPath(tagsPath), 5)
+        self.assertEqual(self.cache.get(path)['HIERARCHY'], ['One'])
+
+
+    def testKeepsItsIndexes(self):
+        PYSMELLDICT = self.cache.get(os.path.join(self.projects[0], 'x.py'))
+        kept = getBaseIndex(PYSMELLDICT)
+        for number in range(index.MAXINDEXES * 2):
+            getIndex({'CONSTANTS': [], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': [], 'POINTERS': {}})
+        self.assertTrue(getBaseIndex(PYSMELLDICT) is kept)
+
+
+    def testForgetsReplacedTags(self):
+        path = os.path.join(self.projects[0], 'x.py')
+        getIndex(self.cache.get(path)).precompute()
+        original = weakref.ref(self.cache.get(path))
+        PickleOut(os.path.join(self.projects[0], 'PYSMELLTAGS.extra')).write({
+            'CONSTANTS': ['Extra.c'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Extra'], 'POINTERS': {}})
+        self.assertEqual(sorted(self.cache.get(path)['HIERARCHY']), ['Extra', 'One'])
+        self.assertEqual(len(self.cache.projects), 1)
+        gc.collect()
+        self.assertTrue(original() is None)
+
+        extended = weakref.ref(self.cache.get(path))
+        writeTags(self.projects[0], 'Changed')
+        touch(os.path.join(self.projects[0], 'PYSMELLTAGS'), 5)
+        self.assertEqual(sorted(self.cache.get(path)['HIERARCHY']), ['Changed', 'Extra'])
+        gc.collect()
+        self.assertTrue(extended() is None)
+
+
+if __name__ == '__main__':
+    unittest.main()
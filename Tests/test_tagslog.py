@@ -0,0 +1,164 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from pysmell.tagslog import splitByModule, applyLog, changesOf, appendToLog, readLog, logPath, removeLog
+from pysmell.tagsfile import readTags, loadTags, STRINGTABLE
+from pysmell.outputHandlers.StringTableOut import StringTableOut
+from pysmell import tags
+
+
+def klass(properties):
+    return dict(constructor=[], bases=[], properties=properties, methods=[], docstring='')
+
+
+class TagsLogTest(unittest.TestCase):
+    def setUp(self):
+        self.pysmelldict = {
+                'CONSTANTS' : ['Module.aconstant', 'Module.sub.SUB', 'Other.OTHER'],
+                'FUNCTIONS' : [('Module.a', [], ''), ('Other.b', [], '')],
+                'CLASSES' : {'Module.aClass': klass(['aprop']), 'Other.oClass': klass([])},
+                'HIERARCHY' : ['Module', 'Module.sub', 'Other'],
+                'POINTERS': {'Module.imported': 'Other.b', 'Other.*': 'Module.*'},
+            }
+        self.directory = tempfile.mkdtemp()
+        self.tagsPath = os.path.join(self.directory, 'PYSMELLTAGS')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testSplitByModule(self):
+        partials = splitByModule(self.pysmelldict)
+        self.assertEqual(sorted(partials.keys()), ['Module', 'Module.sub', 'Other'])
+        self.assertEqual(partials['Module'], {
+                'CONSTANTS' : ['Module.aconstant'],
+                'FUNCTIONS' : [('Module.a', [], '')],
+                'CLASSES' : {'Module.aClass': klass(['aprop'])},
+                'HIERARCHY' : ['Module'],
+                'POINTERS': {'Module.imported': 'Other.b'},
+            })
+        self.assertEqual(partials['Module.sub']['CONSTANTS'], ['Module.sub.SUB'])
+
+
+    def testApplyLog(self):
+        first = splitByModule({'CONSTANTS': ['Module.first'], 'FUNCTIONS': [], 'CLASSES': {},
+                               'HIERARCHY': ['Module'], 'POINTERS': {}})
+        second = splitByModule({'CONSTANTS': ['Module.second'], 'FUNCTIONS': [],
+                                'CLASSES': {'Module.bClass': klass([])}, 'HIERARCHY': ['Module'], 'POINTERS': {}})
+        records = [('replace', 'Module', first['Module']), ('delete', 'Other', None),
+                   ('replace', 'Module', second['Module'])]
+        applyLog(self.pysmelldict, records)
+        self.assertEqual(self.pysmelldict, {
+                'CONSTANTS' : ['Module.sub.SUB', 'Module.second'],
+                'FUNCTIONS' : [],
+                'CLASSES' : {'Module.bClass': klass([])},
+                'HIERARCHY' : ['Module.sub', 'Module'],
+                'POINTERS': {},
+            })
+
+
+    def testChangesOf(self):
+        partial = {'CONSTANTS': ['Module.c'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Module'], 'POINTERS': {}}
+        records = [('replace', 'Module', {}), ('delete', 'Other', None), ('delete', 'Module', None),
+                   ('replace', 'Module', partial), ('replace', 'Gone', {}), ('delete', 'Gone', None)]
+        partials, deleted = changesOf(records)
+        self.assertEqual(partials, {'Module': partial})
+        self.assertEqual(deleted, set(['Other', 'Gone']))
+
+
+    def testTruncatedLog(self):
+        appendToLog(self.tagsPath, {}, ['Other'])
+        appendToLog(self.tagsPath, {}, ['Module'])
+        logFile = open(logPath(self.tagsPath), 'rb+')
+        logFile.truncate(os.path.getsize(logPath(self.tagsPath)) - 3)
+        logFile.close()
+        self.assertEqual(readLog(self.tagsPath), [('delete', 'Other', None)])
+
+
+    def testAppendAndCompact(self):
+        StringTableOut(self.tagsPath).write(self.pysmelldict)
+        changed = {'CONSTANTS': ['Other.NEW'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Other'], 'POINTERS': {}}
+        oldRatio = tags.COMPACT_RATIO
+        tags.COMPACT_RATIO = 1000
+        try:
+            tags.appendModules(self.tagsPath, changed, ['Module.sub'])
+        finally:
+            tags.COMPACT_RATIO = oldRatio
+        self.assertTrue(os.path.exists(logPath(self.tagsPath)))
+        expected = {
+                'CONSTANTS' : ['Module.aconstant', 'Other.NEW'],
+                'FUNCTIONS' : [('Module.a', [], '')],
+                'CLASSES' : {'Module.aClass': klass(['aprop'])},
+                'HIERARCHY' : ['Module', 'Other'],
+                'POINTERS': {'Module.imported': 'Other.b'},
+            }
+        self.assertEqual(readTags(self.tagsPath), expected)
+
+        tags.compact(self.tagsPath)
+        self.assertFalse(os.path.exists(logPath(self.tagsPath)))
+        self.assertEqual(loadTags(self.tagsPath), (STRINGTABLE, expected))
+
+
+    def testAppendWhileCompacting(self):
+        tags.FORMATS['pickle'](self.tagsPath).write(self.pysmelldict)
+        tags.appendModules(self.tagsPath, {'CONSTANTS': ['Other.OLD'], 'FUNCTIONS': [], 'CLASSES': {},
+                                           'HIERARCHY': ['Other'], 'POINTERS': {}})
+        appended = {'CONSTANTS': ['Other.NEW'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Other'], 'POINTERS': {}}
+        oldLoadTags = tags.loadTags
+        def loadTags(path):
+            tags.loadTags = oldLoadTags
+            # another pysmell --append, while the tags are read
+            appendToLog(self.tagsPath, {'Other': appended})
+            return oldLoadTags(path)
+        tags.loadTags = loadTags
+        try:
+            tags.compact(self.tagsPath)
+        finally:
+            tags.loadTags = oldLoadTags
+        self.assertEqual(readLog(self.tagsPath), [('replace', 'Other', appended)])
+        self.assertTrue('Other.OLD' in loadTags(self.tagsPath)[1]['CONSTANTS'])
+        self.assertTrue('Other.NEW' in readTags(self.tagsPath)['CONSTANTS'])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['PYSMELLTAGS', 'PYSMELLTAGS.log'])
+
+
+    def testCompactFinishesAnInterruptedCompaction(self):
+        tags.FORMATS['pickle'](self.tagsPath).write(self.pysmelldict)
+        appendToLog(self.tagsPath, {}, ['Other'])
+        os.rename(logPath(self.tagsPath), os.path.join(self.directory, '.PYSMELLTAGS.log.compacting'))
+        appendToLog(self.tagsPath, {}, ['Module.sub'])
+        tags.compact(self.tagsPath)
+        self.assertEqual(loadTags(self.tagsPath)[1]['HIERARCHY'], ['Module'])
+        self.assertEqual(os.listdir(self.directory), ['PYSMELLTAGS'])
+
+
+    def testRewriteForgetsTheLog(self):
+        newest = {'CONSTANTS': ['Other.NEWEST'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Other'], 'POINTERS': {}}
+        changed = {'CONSTANTS': ['Other.CHANGED'], 'FUNCTIONS': [], 'CLASSES': {}, 'HIERARCHY': ['Other'], 'POINTERS': {}}
+        tags.FORMATS['pickle'](self.tagsPath).write(newest)
+        tags.appendModules(self.tagsPath, changed)
+        self.assertEqual(readTags(self.tagsPath)['CONSTANTS'], ['Other.CHANGED'])
+        # what pysmell does when it writes the tags in full
+        tags.FORMATS['pickle'](self.tagsPath).write(newest)
+        removeLog(self.tagsPath)
+        self.assertEqual(readTags(self.tagsPath), newest)
+        removeLog(self.tagsPath)
+
+
+    def testAppendCompactsPastTheThreshold(self):
+        tags.FORMATS['pickle'](self.tagsPath).write(self.pysmelldict)
+        oldRatio = tags.COMPACT_RATIO
+        tags.COMPACT_RATIO = 0
+        try:
+            tags.appendModules(self.tagsPath, {'CONSTANTS': [], 'FUNCTIONS': [], 'CLASSES': {},
+                                               'HIERARCHY': [], 'POINTERS': {}}, ['Other'])
+        finally:
+            tags.COMPACT_RATIO = oldRatio
+        self.assertFalse(os.path.exists(logPath(self.tagsPath)))
+        self.assertEqual(loadTags(self.tagsPath)[1]['HIERARCHY'], ['Module', 'Module.sub'])
+
+
+if __name__ == '__main__':
+    unittest.main()
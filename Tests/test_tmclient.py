@@ -0,0 +1,164 @@
+import unittest
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from pysmell import textmate, tmclient
+from pysmell.server import CompletionServer, defaultSocket
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+
+class TextMateClientTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        PickleOut(os.path.join(self.directory, 'PYSMELLTAGS')).write({
+            'CONSTANTS': ['Module.aconstant', 'Module.bconst'],
+            'FUNCTIONS': [('Module.b', ['arg1', 'arg2'], '')],
+            'CLASSES': {},
+            'HIERARCHY': ['Module'],
+            'POINTERS': {},
+        })
+        self.path = os.path.join(self.directory, 'Other.py')
+        self.socket = os.path.join(self.directory, 'daemon.sock')
+        self.stdin, self.stdout = sys.stdin, sys.stdout
+
+
+    def tearDown(self):
+        sys.stdin, sys.stdout = self.stdin, self.stdout
+        shutil.rmtree(self.directory)
+
+
+    def serveInThread(self, completionServer=None):
+        "run a CompletionServer on self.socket in a thread, return a function stopping it"
+        loop = asyncio.new_event_loop()
+        completionServer = completionServer or CompletionServer(workers=1)
+        server = loop.run_until_complete(completionServer.start(socketPath=self.socket))
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+            completionServer.close()
+        return stop
+
+
+    def complete(self, source, line, column):
+        sys.stdin, sys.stdout = StringIO(source), StringIO()
+        result = tmclient._main(self.path, line, column, self.socket)
+        return result, sys.stdout.getvalue()
+
+
+    def testAskDaemon(self):
+        stop = self.serveInThread()
+        try:
+            request = {'id': 1, 'path': self.path, 'source': 'x = 1\nbc', 'line': 2, 'column': 2}
+            response = tmclient.askDaemon(request, self.socket, start=False)
+            self.assertEqual([completion['word'] for completion in response['completions']], ['bconst'])
+            self.assertEqual(response['start'], 0)
+            self.assertEqual(self.complete('x = 1\nbc', 2, 2), (None, 'onst'))
+            self.assertEqual(self.complete('x = 1\nq', 2, 1), (tmclient.TOOLTIP, 'No completions found'))
+        finally:
+            stop()
+
+
+    def testSlowDaemon(self):
+        completionServer = CompletionServer(workers=2)
+        complete = completionServer.complete
+        def slowComplete(request):
+            time.sleep(0.5)
+            return complete(request)
+        completionServer.complete = slowComplete
+        self.addCleanup(self.serveInThread(completionServer))
+        timeout, deadline, fallback = tmclient.TIMEOUT, tmclient.DEADLINE, textmate._main
+        textmate._main = lambda *args: self.fail("the tags were loaded again")
+        try:
+            tmclient.TIMEOUT, tmclient.DEADLINE = 5.0, 0.1
+            result, output = self.complete('x = 1\nbc', 2, 2)
+            self.assertEqual(result, tmclient.TOOLTIP)
+            self.assertTrue('deadline of 0.1s exceeded' in output)
+
+            tmclient.TIMEOUT, tmclient.DEADLINE = 0.1, 5.0
+            result, output = self.complete('x = 1\nbc', 2, 2)
+            self.assertEqual(result, tmclient.TOOLTIP)
+            self.assertTrue('did not answer within 0.1s' in output)
+            # let the daemon finish the requests given up on
+            time.sleep(1.0)
+        finally:
+            tmclient.TIMEOUT, tmclient.DEADLINE, textmate._main = timeout, deadline, fallback
+
+
+    def testNoDaemon(self):
+        request = {'id': 1, 'path': self.path, 'source': 'b', 'line': 1, 'column': 1}
+        self.assertEqual(tmclient.askDaemon(request, self.socket, start=False), None)
+
+
+    def testDefaultSocket(self):
+        self.assertEqual(tmclient.SOCKET, defaultSocket())
+        stop = self.serveInThread()
+        default = tmclient.SOCKET
+        tmclient.SOCKET = self.socket
+        try:
+            # someone else could listen in a directory others can write to
+            os.chmod(self.directory, 0o755)
+            self.assertEqual(tmclient._connect(self.socket, 0), None)
+            os.chmod(self.directory, 0o700)
+            client = tmclient._connect(self.socket, 0)
+            self.assertTrue(client is not None)
+            client.close()
+        finally:
+            tmclient.SOCKET = default
+            stop()
+
+
+    def testStartDaemon(self):
+        home = os.environ.get('HOME')
+        # the daemon keeps its indexes in ~/.pysmell
+        os.environ['HOME'] = self.directory
+        try:
+            daemon = tmclient.startDaemon(self.socket)
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+        try:
+            client = tmclient._connect(self.socket, tmclient.STARTUP)
+            self.assertTrue(client is not None)
+            client.close()
+            request = {'id': 1, 'path': self.path, 'source': 'bc', 'line': 1, 'column': 2}
+            response = tmclient.askDaemon(request, self.socket, start=False)
+            self.assertEqual(response['completions'][0]['word'], 'bconst')
+        finally:
+            daemon.terminate()
+            daemon.wait()
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.directory, '.pysmell'))
+                              if name.startswith('index-')]), 1)
+
+
+    def testDaemonThatCantStart(self):
+        request = {'id': 1, 'path': self.path, 'source': 'b', 'line': 1, 'column': 1}
+        startDaemon = tmclient.startDaemon
+        self.addCleanup(setattr, tmclient, 'startDaemon', startDaemon)
+        # a python without the daemon exits right away
+        tmclient.startDaemon = lambda path: subprocess.Popen([sys.executable, '-c', 'raise SystemExit(1)'])
+        started = time.time()
+        self.assertEqual(tmclient.askDaemon(request, self.socket), None)
+        self.assertTrue(time.time() - started < tmclient.STARTUP / 2)
+
+        def oldPopen(path):
+            raise TypeError("__init__() got an unexpected keyword argument 'start_new_session'")
+        tmclient.startDaemon = oldPopen
+        self.assertEqual(tmclient.askDaemon(request, self.socket), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
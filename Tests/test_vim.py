@@ -1,10 +1,13 @@
 
 import os.path
+import shutil
+import tempfile
 import time
 from subprocess import Popen, PIPE, call
 import sys
 import unittest
-from pysmell.vimhelper import findWord
+from pysmell.vimhelper import findWord, toVimExpression, setCompletions, showDocstring
+from pysmell.docstore import DOCSFILE, writeDocstrings
 
 vim_test = os.path.join("Tests", "test_vim.vim")
 
@@ -62,6 +65,49 @@ class VimHelperTest(unittest.TestCase):
         word = findWord(self.vim, 11, '    hehe.bbbb')
         self.assertEqual(word, 'hehe.bb')
 
+class CompletionsHandOffTest(unittest.TestCase):
+    def testToVimExpression(self):
+        self.assertEqual(toVimExpression([{'word': 'a'}, 3]), '[{"word": "a"}, 3]')
+        self.assertEqual(toVimExpression('it\'s "q" \\'), '"it\'s \\"q\\" \\\\"')
+        self.assertEqual(toVimExpression('a\nb'), '"a\\nb"')
+
+    def testSetCompletionsWithBindeval(self):
+        commands = []
+        target = []
+        class BindevalVim(object):
+            command = staticmethod(commands.append)
+            def bindeval(self, expression):
+                self.bound = expression
+                return target
+        vim = BindevalVim()
+        setCompletions(vim, 'g:completions', [{'word': 'it\'s'}])
+        self.assertEqual(commands, ['let g:completions = []'])
+        self.assertEqual(vim.bound, 'g:completions')
+        self.assertEqual(target, [{'word': 'it\'s'}])
+
+    def testSetCompletionsWithoutBindeval(self):
+        commands = []
+        class OldVim(object):
+            command = staticmethod(commands.append)
+        setCompletions(OldVim(), 'g:completions', [{'word': 'x"y'}])
+        self.assertEqual(commands, ['let g:completions = [{"word": "x\\"y"}]'])
+
+    def testShowDocstring(self):
+        commands = []
+        class DocVim(object):
+            command = staticmethod(commands.append)
+        directory = tempfile.mkdtemp()
+        try:
+            writeDocstrings(os.path.join(directory, DOCSFILE), {'Module.b': 'b "doc"'})
+            path = os.path.join(directory, 'x.py')
+            showDocstring(DocVim(), path, {'word': 'b', 'menu': 'Module'})
+            showDocstring(DocVim(), path, {'word': 'c', 'menu': 'Module'})
+            showDocstring(DocVim(), path, {})
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(commands, ['echo "b \\"doc\\""', 'echo "No docstring found"',
+                                    'echo "No docstring found"'])
+
 class VimTest(unittest.TestCase):
     def testVimFunctionally(self):
         if sys.platform == 'win32':
@@ -33,7 +33,9 @@
 ;; * Follow the installation instructions
 ;; * Open a python file (ensure the Pysmell appears in the modeline)
 ;; * Run M-x pysmell-make-tags in some directory containing the directory tree containing the current file.
+;;   The tags are made in the background; M-x pysmell-cancel-make-tags stops it.
 ;; * Press M-/ to complete a symbol using pysmell
+;; * Run M-x pysmell-show-docstring on a completed symbol to see its docstring
 
 ;;; Documentation:
 ;; PySmell will try to intelligently complete symbol in Python
@@ -73,29 +75,133 @@
 (setq pysmell-make-tags-process (list "pysmell"))
 
 
+;; Instead of the whole buffer, only the lines changed since the last
+;; completion are sent to pysmell. Two markers follow the first and the last
+;; change; the lines before the first and after the last are the ones
+;; pysmell already has. Changes are counted by buffer-chars-modified-tick,
+;; and the whole buffer is sent again whenever pysmell lost track of it.
+
+(defvar pysmell-last-buffer-id 0 "The id given to the last buffer synced with pysmell")
+(defvar pysmell-buffer-id nil "The id of this buffer for pysmell")
+(make-variable-buffer-local 'pysmell-buffer-id)
+(defvar pysmell-synced-tick nil "The buffer-chars-modified-tick of the text pysmell has")
+(make-variable-buffer-local 'pysmell-synced-tick)
+(defvar pysmell-change-start nil "Marker at the first change pysmell hasn't been sent")
+(make-variable-buffer-local 'pysmell-change-start)
+(defvar pysmell-change-end nil "Marker at the last change pysmell hasn't been sent")
+(make-variable-buffer-local 'pysmell-change-end)
+
+
+(defun pysmell-after-change (beg end old-len)
+  "Remember the region changed since the last sync"
+  (if pysmell-change-start
+      (progn
+	(when (< beg pysmell-change-start)
+	  (set-marker pysmell-change-start beg))
+	(when (> end pysmell-change-end)
+	  (set-marker pysmell-change-end end)))
+    (setq pysmell-change-start (copy-marker beg)
+	  pysmell-change-end (copy-marker end t))))
+
+
+(defun pysmell-forget-changes ()
+  (when pysmell-change-start
+    (set-marker pysmell-change-start nil)
+    (set-marker pysmell-change-end nil))
+  (setq pysmell-change-start nil
+	pysmell-change-end nil))
+
+
+(defun pysmell-send-changes (tick)
+  "Send the lines between the changes, return nil if pysmell needs the whole buffer"
+  (let* ((start (save-excursion
+		  (goto-char pysmell-change-start)
+		  (line-beginning-position)))
+	 (end (save-excursion
+		(goto-char (max pysmell-change-start pysmell-change-end))
+		(line-end-position)))
+	 (head (1- (line-number-at-pos start)))
+	 (tail (- (line-number-at-pos (point-max)) (line-number-at-pos end))))
+    (pysmell-sync-buffer pysmell-buffer-id pysmell-synced-tick tick head tail
+			 (buffer-substring-no-properties start end))))
+
+
+(defun pysmell-send-buffer ()
+  "Bring pysmell's copy of the buffer up to date"
+  (unless pysmell-buffer-id
+    (setq pysmell-buffer-id (incf pysmell-last-buffer-id)))
+  (let ((tick (buffer-chars-modified-tick)))
+    (unless (equal tick pysmell-synced-tick)
+      (save-restriction
+	(widen)
+	(unless (and pysmell-synced-tick pysmell-change-start
+		     (pysmell-send-changes tick))
+	  (pysmell-sync-buffer pysmell-buffer-id nil tick 0 0
+			       (buffer-substring-no-properties (point-min) (point-max)))))
+      (setq pysmell-synced-tick tick)
+      (pysmell-forget-changes))))
+
+
+(defun pysmell-kill-buffer ()
+  (when pysmell-buffer-id
+    (pysmell-forget-buffer pysmell-buffer-id)))
+
+
 (defun pysmell-get-all-completions ()
   "Get all the completions for the symbol under the point."
-  (pysmell-get-completions 
+  (pysmell-send-buffer)
+  (pysmell-get-buffer-completions
+   pysmell-buffer-id
    (buffer-file-name)
-   (buffer-string)
-   (line-number-at-pos)
+   (save-restriction (widen) (line-number-at-pos))
    (current-column)
    pysmell-matcher))
 
 
+(defun pysmell-show-docstring ()
+  "Show the docstring of the completion under the point."
+  (interactive)
+  (let ((docstring (pysmell-get-docstring (buffer-file-name)
+                                          (thing-at-point 'symbol))))
+    (if docstring
+        (with-output-to-temp-buffer "*pysmell-docstring*"
+          (princ docstring))
+      (message "No docstring found"))))
+
+
 (defun pysmell-make-tags (directory)
-  "Makes tags in the current tree"
+  "Makes tags in the current tree, in the background. The progress is shown in the echo area."
   (interactive "D")
   (let ((directory (expand-file-name directory)))
     (setq args
 	  (append 
 	   (list "make-pysmell-tags" "*make-pysmell-tags*")
 	   pysmell-make-tags-process
-	   (list directory "-o" (format "%s/%s" directory "PYSMELLTAGS"))))
-    (apply 'start-process args)
+	   (list "index" "--progress" directory "-o" (format "%s/%s" directory "PYSMELLTAGS"))))
+    (set-process-filter (apply 'start-process args) 'pysmell-make-tags-filter)
   (switch-to-buffer-other-window "*make-pysmell-tags*")))
 
 
+(defun pysmell-make-tags-filter (process output)
+  "Keep the output of pysmell index, and show the last 'done/total file' line"
+  (when (buffer-live-p (process-buffer process))
+    (with-current-buffer (process-buffer process)
+      (save-excursion
+	(goto-char (point-max))
+	(insert output))))
+  (let ((lines (split-string output "\n" t)))
+    (when lines
+      (message "pysmell: %s" (car (last lines))))))
+
+
+(defun pysmell-cancel-make-tags ()
+  "Stop making tags. The previous tags are left as they were"
+  (interactive)
+  (let ((process (get-process "make-pysmell-tags")))
+    (when process
+      (signal-process process 'term))))
+
+
 (setq pysmell-completions nil)
 (defun try-pysmell-complete (old)
   "Cycle through pysmell completions for the text behind the point"
@@ -145,7 +251,16 @@ static analysis."
  " PySmell"
  ;; The minor mode bindings.
  `((,(kbd "M-/") . pysmell-complete))
- :group 'pysmell)
+ :group 'pysmell
+ (if pysmell-mode
+     (progn
+       (add-hook 'after-change-functions 'pysmell-after-change nil t)
+       (add-hook 'kill-buffer-hook 'pysmell-kill-buffer nil t))
+   (remove-hook 'after-change-functions 'pysmell-after-change t)
+   (remove-hook 'kill-buffer-hook 'pysmell-kill-buffer t)
+   (pysmell-kill-buffer)
+   (pysmell-forget-changes)
+   (setq pysmell-synced-tick nil)))
 (provide 'pysmell)
 
 ;;; pysmell.el ends here
@@ -0,0 +1,141 @@
+# batch.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+``pysmell complete``: completions from the command line, for tools that
+want them for many positions at once (test harnesses, checkers,
+prefetchers) rather than for a cursor.
+
+With --batch it reads requests as JSON lines and answers each with a JSON
+line, in order. A request is for one file, which is parsed and analysed
+once for all its positions (see idehelper.completePositions):
+
+    id         anything, copied to the response
+    path       the file completed in
+    source     its text, if it isn't the one saved at path
+    positions  a list of {"line": 1-based, "column": 0-based}
+    matcher    optional, see pysmell.matchers
+    limit      optional, the most completions to return per position
+
+The response has the id and either "results", one {"completions": [...],
+"start": column the completed word starts at} per position, or "error".
+The number of positions completed per second is reported on stderr.
+"""
+
+import json
+import sys
+import time
+
+from pysmell import argparse
+from pysmell import idehelper
+from pysmell.tagscache import TagsCache
+
+
+def readSource(request):
+    if request.get('source') is not None:
+        return request['source']
+    sourceFile = open(request['path'])
+    try:
+        return sourceFile.read()
+    finally:
+        sourceFile.close()
+
+
+def completeRequest(request, tagsCache, matcher=None, limit=None):
+    "the response to one request (see the module docstring), matching with matcher unless it has its own"
+    path = request['path']
+    source = readSource(request)
+    lines = source.splitlines()
+    positions = []
+    starts = []
+    for position in request['positions']:
+        lineNo, col = position['line'], position['column']
+        start = col
+        if 0 < lineNo <= len(lines):
+            start = idehelper.findBase(lines[lineNo - 1], col)
+            positions.append((lineNo, col, lines[lineNo - 1][start:col]))
+        else:
+            positions.append((lineNo, col, ''))
+        starts.append(start)
+    PYSMELLDICT = tagsCache.get(path)
+    if PYSMELLDICT is None:
+        completions = [[] for _ in positions]
+    else:
+        completions = idehelper.completePositions(path, source, positions, PYSMELLDICT,
+                                                  request.get('matcher', matcher), request.get('limit', limit))
+    return {'id': request.get('id'),
+            'results': [{'completions': found, 'start': start} for found, start in zip(completions, starts)]}
+
+
+def completeBatch(input, output, tagsCache=None, matcher=None, limit=None):
+    """
+    Answer the requests read from input on output, and return how many
+    requests and positions there were. matcher and limit apply to the
+    requests that don't have their own.
+    """
+    tagsCache = tagsCache or TagsCache()
+    requests = positions = 0
+    for line in input:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {'id': None, 'error': 'invalid request: %s' % e}
+        else:
+            requests += 1
+            try:
+                response = completeRequest(request, tagsCache, matcher, limit)
+                positions += len(response['results'])
+            except Exception as e:
+                response = {'id': request.get('id'), 'error': '%s: %s' % (e.__class__.__name__, e)}
+        output.write(json.dumps(response) + '\n')
+        # whoever sent the request may be waiting for it
+        output.flush()
+    return requests, positions
+
+
+def completeMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell complete',
+        description="Print the completions at a position of a file, or with --batch at many positions of many files.")
+    parser.add_argument('path', nargs='?',
+        help="The file to complete in")
+    parser.add_argument('line', nargs='?', type=int,
+        help="The line of the position, 1-based")
+    parser.add_argument('column', nargs='?', type=int,
+        help="The column of the position, 0-based")
+    parser.add_argument('--batch', nargs='?', const='-', metavar='requests',
+        help="Answer the JSON lines requests in this file, or stdin, on stdout (see pysmell.batch)")
+    parser.add_argument('-m', '--matcher',
+        help="How the completed word is matched, see pysmell.matchers")
+    parser.add_argument('-l', '--limit', type=int,
+        help="The most completions per position")
+    args = parser.parse_args(argv)
+
+    if args.batch is None:
+        if args.column is None:
+            parser.error("a path, a line and a column, or --batch, are required")
+        request = {'path': args.path, 'positions': [{'line': args.line, 'column': args.column}]}
+        response = completeRequest(request, TagsCache(), args.matcher, args.limit)
+        for completion in response['results'][0]['completions']:
+            print(completion['word'])
+        return
+
+    input = sys.stdin
+    if args.batch != '-':
+        input = open(args.batch)
+    start = time.time()
+    try:
+        requests, positions = completeBatch(input, sys.stdout, matcher=args.matcher, limit=args.limit)
+    finally:
+        if input is not sys.stdin:
+            input.close()
+    elapsed = time.time() - start
+    sys.stderr.write('%d positions in %d files, %.3fs, %d positions/s\n'
+                     % (positions, requests, elapsed, positions / max(elapsed, 1e-6)))
@@ -0,0 +1,214 @@
+# benchload.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+``pysmell bench-load``: how long a tags file takes to load, how much memory
+it takes and how fast completions are on it, as JSON that can be tracked
+over time.
+
+The tags are opened the way findPYSMELLDICT opens them, so tag databases,
+sectioned and sharded tags are only read as far as the completions need.
+For sharded tags, the number of shards each query left loaded and the
+false positive rate of the shard filters are reported too. Queries
+are a JSON list of objects like
+
+    {"type": "INSTANCE", "base": "get", "matcher": null,
+     "options": {"klass": "Module.Class", "parents": []}}
+
+where type is one of idehelper.Types and options are the CompletionOptions
+arguments. Without queries, a sample is made up from the tags.
+"""
+
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pysmell import argparse
+from pysmell.idehelper import findCompletionRecords, CompletionOptions, Types
+from pysmell.index import TagsDict, invalidateIndex
+from pysmell.sections import SectionedTags, isSectioned
+from pysmell.shards import ShardSet, MANIFEST_SUFFIX, registerShardSet, getShardSet
+from pysmell.tagdb import TagDB, isTagDB
+from pysmell.tagsfile import loadTags, SECTIONED, SQLITE
+from pysmell.tagslog import applyLog, readLog
+
+version = __import__('pysmell').__version__
+
+
+def openTags(path):
+    "open the tags file at path like findPYSMELLDICT would, and return its format and the PYSMELLDICT"
+    if isTagDB(path):
+        return SQLITE, TagDB(path)
+    if isSectioned(path):
+        return SECTIONED, SectionedTags([path])
+    tagsFormat, PYSMELLDICT = loadTags(path)
+    records = readLog(path)
+    if records:
+        applyLog(PYSMELLDICT, records)
+    if os.path.exists(path + MANIFEST_SUFFIX):
+        PYSMELLDICT = TagsDict(PYSMELLDICT)
+        shardSet = ShardSet()
+        directory, filename = os.path.split(os.path.abspath(path))
+        shardSet.addManifest(directory, filename + MANIFEST_SUFFIX)
+        registerShardSet(PYSMELLDICT, shardSet)
+    return tagsFormat, PYSMELLDICT
+
+
+def shardFilters(shardSet):
+    "the size and false positive rate of the bloom filter of every shard"
+    filters = {}
+    for package, paths in shardSet.shards.items():
+        for path in paths:
+            bloom = shardSet.filters.get(path)
+            if bloom is None: continue
+            filters[os.path.basename(path)] = {'bits': bloom.bits, 'hashes': bloom.hashes,
+                                               'falsePositiveRate': round(bloom.falsePositiveRate(), 6)}
+    return filters
+
+
+def _close(PYSMELLDICT):
+    close = getattr(PYSMELLDICT, 'close', None)
+    if close is not None:
+        close()
+
+
+def _peakRSS():
+    "the peak resident set size of this process in KB, or None where it can't be told"
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024 # bytes there
+    return peak
+
+
+def _millis(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def sampleQueries(PYSMELLDICT):
+    "a few completions of every kind, made up from what PYSMELLDICT holds"
+    queries = [
+        {'type': Types.TOPLEVEL, 'base': ''},
+        {'type': Types.INSTANCE, 'base': '', 'options': {'klass': None, 'parents': []}},
+    ]
+    classes = sorted(PYSMELLDICT['CLASSES'])
+    if classes:
+        queries.append({'type': Types.INSTANCE, 'base': '',
+                        'options': {'klass': classes[0], 'parents': []}})
+    if PYSMELLDICT['HIERARCHY']:
+        queries.append({'type': Types.MODULE, 'base': '',
+                        'options': {'module': PYSMELLDICT['HIERARCHY'][0], 'showMembers': True}})
+    return queries
+
+
+def _runQuery(PYSMELLDICT, query):
+    options = CompletionOptions(getattr(Types, query['type']), **query.get('options', {}))
+    return findCompletionRecords(query.get('base', ''), PYSMELLDICT, options, query.get('matcher'))
+
+
+def benchLoad(path, queries=None, repeat=5):
+    """
+    Load the tags file at path ``repeat`` + 1 times and run every query
+    ``repeat`` + 1 times on the first load. Return the results as a dict:
+    the cold (first) and warm (median of the others) load and query times
+    in milliseconds and the growth of the peak RSS in KB.
+    """
+    rssBefore = _peakRSS()
+    start = time.time()
+    tagsFormat, PYSMELLDICT = openTags(path)
+    coldLoad = time.time() - start
+
+    shardSet = getShardSet(PYSMELLDICT)
+    if queries is None:
+        queries = sampleQueries(PYSMELLDICT)
+    queryResults = []
+    for query in queries:
+        start = time.time()
+        records = _runQuery(PYSMELLDICT, query)
+        first = time.time() - start
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            _runQuery(PYSMELLDICT, query)
+            times.append(time.time() - start)
+        result = {'query': query, 'results': len(records),
+                  'cold': _millis(first), 'warm': _millis(_median(times)) if times else None}
+        if shardSet is not None:
+            result['shardsLoaded'] = len(shardSet.loaded)
+        queryResults.append(result)
+    rssAfter = _peakRSS()
+    invalidateIndex(PYSMELLDICT)
+    _close(PYSMELLDICT)
+    del PYSMELLDICT
+
+    warmLoads = []
+    for _ in range(repeat):
+        start = time.time()
+        reloaded = openTags(path)[1]
+        warmLoads.append(time.time() - start)
+        _close(reloaded)
+
+    results = {
+        'tags': os.path.abspath(path),
+        'format': tagsFormat,
+        'bytes': os.path.getsize(path),
+        'load': {'cold': _millis(coldLoad), 'warm': _millis(_median(warmLoads)) if warmLoads else None},
+        'peakRSSGrowth': rssAfter - rssBefore if rssBefore is not None else None,
+        'queries': queryResults,
+        'repeat': repeat,
+        'version': version,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if shardSet is not None:
+        results['shards'] = {'count': len(shardSet.shards), 'filters': shardFilters(shardSet)}
+    return results
+
+
+def benchLoadMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell bench-load',
+        description="Measure the load time, memory and completion latency of a tags file, as JSON.")
+    parser.add_argument('tagsFile', nargs='?', default='PYSMELLTAGS',
+        help="The tags file to measure")
+    parser.add_argument('-q', '--queries',
+        help="A JSON file with the list of completions to time (see pysmell.benchload)")
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+        help="How many warm loads and queries to time")
+    parser.add_argument('-o', '--output',
+        help="Append the results to this file, one JSON object per line, instead of printing them")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.tagsFile):
+        parser.error("%s doesn't exist" % args.tagsFile)
+    queries = None
+    if args.queries:
+        queriesFile = open(args.queries)
+        try:
+            queries = json.load(queriesFile)
+        finally:
+            queriesFile.close()
+    results = benchLoad(args.tagsFile, queries, args.repeat)
+    if args.output:
+        outputFile = open(args.output, 'a')
+        try:
+            outputFile.write(json.dumps(results, sort_keys=True) + '\n')
+        finally:
+            outputFile.close()
+    else:
+        print(json.dumps(results, sort_keys=True, indent=2))
@@ -0,0 +1,186 @@
+# benchserve.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+``pysmell bench-serve``: a load generator for ``pysmell serve``. For every
+client count, that many clients connect at once and each sends the same
+completion request a number of times, waiting for every answer before
+sending the next. The p50/p99/max latencies, the throughput and the errors
+are printed as JSON.
+
+Without --connect, a server is started in the same process. Its clients
+and it then share one interpreter, so use --connect with a separate
+``pysmell serve`` to measure the server alone. Requests to one listening
+on TCP carry the token of --token-file.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from pysmell import argparse
+from pysmell.server import CompletionServer, WORKERS, DEADLINE, MAXREQUEST, defaultSocket, defaultTokenFile, readToken
+
+CLIENTS = [1, 2, 4, 8, 16, 32]
+
+version = __import__('pysmell').__version__
+
+
+def percentile(values, fraction):
+    "the value ``fraction`` of the way through the sorted values (nearest rank)"
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _open(address):
+    "connect to the unix socket at address, or to address (host, port)"
+    if isinstance(address, str):
+        return asyncio.open_unix_connection(address, limit=MAXREQUEST)
+    return asyncio.open_connection(address[0], address[1], limit=MAXREQUEST)
+
+
+async def _client(address, request, count, latencies, errors):
+    reader, writer = await _open(address)
+    data = (json.dumps(request) + '\n').encode('utf-8')
+    try:
+        for _ in range(count):
+            start = time.time()
+            writer.write(data)
+            await writer.drain()
+            response = json.loads((await reader.readline()).decode('utf-8'))
+            latencies.append(time.time() - start)
+            if 'error' in response:
+                errors.append(response['error'])
+    finally:
+        writer.close()
+
+
+async def loadTest(address, request, clients, requests):
+    "run ``clients`` clients sending ``requests`` requests each, and return the statistics"
+    latencies = []
+    errors = []
+    start = time.time()
+    await asyncio.gather(*[_client(address, request, requests, latencies, errors)
+                           for _ in range(clients)])
+    elapsed = time.time() - start
+    millis = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'p50': millis(percentile(latencies, 0.5)),
+        'p99': millis(percentile(latencies, 0.99)),
+        'max': millis(max(latencies)),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'errors': len(errors),
+    }
+
+
+def completionRequest(path, line=None, column=None, deadline=None, limit=None):
+    "a request completing the file at path, at its end unless line and column are given"
+    sourceFile = open(path)
+    try:
+        source = sourceFile.read()
+    finally:
+        sourceFile.close()
+    lines = source.splitlines() or ['']
+    if line is None:
+        line = len(lines)
+    if column is None:
+        column = len(lines[line - 1])
+    request = {'id': 1, 'path': os.path.abspath(path), 'source': source, 'line': line, 'column': column}
+    if deadline:
+        request['deadline'] = deadline
+    if limit:
+        request['limit'] = limit
+    return request
+
+
+async def benchServe(request, clientCounts=CLIENTS, requests=20, address=None, workers=WORKERS):
+    """
+    load test the server at address (a unix socket, or (host, port)), or one
+    started here, and return the results
+    """
+    completionServer = server = None
+    if address is None:
+        directory = tempfile.mkdtemp()
+        address = os.path.join(directory, 'serve.sock')
+        completionServer = CompletionServer(workers=workers, deadline=DEADLINE)
+        server = await completionServer.start(socketPath=address)
+    try:
+        # the first request loads the tags, which isn't what is measured
+        await loadTest(address, request, 1, 1)
+        runs = []
+        for clients in clientCounts:
+            runs.append(await loadTest(address, request, clients, requests))
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+            completionServer.close()
+            shutil.rmtree(directory)
+    return {
+        'path': request['path'],
+        'line': request['line'],
+        'column': request['column'],
+        'limit': request.get('limit'),
+        'requestsPerClient': requests,
+        'workers': workers if completionServer is not None else None,
+        'runs': runs,
+        'version': version,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def benchServeMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell bench-serve',
+        description="Measure the completion latency of pysmell serve at increasing client counts, as JSON.")
+    parser.add_argument('file', help="The python file to complete in")
+    parser.add_argument('-l', '--line', type=int,
+        help="The line to complete at, 1-based (the last line by default)")
+    parser.add_argument('-c', '--column', type=int,
+        help="The column to complete at, 0-based (the end of the line by default)")
+    parser.add_argument('--clients', default=','.join(map(str, CLIENTS)),
+        help="The client counts to measure, separated by commas")
+    parser.add_argument('-n', '--requests', type=int, default=20,
+        help="How many requests every client sends")
+    parser.add_argument('--connect',
+        help="The unix socket (like %s) or the host:port of a running pysmell serve, "
+             "instead of starting one here" % defaultSocket())
+    parser.add_argument('--token-file', default=defaultTokenFile(),
+        help="The token of the server at host:port")
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+        help="The workers of the server started here")
+    parser.add_argument('--limit', type=int, default=100,
+        help="How many completions every request asks for, 0 for all of them")
+    parser.add_argument('--deadline', type=float,
+        help="The deadline of every request, in seconds")
+    parser.add_argument('-o', '--output',
+        help="Append the results to this file, one JSON object per line, instead of printing them")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.file):
+        parser.error("%s doesn't exist" % args.file)
+    request = completionRequest(args.file, args.line, args.column, args.deadline, args.limit)
+    address = args.connect
+    if address and not os.path.exists(address):
+        host, _, port = address.rpartition(':')
+        address = (host or '127.0.0.1', int(port))
+        request['token'] = readToken(args.token_file)
+    clientCounts = [int(count) for count in args.clients.split(',')]
+    results = asyncio.run(benchServe(request, clientCounts, args.requests, address, args.workers))
+    if args.output:
+        outputFile = open(args.output, 'a')
+        try:
+            outputFile.write(json.dumps(results, sort_keys=True) + '\n')
+        finally:
+            outputFile.close()
+    else:
+        print(json.dumps(results, sort_keys=True, indent=2))
@@ -0,0 +1,109 @@
+# bloom.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Bloom filters of the names in a shard, kept in the shard manifest, so that
+completions can skip the shards that can't contain what they look for. A
+filter can answer "maybe" for a name that isn't there (see
+falsePositiveRate) but never "no" for one that is.
+
+The keys of a shard are its modules (and their parent packages), the short
+names of its classes, functions and constants and the lower cased first
+PREFIX_LENGTH letters of those names.
+"""
+
+import hashlib
+import math
+
+FALSE_POSITIVE_RATE = 0.01
+PREFIX_LENGTH = 3
+
+
+class BloomFilter(object):
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data or (bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.md5(key.encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        for position in self._positions(key):
+            if not self.data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def falsePositiveRate(self):
+        "the chance that a key that was never added is reported as present"
+        setBits = sum(bin(byte).count('1') for byte in self.data)
+        return (float(setBits) / self.bits) ** self.hashes
+
+    def toTuple(self):
+        return (self.bits, self.hashes, bytes(self.data))
+
+
+def fromTuple(filterTuple):
+    bits, hashes, data = filterTuple
+    return BloomFilter(bits, hashes, data)
+
+
+def filterFor(keys, falsePositiveRate=FALSE_POSITIVE_RATE):
+    "a BloomFilter holding ``keys``, sized for falsePositiveRate"
+    keys = set(keys)
+    count = max(len(keys), 1)
+    bits = max(int(math.ceil(-count * math.log(falsePositiveRate) / math.log(2) ** 2)), 8)
+    hashes = max(int(round(float(bits) / count * math.log(2))), 1)
+    bloom = BloomFilter(bits, hashes)
+    for key in keys:
+        bloom.add(key)
+    return bloom
+
+
+def moduleKey(module):
+    return 'module:' + module
+
+
+def nameKey(name):
+    return 'name:' + name
+
+
+def prefixKey(prefix):
+    return 'prefix:' + prefix[:PREFIX_LENGTH].lower()
+
+
+def shardKeys(shard):
+    "the keys to put in the filter of the PYSMELLDICT ``shard``"
+    modules = set(shard['HIERARCHY'])
+    names = set()
+    for name in shard['CONSTANTS']:
+        names.add(name)
+    for func in shard['FUNCTIONS']:
+        names.add(func[0])
+    names.update(shard['CLASSES'])
+    for name in list(names) + list(shard['POINTERS']):
+        modules.add(name.rsplit('.', 1)[0])
+    keys = set()
+    for module in modules:
+        parts = module.split('.')
+        for end in range(1, len(parts) + 1):
+            keys.add(moduleKey('.'.join(parts[:end])))
+    for name in names:
+        short = name.rsplit('.', 1)[-1]
+        keys.add(nameKey(short))
+        for end in range(1, min(len(short), PREFIX_LENGTH) + 1):
+            keys.add(prefixKey(short[:end]))
+    return keys
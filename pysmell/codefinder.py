@@ -403,6 +403,16 @@ def findPackage(path):
     return package
 
 
+def moduleName(fullPath):
+    "the dotted name processFile gives to the module at fullPath"
+    absPath, filename = os.path.split(fullPath)
+    package = findPackage(absPath)
+    module = filename[:-3]
+    if module == '__init__':
+        return package
+    return package and '%s.%s' % (package, module) or module
+
+
 def processFile(f, path):
     """f is the the filename, path is the relative path in the project, root is
     the topmost package"""
@@ -469,27 +479,37 @@ class SelfInferer(BaseVisitor):
 
 
 def getSafeTree(source, lineNo):
-    source = source.replace('\r\n', '\n')
+    tree = parseSource(source)
+    if tree is None:
+        tree = getPatchedTree(source, lineNo)
+    return tree
+
+
+def parseSource(source):
+    "the tree of source, or None if it doesn't parse"
     try:
-        tree = compiler.parse(source)
+        return compiler.parse(source.replace('\r\n', '\n'))
     except:
-        sourceLines = source.splitlines()
-        line = sourceLines[lineNo-1]
-        unindented = line.lstrip()
-        indentation = len(line) - len(unindented)
-        whitespace = ' '
-        if line.startswith('\t'):
-            whitespace = '\t'
-        sourceLines[lineNo-1] = '%spass' % (whitespace * indentation)
-
-        replacedSource = '\n'.join(sourceLines)
-        try:
-            tree = compiler.parse(replacedSource)
-        except SyntaxError as e:
-            print(e.args, file=sys.stderr)
-            return None
+        return None
 
-    return tree
+
+def getPatchedTree(source, lineNo):
+    "the tree of source with line lineNo, which is probably being edited, replaced by a pass"
+    sourceLines = source.replace('\r\n', '\n').splitlines()
+    line = sourceLines[lineNo-1]
+    unindented = line.lstrip()
+    indentation = len(line) - len(unindented)
+    whitespace = ' '
+    if line.startswith('\t'):
+        whitespace = '\t'
+    sourceLines[lineNo-1] = '%spass' % (whitespace * indentation)
+
+    replacedSource = '\n'.join(sourceLines)
+    try:
+        return compiler.parse(replacedSource)
+    except SyntaxError as e:
+        print(e.args, file=sys.stderr)
+        return None
 
 class NameVisitor(BaseVisitor):
     def __init__(self):
@@ -539,19 +559,25 @@ def getImports(tree):
     return inferer.imports
 
 
-def getClassAndParents(tree, lineNo):
+def getClassAndParents(tree, lineNo, classRanges=None):
     if tree is None:
         return None, []
 
+    if classRanges is None:
+        classRanges = getClassRanges(tree)
+    for klass, parents, start, end in classRanges:
+        if lineNo >= start:
+            return klass, list(parents)
+    return None, []
+
+
+def getClassRanges(tree):
+    "the classes of tree with their parents and lines, the last one first"
     inferer = SelfInferer()
     compiler.walk(tree, inferer)
     classRanges = inferer.classRanges
     classRanges.sort(sortClassRanges)
-    
-    for klass, parents, start, end in classRanges:
-        if lineNo >= start:
-            return klass, parents
-    return None, []
+    return classRanges
 
 def sortClassRanges(a, b):
     return b[2] - a[2]
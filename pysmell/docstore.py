@@ -0,0 +1,107 @@
+# docstore.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Docstrings kept out of the tags (``pysmell --split-docstrings``). Completions
+never look at docstrings, so the tags only keep empty ones and the text
+goes to a PYSMELLDOCS file next to them. That file is an SQLite table keyed
+by the dotted name of the symbol (Module.function, Module.Class and
+Module.Class.method), read one row at a time when an editor asks for the
+documentation of a completion.
+"""
+
+import os
+import sqlite3
+
+DOCSFILE = 'PYSMELLDOCS'
+
+
+def stripDocstrings(modules):
+    """
+    Replace every docstring in ``modules`` with an empty one and return
+    the docstrings, as a dict of dotted name -> docstring.
+    """
+    docs = {}
+    functions = []
+    for name, args, doc in modules['FUNCTIONS']:
+        if doc:
+            docs[name] = doc
+        functions.append((name, args, ''))
+    modules['FUNCTIONS'][:] = functions
+    for klass, klassDict in modules['CLASSES'].items():
+        if klassDict.get('docstring'):
+            docs[klass] = klassDict['docstring']
+            klassDict['docstring'] = ''
+        methods = []
+        for name, args, doc in klassDict['methods']:
+            if doc:
+                docs['%s.%s' % (klass, name)] = doc
+            methods.append((name, args, ''))
+        klassDict['methods'] = methods
+    return docs
+
+
+def writeDocstrings(path, docs, update=False):
+    "write docs to a new store at path, or add them to the one there if update is set"
+    if os.path.exists(path) and not update:
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute('CREATE TABLE IF NOT EXISTS docstrings (symbol TEXT PRIMARY KEY, docstring TEXT)')
+        connection.executemany('INSERT OR REPLACE INTO docstrings VALUES (?, ?)', list(docs.items()))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class DocStore(object):
+    "a PYSMELLDOCS file, opened on the first lookup"
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def get(self, symbol):
+        "the docstring of symbol, or None if the store doesn't know it"
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+        rows = self.connection.execute('SELECT docstring FROM docstrings WHERE symbol = ?', (symbol,)).fetchall()
+        return rows and rows[0][0] or None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def findInlineDocstring(PYSMELLDICT, symbol):
+    "the docstring of symbol in tags that weren't written with --split-docstrings"
+    klassDict = PYSMELLDICT['CLASSES'].get(symbol)
+    if klassDict is not None:
+        return klassDict.get('docstring') or None
+    if '.' not in symbol:
+        return None
+    klass, name = symbol.rsplit('.', 1)
+    klassDict = PYSMELLDICT['CLASSES'].get(klass)
+    if klassDict is not None:
+        for method in klassDict['methods']:
+            if method[0] == name:
+                return method[2] or None
+        return None
+    for func in PYSMELLDICT['FUNCTIONS']:
+        if func[0] == symbol:
+            return func[2] or None
+    return None
+
+
+def symbolOf(completion):
+    "the dotted name of the symbol a completion dict (with a menu) stands for"
+    menu = completion.get('menu')
+    if not menu:
+        return completion['word']
+    return '%s.%s' % (menu.replace(':', '.'), completion['word'])
@@ -10,23 +10,180 @@ def _uniquify(l):
         found.add(item)
 
 
+_session = idehelper.CompletionSession()
+# the file and the records of the last completions, for get_docstring
+_completed = (None, [])
+
+
+class Buffer(object):
+    """
+    The lines of an emacs buffer, as pysmell.el last sent them, and what
+    was worked out from them at that modification tick.
+    """
+    def __init__(self, text, tick):
+        self.lines = text.split('\n')
+        self.tick = tick
+        self._source = None
+        self._analysis = None
+        # the tick of the last mark(), the number of lines then and the
+        # lines replaced since, as (first, end) in the buffer now
+        self._mark = None
+        self._markedLength = None
+        self._changed = None
+
+    def apply(self, head, tail, text, tick):
+        "replace every line but the first ``head`` and the last ``tail`` with text"
+        if head + tail > len(self.lines):
+            raise ValueError("%d + %d lines kept out of %d" % (head, tail, len(self.lines)))
+        end = len(self.lines) - tail
+        replacement = text.split('\n')
+        self.lines[head:end] = replacement
+        self.tick = tick
+        self._track(head, end, len(replacement))
+
+    def _track(self, head, end, count):
+        "the lines from head to end were replaced by count lines"
+        if self._changed is None:
+            self._changed = (head, head + count)
+            return
+        first, last = self._changed
+        if last >= end:
+            last += count - (end - head)
+        elif last > head:
+            last = head + count
+        self._changed = (min(first, head), max(last, head + count))
+
+    def mark(self):
+        "start tracking the lines changed from now on (see context)"
+        self._mark = self.tick
+        self._markedLength = len(self.lines)
+        self._changed = None
+
+    def context(self, lineNo, origCol, base):
+        """
+        What the buffer outside base is, for idehelper.CompletionSession,
+        without looking at the whole buffer: the line around base, when
+        nothing but that line changed since mark(). None otherwise.
+        """
+        if self._mark is None or len(self.lines) != self._markedLength:
+            return None
+        if self._changed is not None and not (lineNo - 1 <= self._changed[0] and self._changed[1] <= lineNo):
+            return None
+        line = self.lines[lineNo - 1]
+        start = origCol - len(base)
+        if start < 0 or line[start:origCol] != base:
+            return None
+        return (self._mark, line[:start], line[origCol:])
+
+    def source(self):
+        if self._source is None or self._source[0] != self.tick:
+            self._source = (self.tick, '\n'.join(self.lines))
+        return self._source[1]
+
+    def analysis(self, fullPath, source):
+        "the idehelper.FileAnalysis of source, the buffer at this tick, made once per tick"
+        if self._analysis is None or self._analysis[:2] != (self.tick, fullPath):
+            self._analysis = (self.tick, fullPath, idehelper.FileAnalysis(fullPath, source))
+        return self._analysis[2]
+
+
+_buffers = {}
+
+def sync_buffer(bufferId, baseTick, tick, head, tail, text):
+    """arguments: bufferId, baseTick, tick, head, tail, text
+
+Bring the copy of buffer bufferId up to its modification tick: text replaces
+all but the first head and the last tail lines of the copy at baseTick. A
+baseTick of nil sends the whole buffer. Returns nil when the copy isn't at
+baseTick, and the whole buffer has to be sent."""
+    if baseTick is None:
+        _buffers[bufferId] = Buffer(text, tick)
+        return True
+    buffer = _buffers.get(bufferId)
+    if buffer is None or buffer.tick != baseTick or head + tail > len(buffer.lines):
+        return False
+    buffer.apply(head, tail, text, tick)
+    return True
+
+
+def forget_buffer(bufferId):
+    """arguments: bufferId
+
+Drop the copy of buffer bufferId, when it is killed"""
+    _buffers.pop(bufferId, None)
+
+
+def get_buffer_completions(bufferId, fullPath, lineNo, origCol, matcher):
+    """arguments: bufferId, fullPath, lineNo, origCol, matcher
+
+Like get_completions, for the buffer bufferId as it was last sent with
+sync_buffer"""
+    buffer = _buffers.get(bufferId)
+    if buffer is None:
+        return
+    return _complete(fullPath, None, lineNo, origCol, matcher, buffer, bufferId)
+
+
+def get_docstring(fullPath, word):
+    """arguments: fullPath, word
+
+The docstring of word, one of the last completions found for the file at
+fullPath, or nil"""
+    completedPath, records = _completed
+    if completedPath != fullPath:
+        return None
+    for record in records:
+        if record.word == word:
+            return idehelper.findCompletionDocstring(fullPath, record.toDict())
+    return None
+
+
 def get_completions(fullPath, origSource, lineNo, origCol, matcher):
     """arguments: fullPath, origSource, lineNo, origCol, matcher
 
 When visiting the file at fullPath, with edited source origSource, find a list 
 of possible completion strings for the symbol located at origCol on orgLineNo using 
 matching mode matcher"""
-    PYSMELLDICT = idehelper.findPYSMELLDICT(fullPath)
-    if not PYSMELLDICT:
-        return
-    origLine = origSource.splitlines()[lineNo - 1]
+    return _complete(fullPath, origSource, lineNo, origCol, matcher)
+
+
+def _complete(fullPath, origSource, lineNo, origCol, matcher, buffer=None, bufferId=None):
+    global _completed
+    context = None
+    if buffer is None:
+        origLine = origSource.splitlines()[lineNo - 1]
+    else:
+        origLine = buffer.lines[lineNo - 1]
     base = split("[,.\-+/|\[\]]", origLine[:origCol].strip())[-1]
-    options = idehelper.detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDICT)
-    completions = [completion['word'] for completion in idehelper.findCompletions(base, PYSMELLDICT, options, matcher)]
+    if buffer is None:
+        records = _session.lookup(fullPath, origSource, lineNo, origCol, base, matcher)
+    else:
+        # only the changed lines are compared, the buffer isn't joined unless it has to be parsed
+        records = None
+        context = buffer.context(lineNo, origCol, base)
+        if context is not None:
+            records = _session.lookup(fullPath, None, lineNo, origCol, base, matcher, (bufferId, context))
+    if records is None:
+        # only load the tags when the previous completions can't be refined
+        PYSMELLDICT = idehelper.findPYSMELLDICT(fullPath)
+        if not PYSMELLDICT:
+            return
+        if buffer is None:
+            options = idehelper.detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDICT)
+        else:
+            # reuse the parse and the overlay of the buffer while it is unchanged
+            origSource = buffer.source()
+            options = idehelper.detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDICT,
+                                                     analysis=buffer.analysis(fullPath, origSource))
+            buffer.mark()
+            context = buffer.context(lineNo, origCol, base)
+            if context is not None:
+                context = (bufferId, context)
+        records = idehelper.findCompletionRecords(base, PYSMELLDICT, options, matcher)
+        _session.store(fullPath, origSource, lineNo, origCol, base, matcher, options, records, context)
+        completions = [completion['word'] for completion in idehelper.toCompletionDicts(records, options)]
+    else:
+        completions = [record.word for record in records]
+    _completed = (fullPath, records)
     completions = list(_uniquify(completions))
     return completions
-
-
-
-
-        
@@ -8,13 +8,21 @@
 # Released subject to the BSD License 
 
 import builtins
-import pickle as pickle
 import os, re
 import fnmatch
 from dircache import listdir
 
 from pysmell.codefinder import findRootPackageList, getImports, getNames, getClassAndParents, analyzeFile, getSafeTree
-from pysmell.matchers import MATCHERS
+from pysmell.codefinder import parseSource, getPatchedTree, getClassRanges
+from pysmell.matchers import MATCHERS, matchCaseSensitively, matchCaseInsensitively
+from pysmell.index import TagsDict, getBaseIndex, getIndex, invalidateIndex, invalidateModules, sortRecords
+from pysmell.bloom import moduleKey, nameKey, prefixKey
+from pysmell.shards import ShardSet, getShardSet, registerShardSet, isManifest, packageOf
+from pysmell.tagsfile import readTags
+from pysmell.sections import SectionedTags, isSectioned, requireSections
+from pysmell.tagslog import isLog
+from pysmell.tagdb import TagDB, isTagDB
+from pysmell.docstore import DOCSFILE, DocStore, findInlineDocstring, symbolOf
 
 def findBase(line, col):
     index = col
@@ -34,33 +42,186 @@ def updatePySmellDict(master, partial):
             master.setdefault(key, {}).update(value)
         elif isinstance(value, list):
             master.setdefault(key, []).extend(value)
+    if 'HIERARCHY' in partial:
+        invalidateModules(master, partial['HIERARCHY'])
+    else:
+        invalidateIndex(master)
 
 
 def tryReadPYSMELLDICT(directory, filename, dictToUpdate):
     if os.path.exists(os.path.join(directory, filename)):
-        tagsFile = open(os.path.join(directory, filename), 'rb')
-        try:
-            updatePySmellDict(dictToUpdate, pickle.load(tagsFile))
-        finally:
-            tagsFile.close()
+        updatePySmellDict(dictToUpdate, readTags(os.path.join(directory, filename)))
     
 
 def findPYSMELLDICT(filename):
     pathParts = _getPathParts(filename)[:-1]
-    PYSMELLDICT = {}
+    PYSMELLDICT = TagsDict()
+    shardSet = ShardSet()
+    # sectioned tags files are only read a section at a time, when it's used
+    sectionedPaths = []
     while pathParts:
         directory = os.path.join(*pathParts)
-        for tagsfile in fnmatch.filter(listdir(directory), 'PYSMELLTAGS.*'):
-            tryReadPYSMELLDICT(directory, tagsfile, PYSMELLDICT)
         tagsPath = os.path.join(directory, 'PYSMELLTAGS')
+        if isTagDB(tagsPath):
+            # tag databases are queried in place, nothing gets merged into them
+            return TagDB(tagsPath)
+        tagsfiles = fnmatch.filter(listdir(directory), 'PYSMELLTAGS.*')
+        # shards listed in a manifest are only read when they are needed,
+        # logs are applied when the tags file they belong to is read
+        shardFiles = set()
+        for manifest in filter(isManifest, tagsfiles):
+            shardFiles.update(shardSet.addManifest(directory, manifest))
+        for tagsfile in tagsfiles:
+            if isManifest(tagsfile) or isLog(tagsfile) or tagsfile in shardFiles: continue
+            if isSectioned(os.path.join(directory, tagsfile)):
+                sectionedPaths.append(os.path.join(directory, tagsfile))
+                continue
+            tryReadPYSMELLDICT(directory, tagsfile, PYSMELLDICT)
         if os.path.exists(tagsPath):
-            tryReadPYSMELLDICT(directory, 'PYSMELLTAGS', PYSMELLDICT)
+            if isSectioned(tagsPath):
+                sectionedPaths.append(tagsPath)
+            else:
+                tryReadPYSMELLDICT(directory, 'PYSMELLTAGS', PYSMELLDICT)
             break
         pathParts.pop()
     else:
         return None
+    if sectionedPaths:
+        PYSMELLDICT = SectionedTags(sectionedPaths, PYSMELLDICT)
+    if shardSet.shards:
+        registerShardSet(PYSMELLDICT, shardSet)
+        ownModule = os.path.splitext(os.path.relpath(filename, directory))[0]
+        requirePackages(PYSMELLDICT, [packageOf(ownModule.replace(os.sep, '.'))])
     return PYSMELLDICT
-            
+
+
+def findDocstring(filename, symbol, PYSMELLDICT=None):
+    """
+    Return the docstring of ``symbol`` (a dotted name like Module.Class.method,
+    see docstore.symbolOf for completions) or None. The PYSMELLDOCS files
+    between filename and its PYSMELLTAGS are searched first, then PYSMELLDICT
+    (or the index given instead, see getIndex) if it was given.
+    """
+    pathParts = _getPathParts(filename)[:-1]
+    while pathParts:
+        directory = os.path.join(*pathParts)
+        for docsfile in fnmatch.filter(listdir(directory), DOCSFILE + '*'):
+            store = DocStore(os.path.join(directory, docsfile))
+            try:
+                docstring = store.get(symbol)
+            finally:
+                store.close()
+            if docstring:
+                return docstring
+        if os.path.exists(os.path.join(directory, 'PYSMELLTAGS')):
+            break
+        pathParts.pop()
+    if PYSMELLDICT is not None:
+        lock = storeLock(PYSMELLDICT)
+        lock.acquire()
+        try:
+            return findInlineDocstring(getIndex(PYSMELLDICT).PYSMELLDICT, symbol)
+        finally:
+            lock.release()
+    return None
+
+
+def findCompletionDocstring(filename, completion):
+    """
+    The docstring of what a completion dict for the file at filename stands
+    for, or None. For editors that don't keep the tags loaded: they are only
+    read if the PYSMELLDOCS files don't have the docstring.
+    """
+    if not completion or not completion.get('word'):
+        return None
+    symbol = symbolOf(completion)
+    docstring = findDocstring(filename, symbol)
+    if docstring is None:
+        PYSMELLDICT = findPYSMELLDICT(filename)
+        if PYSMELLDICT:
+            docstring = findInlineDocstring(PYSMELLDICT, symbol)
+    return docstring
+
+
+def requirePackages(PYSMELLDICT, packages):
+    """
+    Load the shards of ``packages`` into PYSMELLDICT if it was found with a
+    shard manifest and they aren't loaded yet. Return True if anything was loaded.
+    """
+    shardSet = getShardSet(PYSMELLDICT)
+    if shardSet is None:
+        return False
+    shards = shardSet.load(packages)
+    for shard in shards:
+        updatePySmellDict(PYSMELLDICT, shard)
+    return bool(shards)
+
+
+def _requireAllPackages(PYSMELLDICT):
+    shardSet = getShardSet(PYSMELLDICT)
+    if shardSet is not None:
+        requirePackages(PYSMELLDICT, shardSet.packages())
+
+
+def _requirePackagesWith(PYSMELLDICT, key):
+    "load the shards that may have key (see bloom.py)"
+    shardSet = getShardSet(PYSMELLDICT)
+    if shardSet is not None:
+        requirePackages(PYSMELLDICT, shardSet.packagesWith(key))
+
+
+def _requireModule(PYSMELLDICT, module):
+    "load the shards ``module`` and the modules it star-imports from are in"
+    shardSet = getShardSet(PYSMELLDICT)
+    if shardSet is None:
+        return
+    # the last part of module can be incomplete, but its parent has to be
+    # in the shard for the shard to have anything to complete
+    prefix = packageOf(module)
+    parent = module.rpartition('.')[0]
+    packages = [package for package in shardSet.packages() if package.startswith(prefix)
+                    and (not parent or shardSet.mayContain(package, moduleKey(parent)))]
+    requirePackages(PYSMELLDICT, packages)
+    loaded = True
+    while loaded:
+        stars = getIndex(PYSMELLDICT).starImports(module)
+        loaded = requirePackages(PYSMELLDICT, [packageOf(other) for other in stars])
+
+
+def _requireClass(PYSMELLDICT, klass, parents):
+    "load the shards klass, parents and everything they inherit from are in"
+    if getShardSet(PYSMELLDICT) is None:
+        return
+    loaded = True
+    while loaded:
+        index = getIndex(PYSMELLDICT)
+        classes = [klass] + list(parents)
+        for name in classes[:]:
+            classes.extend(index.ancestors(name))
+        loaded = requirePackages(PYSMELLDICT, [packageOf(name) for name in classes])
+
+
+class _NoLock(object):
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+_NOLOCK = _NoLock()
+
+def storeLock(PYSMELLDICT):
+    """
+    The lock to hold while completing with PYSMELLDICT. Shards, sections
+    and tag databases are read as completions need them, so threads
+    completing with them take turns. Other tags aren't changed once they
+    are loaded, and any number of threads complete with them at once.
+    """
+    shardSet = getShardSet(PYSMELLDICT)
+    if shardSet is not None:
+        return shardSet.lock
+    return getattr(PYSMELLDICT, 'lock', None) or _NOLOCK
+
 
 def _getPathParts(path):
     "given a full path, return its components without the extension"
@@ -86,8 +247,10 @@ def debug(vim, msg):
         debBuffer.append(msg)
 
 
-def inferModule(chain, AST, lineNo):
-    imports = getImports(AST)
+def inferModule(chain, AST, lineNo, analysis=None):
+    if analysis is None:
+        analysis = FileAnalysis(None, None)
+    imports = analysis.imports(AST)
     fullModuleParts = []
     valid = False
     for part in chain.split('.'):
@@ -102,8 +265,10 @@ def inferModule(chain, AST, lineNo):
     
 
 funcCellRE = re.compile(r'(.+)\(.*\)')
-def inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT):
-    names, klasses = getNames(AST)
+def inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT, analysis=None):
+    if analysis is None:
+        analysis = FileAnalysis(fullPath, None)
+    names, klasses = analysis.names(AST)
     assignment = names.get(var, None)
     klass = None
     parents = []
@@ -113,7 +278,7 @@ def inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT):
             klass = possibleMatch.groups(1)[0]
             if klass in klasses:
                 path, filename = os.path.split(fullPath)
-                packages = findRootPackageList(path, filename)
+                packages = analysis.packages()
                 if packages:
                     packagesStr = (".".join(packages)) + "."
                 else:
@@ -121,37 +286,34 @@ def inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT):
                 klass = "%s%s.%s" % (packagesStr, filename[:-3], klass)
             else:
                 klass = _qualify(names.get(klass, klass), PYSMELLDICT)
-            parents = PYSMELLDICT['CLASSES'].get(klass, {'bases': []})['bases']
+            parents = getIndex(PYSMELLDICT).PYSMELLDICT['CLASSES'].get(klass, {'bases': []})['bases']
 
     return klass, parents
 
 
 def _qualify(thing, PYSMELLDICT):
-    if thing in PYSMELLDICT['POINTERS']:
-        return PYSMELLDICT['POINTERS'][thing]
-    else:
-        for pointer in PYSMELLDICT['POINTERS']:
-            if pointer.endswith('*') and thing.startswith(pointer[:-2]):
-                return '%s.%s' % (PYSMELLDICT['POINTERS'][pointer][:-2], thing.split('.', 1)[-1])
-    return thing
+    return getIndex(PYSMELLDICT).qualify(thing)
 
-def inferClass(fullPath, AST, origLineNo, PYSMELLDICT, vim=None):
-    klass, parents = getClassAndParents(AST, origLineNo)
+def inferClass(fullPath, AST, origLineNo, PYSMELLDICT, vim=None, analysis=None):
+    if analysis is None:
+        analysis = FileAnalysis(fullPath, None)
+    klass, parents = analysis.classAndParents(AST, origLineNo)
 
     # replace POINTERS with their full reference
     for index, parent in enumerate(parents[:]):
         parents[index] = _qualify(parent, PYSMELLDICT)
 
+    classes = getIndex(PYSMELLDICT).PYSMELLDICT['CLASSES']
     pathParts = _getPathParts(fullPath)
     fullKlass = klass
     while pathParts:
         fullKlass = "%s.%s" % (pathParts.pop(), fullKlass)
-        if fullKlass in list(PYSMELLDICT['CLASSES'].keys()):
+        if fullKlass in classes:
             break
     else:
         # we don't know about this class, look in the file system
         path, filename = os.path.split(fullPath)
-        packages = findRootPackageList(path, filename)
+        packages = analysis.packages()
         if packages:
             packagesStr = (".".join(packages)) + "."
         else:
@@ -181,7 +343,24 @@ class Types(object):
     INSTANCE = 'INSTANCE'
 
 
+# the sections of PYSMELLDICT each type of completion reads, in the order
+# it needs them. The module tree also places the top level members in their
+# modules, so module completions end up reading those sections too.
+SECTIONS_NEEDED = {
+    Types.TOPLEVEL: ('CONSTANTS', 'FUNCTIONS', 'CLASSES'),
+    Types.FUNCTION: ('FUNCTIONS',),
+    Types.METHOD: ('CLASSES',),
+    Types.INSTANCE: ('CLASSES',),
+    Types.MODULE: ('HIERARCHY', 'POINTERS', 'CONSTANTS', 'FUNCTIONS', 'CLASSES'),
+}
+
+
 class CompletionOptions(object):
+    # the PYSMELLDICT of the edited buffer, shown on top of the tags by
+    # findCompletions, and the index detectCompletionType made with it
+    overlay = None
+    index = None
+
     def __init__(self, compType, **kwargs):
         self.compType = compType
         self.extra = kwargs
@@ -200,7 +379,8 @@ class CompletionOptions(object):
         return repr(self.compType) + 'with extra: ' + repr(self.extra)
         
 
-def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDICT, update=True):
+def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDICT, update=True, AST=None,
+                         analysis=None):
     """
     Return a CompletionOptions instance describing the type of the completion, along with extra parameters.
     
@@ -210,16 +390,43 @@ def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDIC
           origCol -> The column number the cursor is in, 0-based
           base -> The string that will be replaced when the completion is inserted
           PYSMELLDICT -> The loaded PYSMELLDICT
+          update -> Analyze origSource and show it on top of PYSMELLDICT (see
+                    index.OverlayIndex) in this completion: the returned
+                    options carry it to findCompletions
+          AST -> The tree of origSource from getSafeTree(origSource, lineNo), if
+                 the caller already has it
+          analysis -> A FileAnalysis of origSource, to share the parsing with
+                      other positions in it
 
     Note that Vim deletes the "base" when a completion is requested so extra trickery must be performed to get it from the source.
 
     """
-    AST = getSafeTree(origSource, lineNo)
-    if update:
-        currentDict = analyzeFile(fullPath, AST)
-        if currentDict is not None:
-            updatePySmellDict(PYSMELLDICT, currentDict)
-    origLineText = origSource.splitlines()[lineNo - 1] # lineNo is 1 based
+    if analysis is None:
+        analysis = FileAnalysis(fullPath, origSource)
+    if AST is None:
+        AST = analysis.tree(lineNo)
+    lock = storeLock(PYSMELLDICT)
+    lock.acquire()
+    try:
+        if AST is not None and getShardSet(PYSMELLDICT) is not None:
+            imports = analysis.imports(AST)
+            requirePackages(PYSMELLDICT, [packageOf(name) for name in imports.values()])
+        index = None
+        if update and analysis.overlay(AST) is not None:
+            # the edited buffer shadows what the tags know about its module,
+            # without being merged into them
+            index = analysis.overlayIndex(PYSMELLDICT, AST)
+        options = _detectCompletionType(fullPath, analysis, AST, lineNo, origCol, base, index or PYSMELLDICT)
+    finally:
+        lock.release()
+    if index is not None:
+        options.overlay = index.overlay
+        options.index = index
+    return options
+
+
+def _detectCompletionType(fullPath, analysis, AST, lineNo, origCol, base, PYSMELLDICT):
+    origLineText = analysis.lines()[lineNo - 1] # lineNo is 1 based
     leftSide, rightSide = origLineText[:origCol], origLineText[origCol:]
     leftSideStripped = leftSide.lstrip()
 
@@ -252,7 +459,7 @@ def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDIC
         var = leftSideStripped[:leftSideStripped.rindex('.')]
         isClassLookup = var == 'self'
         if isClassLookup:
-            klass, parents = inferClass(fullPath, AST, lineNo, PYSMELLDICT)
+            klass, parents = inferClass(fullPath, AST, lineNo, PYSMELLDICT, analysis=analysis)
             return CompletionOptions(Types.INSTANCE, klass=klass, parents=parents)
         else:
             chain = getChain(leftSideStripped) # strip dot
@@ -260,10 +467,10 @@ def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDIC
                 chain = chain[:-len(base)]
             if chain.endswith('.'):
                 chain = chain[:-1]
-            possibleModule = inferModule(chain, AST, lineNo)
+            possibleModule = inferModule(chain, AST, lineNo, analysis)
             if possibleModule is not None:
                 return CompletionOptions(Types.MODULE, module=possibleModule, showMembers=True)
-        klass, parents = inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT)
+        klass, parents = inferInstance(fullPath, AST, lineNo, var, PYSMELLDICT, analysis)
         return CompletionOptions(Types.INSTANCE, klass=klass, parents=parents)
         
 
@@ -271,159 +478,281 @@ def detectCompletionType(fullPath, origSource, lineNo, origCol, base, PYSMELLDIC
 
 
 
-def findCompletions(base, PYSMELLDICT, options, matcher=None):
-    doesMatch = MATCHERS[matcher](base)
+def findCompletions(base, PYSMELLDICT, options, matcher=None, limit=None):
+    """
+    Return the completions for base as a list of dicts, ready to be handed to
+    an editor. At most ``limit`` completions are returned, if given.
+    """
+    records = findCompletionRecords(base, PYSMELLDICT, options, matcher)
+    return toCompletionDicts(records[:limit], options)
+
+
+def findCompletionRecords(base, PYSMELLDICT, options, matcher=None):
+    "like findCompletions, but return the index's sorted Completion records"
+    lock = storeLock(PYSMELLDICT)
+    lock.acquire()
+    try:
+        return _findCompletionRecords(base, PYSMELLDICT, options, matcher)
+    finally:
+        lock.release()
+
+
+def _withOverlay(PYSMELLDICT, overlay, previous=None):
+    """
+    getIndex(PYSMELLDICT, overlay), or ``previous`` if it was made like that
+    and the tags haven't changed since
+    """
+    if overlay is None:
+        return getIndex(PYSMELLDICT)
+    if (previous is not None and previous.overlay is overlay and previous.base is getBaseIndex(PYSMELLDICT)
+            and previous.isCurrent()):
+        return previous
+    return getIndex(PYSMELLDICT, overlay)
+
+
+def _findCompletionRecords(base, PYSMELLDICT, options, matcher):
+    matchFactory = MATCHERS[matcher]
+    doesMatch = matchFactory(base)
+    # indexes that can search by prefix only need to look at these
+    ignoreCase = matchFactory is not matchCaseSensitively
+    prefix = matchFactory in (matchCaseSensitively, matchCaseInsensitively) and base or ''
     compType = options.compType
+    requireSections(PYSMELLDICT, SECTIONS_NEEDED[compType])
+    if compType is Types.MODULE:
+        _requireModule(PYSMELLDICT, options.module)
+    elif compType in (Types.INSTANCE, Types.METHOD) and options.klass:
+        _requireClass(PYSMELLDICT, options.klass, options.parents)
+    elif compType is Types.FUNCTION:
+        _requirePackagesWith(PYSMELLDICT, nameKey(options.name))
+    elif compType is Types.TOPLEVEL and prefix:
+        _requirePackagesWith(PYSMELLDICT, prefixKey(prefix))
+    else:
+        _requireAllPackages(PYSMELLDICT)
+    index = _withOverlay(PYSMELLDICT, options.overlay, options.index)
 
     if compType is Types.MODULE:
-        completions = _createModuleCompletions(PYSMELLDICT, options.module, options.showMembers)
+        records = index.moduleCompletions(options.module, options.showMembers)
     elif compType is Types.INSTANCE:
-        completions = _createInstanceCompletionList(PYSMELLDICT, options.klass, options.parents)
+        records = _createInstanceCompletionList(index, options.klass, options.parents, prefix, ignoreCase)
     elif compType is Types.METHOD:
-        completions = _createInstanceCompletionList(PYSMELLDICT, options.klass, options.parents)
+        records = _createInstanceCompletionList(index, options.klass, options.parents, options.name, False)
         doesMatch = lambda word: word == options.name
     elif compType is Types.FUNCTION:
-        completions = [_getCompForFunction(func, 'f') for func in PYSMELLDICT['FUNCTIONS']]
+        records = index.candidates('functions', options.name, False)
         doesMatch = lambda word: word == options.name
     elif compType is Types.TOPLEVEL:
-        completions = _createTopLevelCompletionList(PYSMELLDICT)
-        
+        records = index.candidates('topLevel', prefix, ignoreCase)
+
+    # records come out of the index already sorted, filtering keeps the order
     if base:
-        filteredCompletions = [comp for comp in completions if doesMatch(comp['word'])]
-    else:
-        filteredCompletions = completions
+        return [record for record in records if doesMatch(record.word)]
+    return list(records)
 
-    filteredCompletions.sort(sortCompletions)
 
-    if filteredCompletions and compType in (Types.METHOD, Types.FUNCTION):
+def toCompletionDicts(records, options):
+    completions = [record.toDict() for record in records]
+    if completions and options.compType in (Types.METHOD, Types.FUNCTION):
         #return the arg list instead
-        oldComp = filteredCompletions[0]
-        if oldComp['word'] == options.name:
-            oldComp['word'] = oldComp['abbr'][:options.rindex]
-    return filteredCompletions
+        comp = completions[0]
+        if comp['word'] == options.name:
+            comp['word'] = comp['abbr'][:options.rindex]
+    return completions
 
 
-def _createInstanceCompletionList(PYSMELLDICT, klass, parents):
-    completions = []
+def _createInstanceCompletionList(index, klass, parents, prefix='', ignoreCase=True):
     if klass: #if we know the class
-        completions.extend(getCompletionsForClass(klass, parents, PYSMELLDICT))
+        return _getRecordsForClass(klass, parents, index)
     else: #just put everything
-        for klass, klassDict in list(PYSMELLDICT['CLASSES'].items()):
-            addCompletionsForClass(klass, klassDict, completions)
-    return completions
+        return index.candidates('allMembers', prefix, ignoreCase)
 
 
-def _createTopLevelCompletionList(PYSMELLDICT):
-    completions = []
-    completions.extend(_getCompForConstant(word) for word in PYSMELLDICT['CONSTANTS'])
-    completions.extend(_getCompForFunction(func, 'f') for func in PYSMELLDICT['FUNCTIONS'])
-    completions.extend(_getCompForConstructor(klass, klassDict) for (klass, klassDict) in list(PYSMELLDICT['CLASSES'].items()))
-    return completions
+def getCompletionsForClass(klass, parents, PYSMELLDICT):
+    return [record.toDict() for record in _getRecordsForClass(klass, parents, getIndex(PYSMELLDICT))]
 
 
-def _createModuleCompletions(PYSMELLDICT, module, completeModuleMembers):
-    completions = []
-    splitModules = set()
-    for reference in PYSMELLDICT['HIERARCHY']:
-        if not reference.startswith(module): continue
-        if reference == module: continue
-
-        # like zip, but pad with None
-        for mod, ref in map(None, module.split('.'), reference.split('.')):
-            if mod != ref:
-                splitModules.add(ref)
-                break
-
-    if completeModuleMembers:
-        members = _createTopLevelCompletionList(PYSMELLDICT)
-        completions.extend(comp for comp in members if comp["menu"] == module and not comp["word"].startswith("_"))
-        pointers = []
-        for pointer in PYSMELLDICT['POINTERS']:
-            if pointer.startswith(module) and '.' not in pointer[len(module)+1:]:
-                basename = pointer[len(module)+1:]
-                if pointer.endswith(".*"):
-                    otherModule = PYSMELLDICT['POINTERS'][pointer][:-2] # remove .*
-                    completions.extend(_createModuleCompletions(PYSMELLDICT, otherModule, True))
-                else:
-                    splitModules.add(basename)
-                
-                
-    completions.extend(dict(word=name, kind="t", dup="1") for name in splitModules)
-    return completions
+def _getRecordsForClass(klass, parents, index):
+    if klass in index.PYSMELLDICT['CLASSES']:
+        return index.members(klass)
 
+    classes = []
+    for anc in parents:
+        if hasattr(builtins, anc): continue
+        classes.append(anc)
+        classes.extend(index.ancestors(anc))
+    records = []
+    seen = set()
+    for anc in classes:
+        if anc in seen: continue
+        seen.add(anc)
+        records.extend(index.classMembers(anc))
+    return sortRecords(records)
 
-def getCompletionsForClass(klass, parents, PYSMELLDICT):
-        klassDict = PYSMELLDICT['CLASSES'].get(klass, None)
-        completions = []
-        ancestorList = []
-        nonBuiltinParents = [p for p in parents if not hasattr(__builtin__, p)]
-        if klassDict is None and not nonBuiltinParents:
-            return completions
-        elif klassDict is None and nonBuiltinParents:
-            for anc in nonBuiltinParents:
-                _findAllParents(anc, PYSMELLDICT['CLASSES'], ancestorList)
-                ancDict = PYSMELLDICT['CLASSES'].get(anc, None)
-                if ancDict is None: continue
-                addCompletionsForClass(anc, ancDict, completions)
-            for anc in ancestorList:
-                ancDict = PYSMELLDICT['CLASSES'].get(anc, None)
-                if ancDict is None: continue
-                addCompletionsForClass(anc, ancDict, completions)
-            return completions
-            
-        _findAllParents(klass, PYSMELLDICT['CLASSES'], ancestorList)
-        addCompletionsForClass(klass, klassDict, completions)
-        for anc in ancestorList:
-            ancDict = PYSMELLDICT['CLASSES'].get(anc, None)
-            if ancDict is None: continue
-            addCompletionsForClass(anc, ancDict, completions)
-        return completions
-
-
-def addCompletionsForClass(klass, klassDict, completions):
-    module, klassName = klass.rsplit('.', 1)
-    completions.extend([dict(word=prop, kind='m', dup='1', menu='%s:%s' %
-                    (module, klassName)) for prop in klassDict['properties']])
-    completions.extend([_getCompForFunction(func, 'm', module='%s:%s' % (module,
-                klassName)) for func in klassDict['methods']])
-
-
-def _findAllParents(klass, classesDICT, ancList):
-    klassDict = classesDICT.get(klass, None)
-    if klassDict is None: return
-    for anc in klassDict['bases']:
-        if hasattr(__builtin__, anc): continue
-        ancList.append(anc)
-        _findAllParents(anc, classesDICT, ancList)
-
-
-def _getCompForConstant(word):
-    module, const = word.rsplit('.', 1)
-    return dict(word=const, kind='d', menu=module, dup='1')
-
-
-def _getCompForFunction(func, kind, module=None):
-    if module is None:
-        module, funcName = func[0].rsplit('.', 1)
-    else:
-        funcName = func[0]
-    return dict(word=funcName, kind=kind, menu=module, dup='1',
-                            abbr='%s(%s)' % (funcName, _argsList(func[1])))
-
-def _getCompForConstructor(klass, klassDict):
-    module, klassName = klass.rsplit('.', 1)
-    return dict(word=klassName, kind='t', menu=module, dup='1', abbr='%s(%s)' % (klassName, _argsList(klassDict['constructor'])))
-
-def _argsList(l):
-     return ', '.join([str(arg) for arg in l])
-
-def sortCompletions(comp1, comp2):
-    word1, word2 = comp1['word'], comp2['word']
-    return _sortCompletions(word1, word2)
-
-def _sortCompletions(word1, word2):
-    if word1.startswith('_'):
-        return _sortCompletions(word1[1:], word2) + 2
-    if word2.startswith('_'):
-        return _sortCompletions(word1, word2[1:]) - 2
-    return cmp(word1, word2)
+
+class CompletionSession(object):
+    """
+    Remembers the last completion request, so that typing more of the same
+    word (``self.get`` -> ``self.getC`` -> ``self.getCo``) refines the
+    previous candidates instead of running detectCompletionType and
+    findCompletions again.
+
+    A request continues the session when it is for the same file, line,
+    start column and matcher, its base extends the previous base and the
+    buffer is unchanged outside the word being completed. Anything else
+    starts a new session.
+
+    Editors that know which lines changed can pass lookup and store a
+    ``context`` standing for the buffer outside the word, so that source
+    isn't split and compared on every keystroke (see emacshelper.Buffer).
+    """
+    REFINABLE = (Types.TOPLEVEL, Types.MODULE, Types.INSTANCE)
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.key = None
+        self.base = None
+        self.options = None
+        self.records = None
+        self._context = None
+
+    def _getContext(self, source, lineNo, origCol, base):
+        "the buffer outside the completed word, or None if base isn't left of the cursor"
+        lines = source.splitlines()
+        line = lines[lineNo - 1]
+        start = origCol - len(base)
+        if start < 0 or line[start:origCol] != base:
+            return None
+        return (lines[:lineNo - 1], line[:start], line[origCol:], lines[lineNo:])
+
+    def lookup(self, fullPath, source, lineNo, origCol, base, matcher=None, context=None):
+        "return the refined Completion records, or None if the request has to be computed"
+        if self.key != (fullPath, lineNo, origCol - len(base), matcher):
+            return None
+        if not base.startswith(self.base):
+            return None
+        if context is None:
+            context = self._getContext(source, lineNo, origCol, base)
+        if context != self._context:
+            self.clear()
+            return None
+        if base != self.base:
+            doesMatch = MATCHERS[matcher](base)
+            self.records = [record for record in self.records if doesMatch(record.word)]
+            self.base = base
+        return self.records
+
+    def store(self, fullPath, source, lineNo, origCol, base, matcher, options, records, context=None):
+        self.clear()
+        if options.compType not in self.REFINABLE:
+            return
+        if context is None:
+            context = self._getContext(source, lineNo, origCol, base)
+        if context is None:
+            return
+        self.key = (fullPath, lineNo, origCol - len(base), matcher)
+        self.base = base
+        self.options = options
+        self.records = records
+        self._context = context
+
+    def complete(self, fullPath, source, lineNo, origCol, base, PYSMELLDICT, matcher=None, limit=None):
+        "detectCompletionType and findCompletions in one go, reusing the previous request when possible"
+        records = self.lookup(fullPath, source, lineNo, origCol, base, matcher)
+        if records is not None:
+            return toCompletionDicts(records[:limit], self.options)
+        options = detectCompletionType(fullPath, source, lineNo, origCol, base, PYSMELLDICT)
+        records = findCompletionRecords(base, PYSMELLDICT, options, matcher)
+        self.store(fullPath, source, lineNo, origCol, base, matcher, options, records)
+        return toCompletionDicts(records[:limit], options)
+
+
+class FileAnalysis(object):
+    """
+    What detectCompletionType works out from the source of a file, kept so
+    that completing many positions in it parses and walks it once: its
+    lines, its tree (once per edited line if the source doesn't parse), the
+    imports, names and classes in the tree, the module dict shown as the
+    overlay (and the index showing it) and the packages the file is in.
+    """
+    def __init__(self, fullPath, source):
+        self.fullPath = fullPath
+        self.source = source
+        self._lines = None
+        self._parsed = False
+        self._tree = None
+        self._patchedTrees = {}
+        self._walks = {}
+        self._packages = None
+        self._overlayIndex = None
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.source.splitlines()
+        return self._lines
+
+    def tree(self, lineNo):
+        "getSafeTree(source, lineNo)"
+        if not self._parsed:
+            self._tree = parseSource(self.source)
+            self._parsed = True
+        if self._tree is not None:
+            return self._tree
+        if lineNo not in self._patchedTrees:
+            self._patchedTrees[lineNo] = getPatchedTree(self.source, lineNo)
+        return self._patchedTrees[lineNo]
+
+    def _walk(self, name, walk, tree):
+        # the tree is kept with what was found in it, so that its id isn't reused
+        entry = self._walks.get((name, id(tree)))
+        if entry is None or entry[0] is not tree:
+            entry = self._walks[(name, id(tree))] = (tree, walk(tree))
+        return entry[1]
+
+    def imports(self, tree):
+        return self._walk('imports', getImports, tree)
+
+    def names(self, tree):
+        return self._walk('names', getNames, tree)
+
+    def classAndParents(self, tree, lineNo):
+        if tree is None:
+            return None, []
+        return getClassAndParents(tree, lineNo, self._walk('classes', getClassRanges, tree))
+
+    def overlay(self, tree):
+        return self._walk('overlay', lambda tree: analyzeFile(self.fullPath, tree), tree)
+
+    def overlayIndex(self, PYSMELLDICT, tree):
+        "getIndex(PYSMELLDICT, self.overlay(tree)), made again only when either changes"
+        self._overlayIndex = _withOverlay(PYSMELLDICT, self.overlay(tree), self._overlayIndex)
+        return self._overlayIndex
+
+    def packages(self):
+        if self._packages is None:
+            path, filename = os.path.split(self.fullPath)
+            self._packages = findRootPackageList(path, filename)
+        return self._packages
+
+
+def completePositions(fullPath, source, positions, PYSMELLDICT, matcher=None, limit=None):
+    """
+    The completions findCompletions gives for every (lineNo, origCol, base)
+    in positions, in order, analysing source once for all of them and
+    looking up the same word completed the same way once. Positions on
+    lines source doesn't have get no completions.
+    """
+    analysis = FileAnalysis(fullPath, source)
+    found = {}
+    results = []
+    for lineNo, origCol, base in positions:
+        if not 0 < lineNo <= len(analysis.lines()):
+            results.append([])
+            continue
+        options = detectCompletionType(fullPath, source, lineNo, origCol, base, PYSMELLDICT, analysis=analysis)
+        # the overlay stays the same, so do the records
+        key = (base, repr(options))
+        if key not in found:
+            found[key] = findCompletionRecords(base, PYSMELLDICT, options, matcher)
+        results.append(toCompletionDicts(found[key][:limit], options))
+    return results
@@ -0,0 +1,757 @@
+# index.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+import builtins
+import threading
+from operator import attrgetter
+from sys import intern
+
+MAXINDEXES = 8
+MAXPOINTERHOPS = 16
+
+def sortKey(word):
+    """
+    Return the key completions are ordered by: the number of leading
+    underscores first, then the name without them. ``_private`` sorts after
+    every public name and ``__magic__`` after every ``_private`` one.
+    """
+    stripped = word.lstrip('_')
+    return (len(word) - len(stripped), stripped)
+
+
+class Completion(object):
+    """
+    A completion candidate. Words, kinds and menus are interned, so the
+    thousands of records coming from one module share their strings.
+    Editors get dicts from toDict(), which is only called for the
+    candidates that are actually returned.
+    """
+    __slots__ = ('key', 'word', 'kind', 'menu', 'abbr')
+
+    def __init__(self, word, kind, menu=None, abbr=None):
+        self.word = intern(word)
+        self.kind = kind
+        self.menu = intern(menu) if menu is not None else None
+        self.abbr = abbr
+        self.key = sortKey(word)
+
+    def toDict(self):
+        comp = dict(word=self.word, kind=self.kind, dup='1')
+        if self.menu is not None:
+            comp['menu'] = self.menu
+        if self.abbr is not None:
+            comp['abbr'] = self.abbr
+        return comp
+
+    def __eq__(self, other):
+        return (isinstance(other, Completion) and self.word == other.word and self.kind == other.kind
+                    and self.menu == other.menu and self.abbr == other.abbr)
+
+    def __ne__(self, other):
+        return not self == other
+
+    # pickled as a plain tuple, which is smaller and faster to read back
+    # than the dict of slots pickle uses by default (see indexcache)
+    def __getstate__(self):
+        return (self.key, self.word, self.kind, self.menu, self.abbr)
+
+    def __setstate__(self, state):
+        self.key, self.word, self.kind, self.menu, self.abbr = state
+
+    def __repr__(self):
+        return 'Completion(%r, %r, %r, %r)' % (self.word, self.kind, self.menu, self.abbr)
+
+
+recordKey = attrgetter('key')
+
+
+def sortRecords(records):
+    records.sort(key=recordKey)
+    return records
+
+
+def _argsList(l):
+     return ', '.join([str(arg) for arg in l])
+
+
+def _getCompForConstant(word):
+    module, const = word.rsplit('.', 1)
+    return Completion(const, 'd', module)
+
+
+def _getCompForFunction(func, kind, module=None):
+    if module is None:
+        module, funcName = func[0].rsplit('.', 1)
+    else:
+        funcName = func[0]
+    return Completion(funcName, kind, module, '%s(%s)' % (funcName, _argsList(func[1])))
+
+
+def _getCompForConstructor(klass, klassDict):
+    module, klassName = klass.rsplit('.', 1)
+    return Completion(klassName, 't', module, '%s(%s)' % (klassName, _argsList(klassDict['constructor'])))
+
+
+def _getCompsForClass(klass, klassDict):
+    module, klassName = klass.rsplit('.', 1)
+    menu = intern('%s:%s' % (module, klassName))
+    comps = [Completion(prop, 'm', menu) for prop in klassDict['properties']]
+    comps.extend([_getCompForFunction(func, 'm', module=menu) for func in klassDict['methods']])
+    return comps
+
+
+class ModuleNode(object):
+    """
+    A node in the tree of dotted module names. ``children`` maps the next
+    name part to its node, ``members`` holds the sorted public records defined
+    in the module, ``pointers`` the names it imports (name -> target) and
+    ``stars`` the modules it star-imports.
+    """
+    def __init__(self):
+        self.children = {}
+        self.members = []
+        self.pointers = {}
+        self.stars = []
+        self.inHierarchy = False
+
+    def listedChildren(self):
+        return [name for (name, child) in self.children.items() if child.inHierarchy]
+
+
+class CompletionIndex(object):
+    """
+    Sorted Completion records for a PYSMELLDICT.
+
+    Every section is built the first time it is asked for and kept, so the
+    records (and their sort keys) are computed once per loaded PYSMELLDICT
+    instead of once per completion request. The lists returned are shared -
+    don't modify them.
+    """
+    queriesPrefixes = False
+
+    def __init__(self, PYSMELLDICT):
+        self.PYSMELLDICT = PYSMELLDICT
+        self._sections = {}
+        self._classMembers = {}
+        self._ancestors = {}
+        self._members = {}
+        self._moduleTree = None
+        self._moduleCompletions = {}
+        self._starTable = None
+        self._qualified = {}
+        # counts the invalidations, for the OverlayIndexes put on this one
+        self.generation = 0
+
+    def _section(self, name, build):
+        records = self._sections.get(name)
+        if records is None:
+            records = self._sections[name] = sortRecords(build())
+        return records
+
+    def constants(self):
+        return self._section('CONSTANTS', lambda: [_getCompForConstant(word)
+                                    for word in self.PYSMELLDICT['CONSTANTS']])
+
+    def functions(self):
+        return self._section('FUNCTIONS', lambda: [_getCompForFunction(func, 'f')
+                                    for func in self.PYSMELLDICT['FUNCTIONS']])
+
+    def constructors(self):
+        return self._section('CONSTRUCTORS', lambda: [_getCompForConstructor(klass, klassDict)
+                                    for (klass, klassDict) in self.PYSMELLDICT['CLASSES'].items()])
+
+    def topLevel(self):
+        # each part is already sorted, so this sort only merges the runs
+        return self._section('TOPLEVEL', lambda: self.constants() + self.functions() + self.constructors())
+
+    def allMembers(self):
+        def build():
+            records = []
+            for klass in self.PYSMELLDICT['CLASSES']:
+                records.extend(self.classMembers(klass))
+            return records
+        return self._section('MEMBERS', build)
+
+    def candidates(self, section, prefix, ignoreCase):
+        """
+        Sorted records of ``section`` (topLevel, functions or allMembers)
+        that can start with prefix. Indexes that can't search by prefix
+        (queriesPrefixes is False) return the whole section, so callers still
+        have to match the words themselves.
+        """
+        return getattr(self, section)()
+
+    def classMembers(self, klass):
+        "sorted records for the methods and properties defined in klass itself"
+        records = self._classMembers.get(klass)
+        if records is None:
+            klassDict = self.PYSMELLDICT['CLASSES'].get(klass, None)
+            if klassDict is None:
+                records = []
+            else:
+                records = sortRecords(_getCompsForClass(klass, klassDict))
+            self._classMembers[klass] = records
+        return records
+
+    def ancestors(self, klass):
+        """
+        All the non-builtin ancestors of klass, depth first and without
+        duplicates. Bases that lead back to a class that is still being
+        resolved are listed but not followed, so cyclic hierarchies terminate.
+        """
+        return self._findAncestors(klass, set())[0]
+
+    def _findAncestors(self, klass, resolving):
+        "return the ancestors of klass and the classes of a cycle they skipped"
+        ancestors = self._ancestors.get(klass)
+        if ancestors is not None:
+            return ancestors, set()
+        klassDict = self.PYSMELLDICT['CLASSES'].get(klass, None)
+        if klassDict is None:
+            return [], set()
+        resolving.add(klass)
+        ancestors = []
+        skipped = set()
+        seen = set([klass])
+        for base in klassDict['bases']:
+            if hasattr(builtins, base): continue
+            if base not in seen:
+                seen.add(base)
+                ancestors.append(base)
+            if base in resolving:
+                skipped.add(base)
+                continue
+            baseAncestors, baseSkipped = self._findAncestors(base, resolving)
+            skipped.update(baseSkipped)
+            for anc in baseAncestors:
+                if anc not in seen:
+                    seen.add(anc)
+                    ancestors.append(anc)
+        resolving.discard(klass)
+        skipped.discard(klass)
+        # a list that stopped at a class further up the cycle is only
+        # partial, it gets computed again when asked for directly
+        if not skipped:
+            self._ancestors[klass] = ancestors
+        return ancestors, skipped
+
+    def members(self, klass):
+        "sorted records for klass and everything it inherits"
+        entry = self._members.get(klass)
+        if entry is None:
+            classes = [klass] + self.ancestors(klass)
+            records = []
+            for anc in classes:
+                records.extend(self.classMembers(anc))
+            # every class contributes an already sorted run, so this is a merge
+            entry = self._members[klass] = (set(classes), sortRecords(records))
+        return entry[1]
+
+    def moduleTree(self):
+        """
+        The root ModuleNode of every module in HIERARCHY. Modules that only
+        show up as the home of a member or a pointer get a node too, but they
+        are not listed as submodules.
+        """
+        if self._moduleTree is None:
+            root = ModuleNode()
+            for module in self.PYSMELLDICT['HIERARCHY']:
+                node = root
+                for part in module.split('.'):
+                    node = node.children.setdefault(part, ModuleNode())
+                    node.inHierarchy = True
+            for record in self.topLevel():
+                if not record.word.startswith('_'):
+                    _getModuleNode(root, record.menu).members.append(record)
+            for pointer, target in self.PYSMELLDICT['POINTERS'].items():
+                if '.' not in pointer: continue
+                module, name = pointer.rsplit('.', 1)
+                node = _getModuleNode(root, module)
+                if name == '*':
+                    node.stars.append(target[:-2]) # remove .*
+                else:
+                    node.pointers[name] = target
+            self._moduleTree = root
+        return self._moduleTree
+
+    def findModule(self, module):
+        "return the ModuleNode for a dotted module name, or None"
+        node = self.moduleTree()
+        for part in module.split('.'):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def starImports(self, module):
+        "every module whose members ``module`` re-exports through star imports, cycles cut"
+        found = []
+        pending = [module]
+        seen = set(pending)
+        while pending:
+            node = self.findModule(pending.pop(0))
+            if node is None: continue
+            for other in node.stars:
+                if other not in seen:
+                    seen.add(other)
+                    found.append(other)
+                    pending.append(other)
+        return found
+
+    def moduleCompletions(self, module, showMembers):
+        """
+        Sorted records for what can follow ``module`` in an import or an
+        attribute lookup. The last part of ``module`` can be incomplete, in
+        which case the modules it is a prefix of are included.
+        """
+        key = (module, showMembers)
+        records = self._moduleCompletions.get(key)
+        if records is not None:
+            return records
+
+        records = []
+        names = set()
+        parentName, _, last = module.rpartition('.')
+        parent = self.findModule(parentName) if parentName else self.moduleTree()
+        if parent is not None:
+            names.update(name for name in parent.listedChildren()
+                                if name.startswith(last) and name != last)
+        node = self.findModule(module)
+        if node is not None:
+            names.update(node.listedChildren())
+
+        if showMembers:
+            for other in [module] + self.starImports(module):
+                otherNode = self.findModule(other)
+                if otherNode is None: continue
+                records.extend(otherNode.members)
+                names.update(otherNode.pointers)
+                if other != module:
+                    names.update(otherNode.listedChildren())
+
+        records.extend(Completion(name, 't') for name in names)
+        records = self._moduleCompletions[key] = sortRecords(records)
+        return records
+
+    def starTable(self):
+        "map every module that star-imports something to the modules it imports from"
+        if self._starTable is None:
+            table = {}
+            for pointer, target in self.PYSMELLDICT['POINTERS'].items():
+                if pointer.endswith('.*'):
+                    table.setdefault(pointer[:-2], []).append(target[:-2])
+            self._starTable = table
+        return self._starTable
+
+    def qualify(self, thing):
+        """
+        Resolve ``thing`` through the POINTERS (including star imports) to the
+        name it finally refers to. Chains of re-exports are followed for at
+        most MAXPOINTERHOPS hops, and resolution stops at known classes and
+        at cycles. Names that aren't pointers are returned unchanged.
+        """
+        qualified = self._qualified.get(thing)
+        if qualified is None:
+            qualified = thing
+            seen = set([thing])
+            for _ in range(MAXPOINTERHOPS):
+                if qualified in self.PYSMELLDICT['CLASSES']:
+                    break
+                target = self._followPointer(qualified)
+                if target is None or target in seen:
+                    break
+                seen.add(target)
+                qualified = target
+            self._qualified[thing] = qualified
+        return qualified
+
+    def _followPointer(self, thing):
+        "one hop: what ``thing`` points at directly, or through a star import"
+        POINTERS = self.PYSMELLDICT['POINTERS']
+        if thing in POINTERS:
+            return POINTERS[thing]
+        starTable = self.starTable()
+        module, rest = thing, ''
+        # the longest star-importing module that thing is a part of wins
+        while '.' in module:
+            module, name = module.rsplit('.', 1)
+            rest = rest and '%s.%s' % (name, rest) or name
+            targets = starTable.get(module)
+            if not targets:
+                continue
+            candidates = ['%s.%s' % (target, rest) for target in targets]
+            for candidate in candidates:
+                if self._isKnown(candidate):
+                    return candidate
+            return candidates[0]
+        return None
+
+    def _isKnown(self, name):
+        return (name in self.PYSMELLDICT['CLASSES'] or name in self.PYSMELLDICT['POINTERS']
+                    or self.findModule(name) is not None)
+
+    def precompute(self):
+        "build every section and the ancestor table up front"
+        self.moduleTree()
+        self.topLevel()
+        self.allMembers()
+        for klass in self.PYSMELLDICT['CLASSES']:
+            self.members(klass)
+
+    def invalidateModules(self, modules):
+        """
+        Forget what was derived from ``modules`` after they have been
+        re-indexed. Cached members are only dropped for the classes defined in
+        those modules and for the classes inheriting from them.
+        """
+        modules = set(modules)
+        inModules = lambda klass: klass.rsplit('.', 1)[0] in modules
+        changed = set(klass for klass in self._classMembers if inModules(klass))
+        changed.update(klass for klass in self.PYSMELLDICT['CLASSES'] if inModules(klass))
+        for klass in changed:
+            self._classMembers.pop(klass, None)
+        for klass, ancestors in list(self._ancestors.items()):
+            if klass in changed or changed.intersection(ancestors):
+                del self._ancestors[klass]
+        for klass, (classes, _) in list(self._members.items()):
+            if changed.intersection(classes):
+                del self._members[klass]
+        self._sections.clear()
+        self._moduleTree = None
+        self._moduleCompletions.clear()
+        self._starTable = None
+        self._qualified.clear()
+        self.generation += 1
+
+    def derive(self, PYSMELLDICT, modules):
+        """
+        An index for PYSMELLDICT, a new dict that holds the same tags as this
+        one's except for ``modules``. It starts with the class members this
+        index already worked out for the other modules. This index is left alone.
+        """
+        index = CompletionIndex(PYSMELLDICT)
+        index._classMembers = dict(self._classMembers)
+        index._ancestors = dict(self._ancestors)
+        index._members = dict(self._members)
+        index.invalidateModules(modules)
+        return index
+
+
+def _getModuleNode(root, module):
+    node = root
+    for part in module.split('.'):
+        node = node.children.setdefault(part, ModuleNode())
+    return node
+
+
+def _moduleOf(name):
+    return name.rsplit('.', 1)[0]
+
+
+class LayeredMapping(object):
+    """
+    A read-only view of two mappings keyed by dotted names (like CLASSES and
+    POINTERS), where the keys of the shadowed modules come only from
+    ``overlay``.
+    """
+    def __init__(self, base, overlay, shadowed):
+        self.base = base
+        self.overlay = overlay
+        self.shadowed = shadowed
+
+    def __contains__(self, key):
+        return key in self.overlay or (key in self.base and _moduleOf(key) not in self.shadowed)
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        if _moduleOf(key) in self.shadowed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        for key in self.overlay:
+            yield key
+        for key in self.base:
+            if key not in self.overlay and _moduleOf(key) not in self.shadowed:
+                yield key
+
+    def keys(self):
+        return [key for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __len__(self):
+        return len(self.keys())
+
+
+class LayeredDict(object):
+    """
+    A PYSMELLDICT-like, read-only view of ``base`` with ``overlay`` (the
+    analysis of an edited buffer) on top. Everything ``base`` knows about
+    the modules analysed in ``overlay`` is hidden.
+    """
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+        self.shadowed = set(overlay['HIERARCHY'])
+        self._lists = {}
+
+    def __getitem__(self, key):
+        if key in ('CLASSES', 'POINTERS'):
+            return LayeredMapping(self.base[key], self.overlay[key], self.shadowed)
+        if key not in self._lists:
+            if key == 'HIERARCHY':
+                values = list(self.base[key])
+                values.extend(module for module in self.overlay[key] if module not in values)
+            else:
+                if key == 'FUNCTIONS':
+                    values = [func for func in self.base[key] if _moduleOf(func[0]) not in self.shadowed]
+                else:
+                    values = [const for const in self.base[key] if _moduleOf(const) not in self.shadowed]
+                values.extend(self.overlay[key])
+            self._lists[key] = values
+        return self._lists[key]
+
+    def __contains__(self, key):
+        return key in self.base
+
+    def keys(self):
+        return list(self.base.keys())
+
+
+class OverlayIndex(CompletionIndex):
+    """
+    The CompletionIndex of a LayeredDict. Whatever doesn't involve the
+    shadowed modules is taken from the (cached) index of the base, so an
+    overlay is cheap to replace on every edit.
+    """
+    def __init__(self, base, overlay):
+        CompletionIndex.__init__(self, LayeredDict(base.PYSMELLDICT, overlay))
+        self.base = base
+        self.overlay = overlay
+        self.overlayIndex = CompletionIndex(overlay)
+        self.shadowed = self.PYSMELLDICT.shadowed
+        self._nodes = {}
+        self.baseGeneration = base.generation
+
+    def isCurrent(self):
+        "whether the base index is unchanged since the overlay was put on it"
+        return self.base.generation == self.baseGeneration
+
+    def _isShadowed(self, name):
+        return _moduleOf(name) in self.shadowed
+
+    def _layered(self, name, moduleOf):
+        def build():
+            records = [record for record in getattr(self.base, name)()
+                            if moduleOf(record) not in self.shadowed]
+            records.extend(getattr(self.overlayIndex, name)())
+            return records
+        return self._section(name, build)
+
+    def constants(self):
+        return self._layered('constants', lambda record: record.menu)
+
+    def functions(self):
+        return self._layered('functions', lambda record: record.menu)
+
+    def constructors(self):
+        return self._layered('constructors', lambda record: record.menu)
+
+    def allMembers(self):
+        return self._layered('allMembers', lambda record: record.menu.split(':', 1)[0])
+
+    def candidates(self, section, prefix, ignoreCase):
+        if not (prefix and self.base.queriesPrefixes):
+            return CompletionIndex.candidates(self, section, prefix, ignoreCase)
+        moduleOf = section == 'allMembers' and (lambda record: record.menu.split(':', 1)[0]) or attrgetter('menu')
+        records = [record for record in self.base.candidates(section, prefix, ignoreCase)
+                        if moduleOf(record) not in self.shadowed]
+        records.extend(self.overlayIndex.candidates(section, prefix, ignoreCase))
+        return sortRecords(records)
+
+    def classMembers(self, klass):
+        if self._isShadowed(klass):
+            return self.overlayIndex.classMembers(klass)
+        return self.base.classMembers(klass)
+
+    def ancestors(self, klass):
+        if not self._isShadowed(klass):
+            ancestors = self.base.ancestors(klass)
+            if not [anc for anc in ancestors if self._isShadowed(anc)]:
+                return ancestors
+        return CompletionIndex.ancestors(self, klass)
+
+    def moduleTree(self):
+        return self.findModule('')
+
+    def findModule(self, module):
+        if module in self._nodes:
+            return self._nodes[module]
+        if module:
+            baseNode = self.base.findModule(module)
+            overlayNode = self.overlayIndex.findModule(module)
+        else:
+            baseNode = self.base.moduleTree()
+            overlayNode = self.overlayIndex.moduleTree()
+        if overlayNode is None or baseNode is None:
+            node = overlayNode or baseNode
+        else:
+            node = ModuleNode()
+            node.children = dict(baseNode.children)
+            for name, child in overlayNode.children.items():
+                if child.inHierarchy or name not in node.children:
+                    node.children[name] = child
+            source = module in self.shadowed and overlayNode or baseNode
+            node.members, node.pointers, node.stars = source.members, source.pointers, source.stars
+            node.inHierarchy = baseNode.inHierarchy or overlayNode.inHierarchy
+        self._nodes[module] = node
+        return node
+
+    def starTable(self):
+        if self._starTable is None:
+            table = dict((module, targets) for (module, targets) in self.base.starTable().items()
+                                if module not in self.shadowed)
+            table.update(self.overlayIndex.starTable())
+            self._starTable = table
+        return self._starTable
+
+
+class TagsDict(dict):
+    """
+    A PYSMELLDICT that keeps its own index, so the index lives exactly as
+    long as the tags. Tags loaded by pysmell are TagsDicts. Indexes of
+    plain dicts are cached by getIndex instead, for MAXINDEXES dicts at most.
+    """
+    def __reduce__(self):
+        # what is kept with the tags isn't part of them
+        return (TagsDict, (dict(self),))
+
+
+# guards the indexes kept with every PYSMELLDICT, and _INDEXES
+_LOCK = threading.Lock()
+# the indexes of plain dicts, which can't keep their own: id -> (dict, index), oldest first
+_INDEXES = {}
+
+def getIndex(PYSMELLDICT, overlay=None):
+    """
+    Return the CompletionIndex for PYSMELLDICT, building it on first use.
+    With ``overlay``, a PYSMELLDICT for the buffer being edited, the index
+    shows PYSMELLDICT with the overlay on top (see OverlayIndex). Overlaid
+    indexes are made for the caller, and neither PYSMELLDICT nor its index
+    is modified. An index passed as PYSMELLDICT is used as it is.
+
+    The index is kept with PYSMELLDICT, unless it is a plain dict (see
+    TagsDict). Code that changes a PYSMELLDICT in place has to call
+    invalidateIndex or invalidateModules afterwards.
+    """
+    if isinstance(PYSMELLDICT, CompletionIndex):
+        index = PYSMELLDICT
+    else:
+        index = getBaseIndex(PYSMELLDICT)
+    if overlay is not None:
+        return OverlayIndex(index, overlay)
+    return index
+
+
+def _findIndex(PYSMELLDICT):
+    "the index kept for PYSMELLDICT or None, with _LOCK held"
+    if hasattr(PYSMELLDICT, '__dict__'):
+        return PYSMELLDICT.__dict__.get('_index')
+    entry = _INDEXES.get(id(PYSMELLDICT))
+    if entry is None or entry[0] is not PYSMELLDICT:
+        return None
+    return entry[1]
+
+
+def _keepIndex(PYSMELLDICT, index):
+    "keep index for PYSMELLDICT, with _LOCK held"
+    if hasattr(PYSMELLDICT, '__dict__'):
+        PYSMELLDICT._index = index
+        return
+    _INDEXES.pop(id(PYSMELLDICT), None)
+    while len(_INDEXES) >= MAXINDEXES:
+        del _INDEXES[next(iter(_INDEXES))]
+    _INDEXES[id(PYSMELLDICT)] = (PYSMELLDICT, index)
+
+
+def _keptIndex(PYSMELLDICT):
+    _LOCK.acquire()
+    try:
+        return _findIndex(PYSMELLDICT)
+    finally:
+        _LOCK.release()
+
+
+def getBaseIndex(PYSMELLDICT):
+    "the index of PYSMELLDICT itself, built on first use"
+    index = _keptIndex(PYSMELLDICT)
+    if index is not None:
+        return index
+    # stores like tagdb.TagDB bring their own kind of index
+    createIndex = getattr(PYSMELLDICT, 'createIndex', None)
+    index = createIndex and createIndex() or CompletionIndex(PYSMELLDICT)
+    _LOCK.acquire()
+    try:
+        # unless another thread got there first
+        kept = _findIndex(PYSMELLDICT)
+        if kept is not None:
+            return kept
+        _keepIndex(PYSMELLDICT, index)
+        return index
+    finally:
+        _LOCK.release()
+
+
+def invalidateModules(PYSMELLDICT, modules):
+    "PYSMELLDICT was changed in place for ``modules``, forget what was derived from them"
+    index = _keptIndex(PYSMELLDICT)
+    if index is not None:
+        index.invalidateModules(modules)
+
+
+def deriveIndex(PYSMELLDICT, previous, modules):
+    """
+    Index PYSMELLDICT, a copy of the dict ``previous`` with ``modules``
+    changed, starting from what was derived from ``previous``. Neither
+    ``previous`` nor its index is modified.
+    """
+    index = _keptIndex(previous)
+    if type(index) is not CompletionIndex:
+        return getBaseIndex(PYSMELLDICT)
+    return registerIndex(index.derive(PYSMELLDICT, modules))
+
+
+def registerIndex(index):
+    "make getIndex use ``index`` for its PYSMELLDICT, as if it had built it, and return it"
+    _LOCK.acquire()
+    try:
+        _keepIndex(index.PYSMELLDICT, index)
+    finally:
+        _LOCK.release()
+    return index
+
+
+def invalidateIndex(PYSMELLDICT):
+    _LOCK.acquire()
+    try:
+        if hasattr(PYSMELLDICT, '__dict__'):
+            PYSMELLDICT.__dict__.pop('_index', None)
+        else:
+            _INDEXES.pop(id(PYSMELLDICT), None)
+    finally:
+        _LOCK.release()
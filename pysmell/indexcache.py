@@ -0,0 +1,144 @@
+# indexcache.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+What lets a restarted completion server (``pysmell serve``) pick up where
+it left off, kept in a cache directory (~/.pysmell by default):
+
+    recent.json          the directories completions were last asked
+                         for, most recent first, one per set of tags
+    index-<key>.pickle   a CompletionIndex with everything it worked out
+                         (completion records, ancestor tables, the module
+                         tree) and the tags it indexes
+
+A snapshot is only used while the tags files it was made from are
+unchanged (see tagscache.tagsStamp), and only plain tags are snapshotted -
+sharded, sectioned and SQLite tags load what they need lazily anyway.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from pysmell.index import CompletionIndex, getBaseIndex, registerIndex
+from pysmell.shards import getShardSet
+
+VERSION = 2
+# how many of the projects used last prewarm loads
+RECENT = 6
+
+version = __import__('pysmell').__version__
+
+
+def defaultDirectory():
+    return os.path.join(os.path.expanduser('~'), '.pysmell')
+
+
+def stampKey(stamp):
+    "a name for the set of tags files in stamp, whatever their modification times"
+    paths = '\n'.join([path for path, _ in stamp])
+    return hashlib.md5(paths.encode('utf-8')).hexdigest()
+
+
+def snapshotPath(directory, stamp):
+    return os.path.join(directory, 'index-%s.pickle' % stampKey(stamp))
+
+
+def canSnapshot(PYSMELLDICT):
+    return (isinstance(PYSMELLDICT, dict) and getShardSet(PYSMELLDICT) is None
+            and type(getBaseIndex(PYSMELLDICT)) is CompletionIndex)
+
+
+def _replace(path, write):
+    "write to path with write(file), so that readers see the old file or the whole new one"
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # other processes may be writing the same path, each gets its own new file
+    descriptor, newPath = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=directory)
+    try:
+        newFile = os.fdopen(descriptor, 'wb')
+        try:
+            write(newFile)
+        finally:
+            newFile.close()
+        os.replace(newPath, path)
+    except Exception:
+        os.remove(newPath)
+        raise
+
+
+def dumpIndex(path, PYSMELLDICT, stamp):
+    "write the index of PYSMELLDICT, whose tags files have the stamp, to path"
+    index = getBaseIndex(PYSMELLDICT)
+    _replace(path, lambda snapshotFile: pickle.dump((VERSION, version, stamp, index), snapshotFile,
+                                                     protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def loadIndex(path, stamp):
+    """
+    The PYSMELLDICT of the snapshot at path, with its index ready for
+    getIndex, or None if there is no usable snapshot for tags with the stamp.
+    """
+    try:
+        snapshotFile = open(path, 'rb')
+    except IOError:
+        return None
+    # the snapshot holds hundreds of thousands of records and nothing to
+    # collect, the collector would only keep walking them while they are read
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            snapshotVersion, pysmellVersion, snapshotStamp, index = pickle.load(snapshotFile)
+        except Exception:
+            return None
+    finally:
+        if collecting:
+            gc.enable()
+        snapshotFile.close()
+    if (snapshotVersion, pysmellVersion, snapshotStamp) != (VERSION, version, stamp):
+        return None
+    return registerIndex(index).PYSMELLDICT
+
+
+def readRecent(directory):
+    "the directories in recent.json, most recent first"
+    try:
+        recentFile = open(os.path.join(directory, 'recent.json'))
+    except IOError:
+        return []
+    try:
+        try:
+            return [entry[0] for entry in json.load(recentFile)]
+        except (ValueError, TypeError, IndexError):
+            return []
+    finally:
+        recentFile.close()
+
+
+def addRecent(directory, project, stamp):
+    "put project, a directory with the tags in stamp, first in recent.json"
+    key = stampKey(stamp)
+    recent = [[project, key]]
+    try:
+        recentFile = open(os.path.join(directory, 'recent.json'))
+        try:
+            entries = json.load(recentFile)
+        finally:
+            recentFile.close()
+    except (IOError, ValueError):
+        entries = []
+    for entry in entries:
+        if len(recent) < RECENT and entry[1] != key and entry[0] != project:
+            recent.append(entry)
+    _replace(os.path.join(directory, 'recent.json'),
+             lambda recentFile: recentFile.write(json.dumps(recent, indent=1).encode('utf-8')))
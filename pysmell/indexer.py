@@ -0,0 +1,226 @@
+# indexer.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Tag generation that editors can leave running in the background. An
+Indexer analyses the files on a thread of its own, reports its progress to
+a callback and to a status file, and can be cancelled. The tags are written
+next to the output and moved over it at the end, so editors keep reading
+the old tags until the new ones are complete, and a cancelled run leaves
+them alone.
+
+``pysmell index`` runs an Indexer in the foreground, for editors that
+would rather start a process and read its status file (or its --progress
+lines) than run python.
+
+The status is a dict, written to the status file as JSON:
+
+    state    RUNNING, DONE, CANCELLED or FAILED
+    done     how many files were analysed
+    total    how many files there are to analyse
+    current  the file being analysed, or None
+    output   the tags file being written
+    error    what went wrong, when FAILED
+    elapsed  seconds since the start
+    pid      the process indexing
+"""
+
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from pysmell import argparse
+from pysmell.outputHandlers.PickleOut import PickleOut
+from pysmell.tags import CONVERT_FORMATS, process
+from pysmell.tagsfile import PICKLE
+from pysmell.tagslog import removeLog
+
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+# the status file is rewritten at most this often while running
+STATUS_INTERVAL = 0.2
+
+
+class Cancelled(Exception):
+    "raised by a progress callback to stop the analysis"
+
+
+def statusPath(output):
+    "where editors keep the status of the indexing writing output"
+    directory, filename = os.path.split(os.path.abspath(output))
+    return os.path.join(directory, '.%s.status' % filename)
+
+
+def writeStatus(path, status):
+    "write status to path as JSON, replacing the previous status in one go"
+    # indexers of the same output may run at once, each writes its own new file (see indexcache._replace)
+    descriptor, newPath = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=os.path.dirname(path) or '.')
+    try:
+        statusFile = os.fdopen(descriptor, 'w')
+        try:
+            json.dump(status, statusFile, sort_keys=True)
+        finally:
+            statusFile.close()
+        os.replace(newPath, path)
+    except Exception:
+        os.remove(newPath)
+        raise
+
+
+def readStatus(path):
+    "the status last written to path, or None if there is none"
+    try:
+        statusFile = open(path)
+    except IOError:
+        return None
+    try:
+        return json.load(statusFile)
+    finally:
+        statusFile.close()
+
+
+def isRunning(status):
+    "whether the indexing with this status is still going on"
+    if status is None or status['state'] != RUNNING:
+        return False
+    try:
+        os.kill(status['pid'], 0)
+    except OSError:
+        # it died without saying so
+        return False
+    return True
+
+
+class Indexer(object):
+    """
+    Writes the tags of ``fileList`` (see tags.process) to ``output`` with
+    ``handlerFactory``. progress, if given, is called with the status dict
+    every time it changes, from the indexing thread.
+    """
+    def __init__(self, fileList, output, excluded=[], handlerFactory=PickleOut, progress=None, statusFile=None):
+        self.fileList = fileList
+        self.output = output
+        self.excluded = excluded
+        self.handlerFactory = handlerFactory
+        self.progress = progress
+        self.statusFile = statusFile
+        self._cancelled = threading.Event()
+        self._thread = None
+        self._start = None
+        self._written = 0
+        self._status = {'state': RUNNING, 'done': 0, 'total': None, 'current': None,
+                        'output': os.path.abspath(output), 'error': None, 'elapsed': 0.0,
+                        'pid': os.getpid()}
+
+    def start(self):
+        "start indexing in the background, and return self"
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        "stop before the next file. The output is left as it was"
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        "wait for the indexing thread, return True if it has finished"
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def status(self):
+        return dict(self._status)
+
+    def run(self):
+        "index in this thread, return the final status"
+        self._start = time.time()
+        directory, filename = os.path.split(os.path.abspath(self.output))
+        newPath = os.path.join(directory, '.%s.indexing' % filename)
+        try:
+            self._update(force=True)
+            modules = process(self.fileList, self.excluded, progress=self._report)
+            self._check()
+            self.handlerFactory(newPath).write(modules)
+            self._check()
+            os.replace(newPath, self.output)
+            # the log was about the old tags
+            removeLog(self.output)
+            self._update(state=DONE, current=None, force=True)
+        except Cancelled:
+            self._update(state=CANCELLED, current=None, force=True)
+        except Exception as e:
+            self._update(state=FAILED, current=None, error='%s: %s' % (e.__class__.__name__, e), force=True)
+        finally:
+            if os.path.exists(newPath):
+                os.remove(newPath)
+        return self.status()
+
+    def _check(self):
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+    def _report(self, done, total, path):
+        self._check()
+        self._update(done=done, total=total, current=path)
+
+    def _update(self, force=False, **changes):
+        self._status.update(changes)
+        self._status['elapsed'] = round(time.time() - self._start, 3)
+        if self.progress is not None:
+            self.progress(self.status())
+        if self.statusFile and (force or time.time() - self._written >= STATUS_INTERVAL):
+            writeStatus(self.statusFile, self._status)
+            self._written = time.time()
+
+
+def indexMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell index',
+        description="Generate a PYSMELLTAGS file, reporting the progress, so that editors can run it in the background.")
+    parser.add_argument('fileList', metavar='package', nargs='+',
+        help="The packages to be analysed")
+    parser.add_argument('-x', '--exclude', metavar='package', nargs='*', default=[],
+        help="Don't analyse files in directories with these names")
+    parser.add_argument('-o', '--output', default='PYSMELLTAGS',
+        help="File to write the tags to")
+    parser.add_argument('-f', '--format', default=PICKLE, choices=sorted(CONVERT_FORMATS),
+        help="The format to write")
+    parser.add_argument('--status-file',
+        help="Keep the progress in this file, as JSON (see pysmell.indexer)")
+    parser.add_argument('--progress', action='store_true',
+        help="Print 'done/total file' for every file analysed")
+    args = parser.parse_args(argv)
+
+    def printProgress(status):
+        if status['state'] == RUNNING and status['current']:
+            print('%d/%d %s' % (status['done'], status['total'], status['current']))
+            sys.stdout.flush()
+
+    indexer = Indexer(args.fileList, args.output, args.exclude, CONVERT_FORMATS[args.format],
+                      args.progress and printProgress or None, args.status_file)
+    # editors cancel by terminating the process
+    signal.signal(signal.SIGTERM, lambda signum, frame: indexer.cancel())
+    indexer.start()
+    try:
+        while not indexer.wait(0.1):
+            pass
+    except KeyboardInterrupt:
+        indexer.cancel()
+        indexer.wait()
+    status = indexer.status()
+    print('%s: %s files, %ss%s' % (status['state'], status['done'], status['elapsed'],
+                                   status['error'] and ' (%s)' % status['error'] or ''))
+    if status['state'] != DONE:
+        sys.exit(1)
@@ -0,0 +1,358 @@
+# lsp.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+``pysmell-lsp``: a Language Server Protocol server on stdin/stdout, so that
+any editor with an LSP client gets PySmell completions.
+
+It handles initialize, shutdown, exit, textDocument/didOpen, didChange,
+didClose, textDocument/completion, completionItem/resolve and
+$/cancelRequest. The text of open documents is kept in memory and the tags
+stay loaded in a TagsCache (with their indexes) until they change on disk.
+Completion items carry the symbol they stand for, and their docstring is
+only looked up when the client resolves them (see idehelper.findDocstring).
+
+Messages are read on a separate thread and queued. A completion request
+is answered with RequestCancelled if a $/cancelRequest for it is queued,
+and with ContentModified if a change to its document or another completion
+request for it is queued behind it - the editor has moved on, so there is
+no point in computing it. Both are checked again between detecting the
+completion type and finding the completions.
+
+Columns are counted in characters, which is what LSP's UTF-16 offsets are
+outside the astral planes.
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import deque
+
+try:
+    from urllib.parse import urlparse, unquote
+except ImportError:
+    from urlparse import urlparse
+    from urllib import unquote
+
+from pysmell import idehelper
+from pysmell.docstore import symbolOf
+from pysmell.tagscache import TagsCache
+
+# error codes
+PARSE_ERROR = -32700
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_CANCELLED = -32800
+CONTENT_MODIFIED = -32801
+
+# TextDocumentSyncKind.Incremental
+SYNC_INCREMENTAL = 2
+
+# CompletionItemKind for the kinds of completion dicts
+ITEM_KINDS = {
+    'm': 2,  # Method
+    'f': 3,  # Function
+    't': 7,  # Class
+    'd': 21, # Constant
+}
+MODULE_KIND = 9
+PROPERTY_KIND = 10
+
+# answers beyond this many are marked incomplete, the client asks again as the user types
+MAXITEMS = 200
+
+
+def readMessage(stream):
+    "read one message from the binary ``stream``, or return None at the end of it"
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is None: continue
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip())
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+def writeMessage(stream, message):
+    body = json.dumps(message).encode('utf-8')
+    stream.write(('Content-Length: %d\r\n\r\n' % len(body)).encode('ascii'))
+    stream.write(body)
+    stream.flush()
+
+
+def uriToPath(uri):
+    parsed = urlparse(uri)
+    path = unquote(parsed.path)
+    if os.name == 'nt' and path.startswith('/'):
+        path = path[1:]
+    return os.path.normpath(path)
+
+
+def applyChange(text, change):
+    "apply a TextDocumentContentChangeEvent to text"
+    if 'range' not in change:
+        return change['text']
+    lines = text.split('\n')
+    def offset(position):
+        line = position['line']
+        if line >= len(lines):
+            return len(text)
+        return sum(len(before) + 1 for before in lines[:line]) + min(position['character'], len(lines[line]))
+    start, end = offset(change['range']['start']), offset(change['range']['end'])
+    return text[:start] + change['text'] + text[end:]
+
+
+class ResponseError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class LanguageServer(object):
+    """
+    Handles the messages given to receive, in order, when processPending is
+    called. serve runs it on a pair of streams.
+    """
+    def __init__(self, output, tagsCache=None):
+        self.output = output
+        self.documents = {}
+        self.tagsCache = tagsCache or TagsCache()
+        self.session = idehelper.CompletionSession()
+        # the tags the session's records come from
+        self.sessionDict = None
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.shutdown = False
+        self.exited = False
+        self._current = None
+        self.handlers = {
+            'initialize': self.initialize,
+            'initialized': lambda params: None,
+            'shutdown': self.doShutdown,
+            'exit': self.exit,
+            'textDocument/didOpen': self.didOpen,
+            'textDocument/didChange': self.didChange,
+            'textDocument/didClose': self.didClose,
+            'textDocument/completion': self.completion,
+            'completionItem/resolve': self.resolve,
+            '$/cancelRequest': lambda params: None,
+        }
+
+    def receive(self, message):
+        self.condition.acquire()
+        try:
+            self.pending.append(message)
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+    def _next(self, block):
+        self.condition.acquire()
+        try:
+            while block and not self.pending:
+                self.condition.wait()
+            if not self.pending:
+                return None
+            return self.pending.popleft()
+        finally:
+            self.condition.release()
+
+    def processPending(self):
+        "handle every message received so far"
+        message = self._next(False)
+        while message is not None and not self.exited:
+            self.handle(message)
+            message = self._next(False)
+
+    def serve(self, input):
+        "read messages from the binary input on a thread and handle them until exit"
+        def read():
+            while True:
+                try:
+                    message = readMessage(input)
+                except ValueError as e:
+                    self._respondError(None, PARSE_ERROR, str(e))
+                    continue
+                if message is None:
+                    self.receive({'method': 'exit'})
+                    return
+                self.receive(message)
+        reader = threading.Thread(target=read)
+        reader.daemon = True
+        reader.start()
+        while not self.exited:
+            self.handle(self._next(True))
+
+    def handle(self, message):
+        method = message.get('method')
+        isRequest = 'id' in message
+        if method is None:
+            return # a response, we don't send requests
+        handler = self.handlers.get(method)
+        if handler is None:
+            if isRequest:
+                self._respondError(message['id'], METHOD_NOT_FOUND, 'unknown method %s' % method)
+            return
+        self._current = message
+        try:
+            if isRequest:
+                self._checkSuperseded(message)
+            result = handler(message.get('params') or {})
+        except ResponseError as e:
+            if isRequest:
+                self._respondError(message['id'], e.code, str(e))
+            return
+        except Exception as e:
+            if isRequest:
+                self._respondError(message['id'], INTERNAL_ERROR, '%s: %s' % (e.__class__.__name__, e))
+            return
+        if isRequest:
+            writeMessage(self.output, {'jsonrpc': '2.0', 'id': message['id'], 'result': result})
+
+    def _respondError(self, requestId, code, text):
+        writeMessage(self.output, {'jsonrpc': '2.0', 'id': requestId, 'error': {'code': code, 'message': text}})
+
+    def _checkSuperseded(self, request):
+        "raise a ResponseError if a message queued after request makes it pointless"
+        uri = (request.get('params') or {}).get('textDocument', {}).get('uri')
+        self.condition.acquire()
+        try:
+            queued = list(self.pending)
+        finally:
+            self.condition.release()
+        for message in queued:
+            method = message.get('method')
+            params = message.get('params') or {}
+            if method == '$/cancelRequest' and params.get('id') == request['id']:
+                raise ResponseError(REQUEST_CANCELLED, 'cancelled')
+            if (request.get('method') == 'textDocument/completion' and uri is not None
+                    and method in ('textDocument/didChange', 'textDocument/didClose', 'textDocument/completion')
+                    and params.get('textDocument', {}).get('uri') == uri):
+                raise ResponseError(CONTENT_MODIFIED, 'superseded by a later %s' % method)
+
+    def initialize(self, params):
+        return {
+            'capabilities': {
+                'textDocumentSync': {'openClose': True, 'change': SYNC_INCREMENTAL},
+                'completionProvider': {'triggerCharacters': ['.', ' ', '('], 'resolveProvider': True},
+            },
+            'serverInfo': {'name': 'pysmell', 'version': __import__('pysmell').__version__},
+        }
+
+    def doShutdown(self, params):
+        self.shutdown = True
+        return None
+
+    def exit(self, params):
+        self.exited = True
+
+    def didOpen(self, params):
+        document = params['textDocument']
+        self.documents[document['uri']] = document['text']
+
+    def didChange(self, params):
+        uri = params['textDocument']['uri']
+        text = self.documents.get(uri, '')
+        for change in params['contentChanges']:
+            text = applyChange(text, change)
+        self.documents[uri] = text
+
+    def didClose(self, params):
+        self.documents.pop(params['textDocument']['uri'], None)
+
+    def completion(self, params):
+        uri = params['textDocument']['uri']
+        if uri not in self.documents:
+            raise ResponseError(INVALID_PARAMS, '%s is not open' % uri)
+        path = uriToPath(uri)
+        source = self.documents[uri]
+        lineNo = params['position']['line'] + 1
+        lines = source.splitlines() or ['']
+        if lineNo > len(lines):
+            return {'isIncomplete': False, 'items': []}
+        line = lines[lineNo - 1]
+        col = min(params['position']['character'], len(line))
+        base = line[idehelper.findBase(line, col):col]
+
+        PYSMELLDICT = self.tagsCache.get(path)
+        if PYSMELLDICT is None:
+            return {'isIncomplete': False, 'items': []}
+        if PYSMELLDICT is not self.sessionDict:
+            # the tags were regenerated, or are another project's
+            self.session.clear()
+            self.sessionDict = PYSMELLDICT
+        records = self.session.lookup(path, source, lineNo, col, base)
+        options = self.session.options
+        if records is None:
+            options = idehelper.detectCompletionType(path, source, lineNo, col, base, PYSMELLDICT)
+            self._checkSuperseded(self._current)
+            records = idehelper.findCompletionRecords(base, PYSMELLDICT, options)
+            self.session.store(path, source, lineNo, col, base, None, options, records)
+        completions = idehelper.toCompletionDicts(records[:MAXITEMS], options)
+        items = [toCompletionItem(completion, index, uri) for (index, completion) in enumerate(completions)]
+        return {'isIncomplete': len(records) > MAXITEMS, 'items': items}
+
+    def resolve(self, item):
+        "the completion item with the docstring of its symbol, if it has one"
+        data = item.get('data') or {}
+        if 'uri' not in data or 'symbol' not in data:
+            return item
+        path = uriToPath(data['uri'])
+        docstring = idehelper.findDocstring(path, data['symbol'], self.tagsCache.get(path))
+        if docstring:
+            item = dict(item, documentation=docstring)
+        return item
+
+
+def toCompletionItem(completion, index, uri=None):
+    """
+    a CompletionItem for a completion dict, sorted where PySmell put it. With
+    the uri of the document, it can be resolved (see LanguageServer.resolve)
+    """
+    kind = ITEM_KINDS.get(completion['kind'])
+    if completion['kind'] == 't' and 'abbr' not in completion:
+        kind = MODULE_KIND
+    elif completion['kind'] == 'm' and 'abbr' not in completion:
+        kind = PROPERTY_KIND
+    item = {
+        'label': completion.get('abbr', completion['word']),
+        'insertText': completion['word'],
+        'filterText': completion['word'],
+        'sortText': '%06d' % index,
+    }
+    if kind is not None:
+        item['kind'] = kind
+    if completion.get('menu'):
+        item['detail'] = completion['menu']
+    if uri is not None:
+        item['data'] = {'uri': uri, 'symbol': symbolOf(completion)}
+    return item
+
+
+def main():
+    input = getattr(sys.stdin, 'buffer', sys.stdin)
+    output = getattr(sys.stdout, 'buffer', sys.stdout)
+    server = LanguageServer(output)
+    server.serve(input)
+    sys.exit(0 if server.shutdown else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,8 @@
 # Copyright (C) 2008 Orestis Markou
 # All rights reserved
 
+import os
+
 version = __import__('pysmell').__version__
 
 class FileOut():
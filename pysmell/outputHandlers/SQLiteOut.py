@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# pysmell.py
+# Statically analyze python code and generate PYSMELLTAGS file
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+
+import os
+
+from pysmell.tagdb import writeTagDB
+
+version = __import__('pysmell').__version__
+
+class SQLiteOut():
+    def __init__(self, filePath):
+        self.filePath = os.path.abspath(filePath)
+
+    def write(self, modules):
+        writeTagDB(self.filePath, modules)
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# pysmell.py
+# Statically analyze python code and generate PYSMELLTAGS file
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+
+import os
+
+from pysmell.sections import writeSections
+
+version = __import__('pysmell').__version__
+
+class SectionedOut():
+    def __init__(self, filePath):
+        self.filePath = os.path.abspath(filePath)
+
+    def write(self, modules):
+        writeSections(self.filePath, modules)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# pysmell.py
+# Statically analyze python code and generate PYSMELLTAGS file
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+
+import os
+
+from pysmell.bloom import filterFor, shardKeys
+from pysmell.codefinder import ModuleDict
+from pysmell.shards import splitByPackage, MANIFEST_SUFFIX
+from pysmell.outputHandlers.PickleOut import PickleOut
+
+version = __import__('pysmell').__version__
+
+class ShardedOut():
+    """
+    Write one tags file per top level package next to filePath, and a
+    manifest listing them with their bloom filters. handlerFactory(path)
+    returns the handler that writes a single tags file. The manifest isn't
+    tags, so it is always pickled.
+    """
+    def __init__(self, filePath, handlerFactory):
+        self.filePath = os.path.abspath(filePath)
+        self.handlerFactory = handlerFactory
+
+    def write(self, modules):
+        manifest = {}
+        for package, shard in splitByPackage(modules).items():
+            shardPath = '%s.%s' % (self.filePath, package)
+            self.handlerFactory(shardPath).write(shard)
+            manifest[package] = (os.path.basename(shardPath), filterFor(shardKeys(shard)).toTuple())
+        PickleOut(self.filePath + MANIFEST_SUFFIX).write(manifest)
+        # an empty tags file still marks where the shards are
+        self.handlerFactory(self.filePath).write(ModuleDict())
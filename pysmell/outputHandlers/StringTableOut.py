@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# pysmell.py
+# Statically analyze python code and generate PYSMELLTAGS file
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+
+import pickle as pickle
+import os
+
+from pysmell.stringtable import encode
+
+version = __import__('pysmell').__version__
+
+class StringTableOut():
+    def __init__(self, filePath):
+        self.filePath = os.path.abspath(filePath)
+
+    def write(self, modules):
+        f = open(self.filePath, 'wb')
+        pickle.dump(encode(modules), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
@@ -0,0 +1,158 @@
+# sections.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+A tags format (``pysmell --sections``) where each of the five sections can
+be read on its own:
+
+    SECTIONS_MAGIC
+    the length of the table of contents, 8 bytes big endian
+    the pickled table of contents, {section: (offset, length)}
+    the pickled sections, at offset (from the end of the table of contents)
+
+findPYSMELLDICT returns a SectionedTags for these files, which reads a
+section the first time it is used, so that an INSTANCE completion never
+reads CONSTANTS or FUNCTIONS.
+"""
+
+import pickle
+import struct
+import threading
+
+from pysmell.tagslog import readLog, applyLog
+
+SECTIONS_MAGIC = b'PYSMELLSECTIONS1\n'
+SECTIONS = ('CLASSES', 'FUNCTIONS', 'CONSTANTS', 'POINTERS', 'HIERARCHY')
+_LENGTH = struct.Struct('>Q')
+
+
+def writeSections(path, modules):
+    blobs = []
+    contents = {}
+    offset = 0
+    for section in SECTIONS:
+        blob = pickle.dumps(modules[section], protocol=pickle.HIGHEST_PROTOCOL)
+        contents[section] = (offset, len(blob))
+        offset += len(blob)
+        blobs.append(blob)
+    contentsBlob = pickle.dumps(contents, protocol=pickle.HIGHEST_PROTOCOL)
+    tagsFile = open(path, 'wb')
+    try:
+        tagsFile.write(SECTIONS_MAGIC)
+        tagsFile.write(_LENGTH.pack(len(contentsBlob)))
+        tagsFile.write(contentsBlob)
+        for blob in blobs:
+            tagsFile.write(blob)
+    finally:
+        tagsFile.close()
+
+
+def isSectioned(path):
+    try:
+        tagsFile = open(path, 'rb')
+    except IOError:
+        return False
+    try:
+        return tagsFile.read(len(SECTIONS_MAGIC)) == SECTIONS_MAGIC
+    finally:
+        tagsFile.close()
+
+
+def readSections(path, sections=SECTIONS):
+    "read ``sections`` of a sectioned tags file, without its log, as a dict"
+    tagsFile = open(path, 'rb')
+    try:
+        tagsFile.seek(len(SECTIONS_MAGIC))
+        contentsLength = _LENGTH.unpack(tagsFile.read(_LENGTH.size))[0]
+        contents = pickle.loads(tagsFile.read(contentsLength))
+        start = tagsFile.tell()
+        found = {}
+        # in file order, so the reads only go forward
+        for section in sorted(sections, key=lambda section: contents[section][0]):
+            offset, length = contents[section]
+            tagsFile.seek(start + offset)
+            found[section] = pickle.loads(tagsFile.read(length))
+        return found
+    finally:
+        tagsFile.close()
+
+
+class SectionedTags(object):
+    """
+    A PYSMELLDICT made of sectioned tags files and of ``extra``, a
+    PYSMELLDICT that is already loaded. A section is read from every file
+    (and their logs applied to it) the first time it is used.
+    """
+    def __init__(self, paths, extra=None):
+        self.paths = paths
+        self.extra = extra or {}
+        self._sections = {}
+        self._logs = {}
+        # held while completing, sections are read as they are used (see idehelper.storeLock)
+        self.lock = threading.RLock()
+
+    def loadSections(self, sections):
+        "read the ``sections`` that haven't been read yet"
+        missing = [section for section in sections if section not in self._sections]
+        if not missing:
+            return
+        merged = dict((section, {}) for section in missing if section in ('CLASSES', 'POINTERS'))
+        merged.update((section, []) for section in missing if section not in ('CLASSES', 'POINTERS'))
+        for path in self.paths:
+            found = readSections(path, missing)
+            if path not in self._logs:
+                self._logs[path] = readLog(path)
+            records = self._logs[path]
+            if records:
+                applyLog(found, records)
+            _merge(merged, found)
+        _merge(merged, dict((section, self.extra[section]) for section in missing if section in self.extra))
+        self._sections.update(merged)
+
+    def loadedSections(self):
+        return [section for section in SECTIONS if section in self._sections]
+
+    def __getitem__(self, section):
+        if section not in SECTIONS:
+            raise KeyError(section)
+        self.loadSections([section])
+        return self._sections[section]
+
+    def setdefault(self, section, default=None):
+        return self[section]
+
+    def get(self, section, default=None):
+        if section not in SECTIONS:
+            return default
+        return self[section]
+
+    def __contains__(self, section):
+        return section in SECTIONS
+
+    def keys(self):
+        return list(SECTIONS)
+
+    def items(self):
+        return [(section, self[section]) for section in SECTIONS]
+
+
+def requireSections(PYSMELLDICT, sections):
+    "read ``sections`` of PYSMELLDICT now if it is a SectionedTags, in that order"
+    loadSections = getattr(PYSMELLDICT, 'loadSections', None)
+    if loadSections is not None:
+        for section in sections:
+            loadSections([section])
+
+
+def _merge(master, partial):
+    for key, value in partial.items():
+        if isinstance(value, dict):
+            master[key].update(value)
+        else:
+            master[key].extend(value)
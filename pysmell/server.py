@@ -0,0 +1,291 @@
+# server.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+``pysmell serve``: one process answering completions for many editors, so
+that they share the loaded tags and their indexes instead of each keeping
+its own copy.
+
+Clients connect over a unix socket (defaultSocket(), or --socket), or a
+single client talks to it over stdin and stdout (--stdio, as the vim plugin
+does), and send one JSON request per line:
+
+    {"id": 1, "path": "/project/module.py", "source": "...", "line": 10,
+     "column": 8, "matcher": null, "limit": 100, "deadline": 0.5}
+
+line is 1-based and column 0-based, like detectCompletionType takes them.
+matcher, limit and deadline (in seconds, DEADLINE by default) can be left
+out.
+
+Reading tags unpickles and evaluates them, so whoever can send a path can
+run code as the user of the server. The socket is only open to that user,
+in a directory only they can enter. Listening on TCP instead lets any local
+user connect, so it has to be asked for (--tcp), and then every request
+must carry "token", the secret kept in --token-file. The answer is one JSON line with the same id and either
+"completions", a list of completion dicts, and "start", the column the
+completed word starts at, or "error". Requests sent on one
+connection without waiting can be answered out of order.
+
+Loading tags and completing run on a pool of worker threads, so that the
+event loop keeps reading and answering other clients meanwhile. Requests
+on the same tags run at the same time too: each one shows its source on
+top of the shared tags in an index of its own. Only tags read as they are
+used (shards, sectioned and SQLite tags) make their requests take turns
+(see idehelper.storeLock). A request that misses its deadline is answered
+with an error; if it had already started, its worker still finishes it.
+
+On startup the tags of the projects used last are loaded in the
+background, and when stopped (SIGTERM or ^C) the indexes are saved, so
+that the first completions after a restart don't have to build them (see
+indexcache, --cache-dir and --no-cache). With --stdio every editor starts
+its own server, so this is only done when --cache-dir is given.
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+import stat
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from pysmell import argparse
+from pysmell import idehelper
+from pysmell.indexcache import defaultDirectory
+from pysmell.tagscache import TagsCache
+
+DEADLINE = 2.0
+WORKERS = 4
+# requests carry the whole buffer
+MAXREQUEST = 64 * 1024 * 1024
+
+
+def runtimeDirectory():
+    "where the socket and the token of the user's server are kept"
+    return os.path.join(tempfile.gettempdir(), 'pysmell-%s' % getattr(os, 'getuid', lambda: 'user')())
+
+
+def defaultSocket():
+    return os.path.join(runtimeDirectory(), 'serve.sock')
+
+
+def defaultTokenFile():
+    return os.path.join(runtimeDirectory(), 'token')
+
+
+def _checkPrivate(path, kind):
+    info = os.lstat(path)
+    if not kind(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError("%s isn't private to this user" % path)
+
+
+def makePrivate(directory):
+    "create directory for this user alone, or check that only they can use it"
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    _checkPrivate(directory, stat.S_ISDIR)
+
+
+def readToken(path):
+    "the token in the file at path"
+    _checkPrivate(path, stat.S_ISREG)
+    tokenFile = open(path)
+    try:
+        return tokenFile.read().strip()
+    finally:
+        tokenFile.close()
+
+
+def createToken(path):
+    "the token in the file at path, which is created with a new random token if needed"
+    try:
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return readToken(path)
+    token = secrets.token_hex(16)
+    tokenFile = os.fdopen(descriptor, 'w')
+    try:
+        tokenFile.write(token + '\n')
+    finally:
+        tokenFile.close()
+    return token
+
+
+def startOf(request):
+    "the column the word completed by request starts at"
+    lines = request['source'].splitlines()
+    if not 0 < request['line'] <= len(lines):
+        return request['column']
+    return idehelper.findBase(lines[request['line'] - 1], request['column'])
+
+
+class CompletionServer(object):
+    def __init__(self, tagsCache=None, workers=WORKERS, deadline=DEADLINE, token=None):
+        self.tagsCache = tagsCache or TagsCache()
+        self.executor = ThreadPoolExecutor(workers)
+        self.deadline = deadline
+        # requests must carry it, if given
+        self.token = token
+
+    def complete(self, request):
+        "the completion dicts for request (see the module docstring). Runs on a worker thread"
+        path, source = request['path'], request['source']
+        lineNo, col = request['line'], request['column']
+        lines = source.splitlines()
+        if not 0 < lineNo <= len(lines):
+            return []
+        line = lines[lineNo - 1]
+        base = line[idehelper.findBase(line, col):col]
+        PYSMELLDICT = self.tagsCache.get(path)
+        if PYSMELLDICT is None:
+            return []
+        options = idehelper.detectCompletionType(path, source, lineNo, col, base, PYSMELLDICT)
+        records = idehelper.findCompletionRecords(base, PYSMELLDICT, options, request.get('matcher'))
+        return idehelper.toCompletionDicts(records[:request.get('limit')], options)
+
+    async def answer(self, request):
+        "the response to request, within its deadline"
+        if self.token is not None and not hmac.compare_digest(
+                str(request.get('token')).encode('utf-8'), self.token.encode('utf-8')):
+            return {'id': request.get('id'), 'error': 'invalid token'}
+        loop = asyncio.get_event_loop()
+        deadline = request.get('deadline') or self.deadline
+        try:
+            completions = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, self.complete, request), deadline)
+        except asyncio.TimeoutError:
+            return {'id': request.get('id'), 'error': 'deadline of %ss exceeded' % deadline}
+        except Exception as e:
+            return {'id': request.get('id'), 'error': '%s: %s' % (e.__class__.__name__, e)}
+        return {'id': request.get('id'), 'completions': completions, 'start': startOf(request)}
+
+    async def _respond(self, request, writer):
+        response = await self.answer(request)
+        writer.write((json.dumps(response) + '\n').encode('utf-8'))
+        await writer.drain()
+
+    async def handleClient(self, reader, writer):
+        "answer the requests of one connection until it is closed"
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except ValueError as e:
+                    writer.write((json.dumps({'id': None, 'error': 'invalid request: %s' % e}) + '\n').encode('utf-8'))
+                    continue
+                task = asyncio.ensure_future(self._respond(request, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0, socketPath=None):
+        "start listening and return the asyncio server"
+        if socketPath:
+            server = await asyncio.start_unix_server(self.handleClient, path=socketPath, limit=MAXREQUEST)
+            os.chmod(socketPath, 0o600)
+            return server
+        return await asyncio.start_server(self.handleClient, host, port, limit=MAXREQUEST)
+
+    async def serveStdio(self, input=None, output=None):
+        "answer the requests read from input (stdin) on output (stdout), until input is closed"
+        loop = asyncio.get_event_loop()
+        reader = asyncio.StreamReader(limit=MAXREQUEST)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), input or sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, output or sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.handleClient(reader, writer)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def serveMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell serve',
+        description="Answer completions for many editors from one process (see pysmell.server).")
+    parser.add_argument('--socket',
+        help="The unix socket to listen on (%s by default)" % defaultSocket())
+    parser.add_argument('--tcp', action='store_true',
+        help="Listen on TCP instead, open to every local user: requests must carry the token of --token-file")
+    parser.add_argument('--host', default='127.0.0.1',
+        help="The address to listen on, with --tcp")
+    parser.add_argument('-p', '--port', type=int, default=8765,
+        help="The TCP port to listen on, with --tcp")
+    parser.add_argument('--token-file',
+        help="The file keeping the token TCP clients must send, created if needed (%s by default)"
+             % defaultTokenFile())
+    parser.add_argument('--stdio', action='store_true',
+        help="Answer the requests read from stdin on stdout, instead of listening")
+    parser.add_argument('--cache-dir',
+        help="Where the indexes are kept between runs, and the projects to load on startup "
+             "(~/.pysmell, or none with --stdio)")
+    parser.add_argument('--no-cache', action='store_true',
+        help="Build every index from the tags, and don't keep them when stopping")
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+        help="How many threads load tags and complete")
+    parser.add_argument('--deadline', type=float, default=DEADLINE,
+        help="Seconds a request may take when it doesn't give its own deadline")
+    args = parser.parse_args(argv)
+
+    if len([chosen for chosen in (args.socket, args.tcp, args.stdio) if chosen]) > 1:
+        parser.error("only one of --socket, --tcp and --stdio can be given")
+    socketPath = token = None
+    if args.tcp:
+        if not args.token_file:
+            makePrivate(runtimeDirectory())
+        token = createToken(args.token_file or defaultTokenFile())
+    elif not args.stdio:
+        socketPath = args.socket
+        if not socketPath:
+            makePrivate(runtimeDirectory())
+            socketPath = defaultSocket()
+    cacheDirectory = args.cache_dir
+    if cacheDirectory is None and not args.stdio:
+        cacheDirectory = defaultDirectory()
+
+    async def run():
+        tagsCache = TagsCache(None if args.no_cache else cacheDirectory)
+        completionServer = CompletionServer(tagsCache, workers=args.workers, deadline=args.deadline, token=token)
+        loop = asyncio.get_event_loop()
+        # answering doesn't wait for this, requests for tags being loaded do
+        prewarming = loop.run_in_executor(completionServer.executor, tagsCache.prewarm)
+        try:
+            if args.stdio:
+                await completionServer.serveStdio()
+            else:
+                server = await completionServer.start(args.host, args.port, socketPath)
+                stopped = asyncio.Event()
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    loop.add_signal_handler(signum, stopped.set)
+                try:
+                    await stopped.wait()
+                finally:
+                    server.close()
+                    await server.wait_closed()
+        finally:
+            await prewarming
+            # the next start reads the indexes instead of building them
+            tagsCache.save()
+            completionServer.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,135 @@
+# shards.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Tags can be split into one shard per top level package (``pysmell
+--shard-by package``). Writing PYSMELLTAGS that way produces
+
+    PYSMELLTAGS             an empty tags file, so PYSMELLTAGS is still found
+    PYSMELLTAGS.manifest    {package: (shard file name, bloom filter)}
+    PYSMELLTAGS.<package>   the tags of every module in <package>
+
+and findPYSMELLDICT only loads the shards a completion actually needs. The
+bloom filter (see bloom.py) tells which names a shard may contain, so that
+looking for a name doesn't load every shard. Manifests written before the
+filters were added map packages to file names only.
+"""
+
+import os
+import threading
+
+from pysmell.bloom import fromTuple
+from pysmell.codefinder import ModuleDict
+from pysmell.tagsfile import readTags
+
+MANIFEST_SUFFIX = '.manifest'
+
+
+def packageOf(name):
+    "the top level package of a dotted name"
+    return name.split('.', 1)[0]
+
+
+def splitByPackage(modules):
+    "return a ModuleDict for every top level package in ``modules``"
+    shards = {}
+    def shardFor(name):
+        package = packageOf(name)
+        if package not in shards:
+            shards[package] = ModuleDict()
+        return shards[package]
+
+    for module in modules['HIERARCHY']:
+        shardFor(module)['HIERARCHY'].append(module)
+    for const in modules['CONSTANTS']:
+        shardFor(const)['CONSTANTS'].append(const)
+    for func in modules['FUNCTIONS']:
+        shardFor(func[0])['FUNCTIONS'].append(func)
+    for klass, klassDict in modules['CLASSES'].items():
+        shardFor(klass)['CLASSES'][klass] = klassDict
+    for pointer, target in modules['POINTERS'].items():
+        shardFor(pointer)['POINTERS'][pointer] = target
+    return shards
+
+
+def isManifest(filename):
+    return filename.endswith(MANIFEST_SUFFIX)
+
+
+class ShardSet(object):
+    """
+    The shards a PYSMELLDICT was found with, and which of them have been
+    loaded into it so far.
+    """
+    def __init__(self):
+        self.shards = {}
+        self.filters = {}
+        self.loaded = set()
+        # held while completing with the tags the shards are loaded into
+        # (see idehelper.storeLock)
+        self.lock = threading.RLock()
+
+    def addManifest(self, directory, manifestFile):
+        "register the shards listed in a manifest and return their file names"
+        manifest = readTags(os.path.join(directory, manifestFile))
+        filenames = []
+        for package, entry in manifest.items():
+            if isinstance(entry, tuple):
+                filename, filterTuple = entry
+            else:
+                filename, filterTuple = entry, None
+            path = os.path.join(directory, filename)
+            self.shards.setdefault(package, []).append(path)
+            self.filters[path] = filterTuple and fromTuple(filterTuple)
+            filenames.append(filename)
+        return filenames
+
+    def packages(self):
+        return list(self.shards.keys())
+
+    def mayContain(self, package, key):
+        "False if no shard of package has key (see bloom.py), True if one might"
+        for path in self.shards.get(package, []):
+            bloom = self.filters.get(path)
+            if bloom is None or key in bloom:
+                return True
+        return False
+
+    def packagesWith(self, key):
+        "the packages that may have key"
+        return [package for package in self.shards if self.mayContain(package, key)]
+
+    def isLoaded(self, package):
+        return package in self.loaded or package not in self.shards
+
+    def load(self, packages):
+        "read the shards of ``packages`` that haven't been loaded yet, and return them"
+        loaded = []
+        for package in packages:
+            if self.isLoaded(package):
+                continue
+            self.loaded.add(package)
+            for path in self.shards[package]:
+                if os.path.exists(path):
+                    loaded.append(readTags(path))
+        return loaded
+
+
+def registerShardSet(PYSMELLDICT, shardSet):
+    """
+    Make PYSMELLDICT load its shards from shardSet. The shard set is kept
+    with the tags, which have to take attributes (an index.TagsDict, or a
+    store like sections.SectionedTags), for as long as they are used.
+    """
+    PYSMELLDICT.shardSet = shardSet
+
+
+def getShardSet(PYSMELLDICT):
+    "the ShardSet PYSMELLDICT still loads shards from, or None if it isn't sharded"
+    return getattr(PYSMELLDICT, 'shardSet', None)
@@ -0,0 +1,125 @@
+# snapshot.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Versions of the tags that are never changed once they are published, so
+that completions can run from any thread while the project is re-indexed.
+
+A SnapshotStore holds the current Snapshot. A completion takes
+store.current() and uses its PYSMELLDICT until it is done, without locking.
+Re-indexing (store.update or store.reindex) builds the next version aside -
+it shares the tags of every module that didn't change, and its index starts
+from what the previous index worked out for them - and publishes it with a
+single assignment. Re-indexes take turns; completions never wait for them,
+nor for each other: each shows its edited buffer on top of the snapshot in
+an index of its own (see idehelper.detectCompletionType).
+"""
+
+import threading
+
+from pysmell.index import TagsDict, deriveIndex, getIndex
+from pysmell.tagslog import splitByModule
+
+
+def _merge(partials):
+    "one PYSMELLDICT with the tags of every module -> PYSMELLDICT in partials"
+    merged = TagsDict(CONSTANTS=[], FUNCTIONS=[], CLASSES={}, POINTERS={}, HIERARCHY=[])
+    for module in sorted(partials):
+        for key, value in partials[module].items():
+            if isinstance(value, dict):
+                merged[key].update(value)
+            else:
+                merged[key].extend(value)
+    return merged
+
+
+class Snapshot(object):
+    """
+    The tags of a project at one version. ``modules`` maps every module to
+    its own PYSMELLDICT, and PYSMELLDICT holds them all. Neither may be
+    modified; replace makes the next version instead. Given PYSMELLDICT,
+    the modules are only split out of it when they are first needed.
+
+    PYSMELLDICT is a TagsDict (a plain dict is copied into one), so the
+    index of a snapshot lives as long as the snapshot.
+    """
+    def __init__(self, modules, version=0, PYSMELLDICT=None):
+        self._modules = modules
+        self.version = version
+        if PYSMELLDICT is None:
+            PYSMELLDICT = _merge(modules)
+        elif type(PYSMELLDICT) is dict:
+            PYSMELLDICT = TagsDict(PYSMELLDICT)
+        self.PYSMELLDICT = PYSMELLDICT
+
+    @property
+    def modules(self):
+        if self._modules is None:
+            self._modules = splitByModule(self.PYSMELLDICT)
+        return self._modules
+
+    def replace(self, partials, deleted=()):
+        "the next version, with the module -> PYSMELLDICT in partials and without the deleted modules"
+        modules = dict(self.modules)
+        for module in deleted:
+            modules.pop(module, None)
+        modules.update(partials)
+        return Snapshot(modules, self.version + 1)
+
+
+class SnapshotStore(object):
+    """
+    Publishes the versions of the tags of a project. PYSMELLDICT, if given,
+    is the first version, kept as it is if it's a TagsDict so that an index
+    already built for it is kept too.
+    """
+    def __init__(self, PYSMELLDICT=None):
+        self._lock = threading.Lock()
+        if PYSMELLDICT:
+            self._current = Snapshot(None, 0, PYSMELLDICT)
+        else:
+            self._current = Snapshot({})
+
+    def current(self):
+        "the latest Snapshot. It stays valid however many updates follow"
+        return self._current
+
+    def update(self, modules, deleted=(), precompute=True):
+        """
+        Publish a new version with ``modules``, the ModuleDict of the
+        re-analysed modules, replacing their tags, and without the
+        ``deleted`` modules. The new index is built before it is published,
+        unless precompute is False. Returns the new Snapshot.
+        """
+        return self.replace(splitByModule(modules), deleted, precompute)
+
+    def replace(self, partials, deleted=(), precompute=True):
+        "like update, with the module -> PYSMELLDICT in partials (see tagslog.splitByModule)"
+        self._lock.acquire()
+        try:
+            previous = self._current
+            snapshot = previous.replace(partials, deleted)
+            index = deriveIndex(snapshot.PYSMELLDICT, previous.PYSMELLDICT, set(partials) | set(deleted))
+            if precompute:
+                index.precompute()
+            self._current = snapshot
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def reindex(self, fileList, excluded=[], precompute=True):
+        "analyse the files in fileList again and publish the result (see tags.processChanges)"
+        # tags imports the server, whose TagsCache keeps its tags in SnapshotStores
+        from pysmell.tags import processChanges
+        modules, deleted = processChanges(fileList, excluded)
+        return self.update(modules, deleted, precompute)
+
+    def precompute(self):
+        "build the index of the current version"
+        getIndex(self._current.PYSMELLDICT).precompute()
@@ -0,0 +1,142 @@
+# stringtable.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+A tags encoding (``pysmell --string-table``) that stores every distinct
+string, and every distinct argument list, once. Dotted names are split into
+their module and their last part, and everything refers to the tables by
+position. Records are flattened into runs of integers:
+
+    {'STRINGS': [string, ...],
+     'ARGS': [[string, ...], ...],
+     'CONSTANTS': [module, name, ...],
+     'FUNCTIONS': [module, name, args, docstring, ...],
+     'CLASSES': [(module, name, constructor args, [module, name, ...] bases,
+                  [property, ...], [name, args, docstring, ...] methods, docstring), ...],
+     'POINTERS': [module, name, targetModule, targetName, ...],
+     'HIERARCHY': [module, ...]}
+
+Decoding interns the strings and shares the argument lists, so the loaded
+PYSMELLDICT holds one copy of each. Don't modify them in place.
+"""
+
+from sys import intern
+
+STRINGS = 'STRINGS'
+
+
+class StringTable(object):
+    "assigns consecutive positions to distinct values"
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __call__(self, value):
+        "the position of value in the table"
+        valueId = self.ids.get(value)
+        if valueId is None:
+            valueId = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return valueId
+
+    def dotted(self, name):
+        "the positions of the module and the last part of a dotted name"
+        if '.' in name:
+            module, last = name.rsplit('.', 1)
+        else:
+            module, last = '', name
+        return self(module), self(last)
+
+
+def encode(modules):
+    "return the string table encoding of a PYSMELLDICT"
+    table = StringTable()
+    argsTable = StringTable()
+    def strings(values):
+        return [table(value) for value in values]
+    def args(values):
+        return argsTable(tuple(strings(values)))
+    def docstring(doc):
+        return table(doc or '')
+
+    constants = []
+    for const in modules['CONSTANTS']:
+        constants.extend(table.dotted(const))
+    functions = []
+    for func in modules['FUNCTIONS']:
+        functions.extend(table.dotted(func[0]) + (args(func[1]), docstring(func[2])))
+    classes = []
+    for klass, klassDict in modules['CLASSES'].items():
+        bases = []
+        for base in klassDict['bases']:
+            bases.extend(table.dotted(base))
+        methods = []
+        for method in klassDict['methods']:
+            methods.extend((table(method[0]), args(method[1]), docstring(method[2])))
+        classes.append(table.dotted(klass) + (args(klassDict['constructor']), bases,
+            strings(klassDict['properties']), methods, docstring(klassDict.get('docstring'))))
+    pointers = []
+    for pointer, target in modules['POINTERS'].items():
+        pointers.extend(table.dotted(pointer) + table.dotted(target))
+    return {
+        STRINGS: table.values,
+        'ARGS': [list(argIds) for argIds in argsTable.values],
+        'CONSTANTS': constants,
+        'FUNCTIONS': functions,
+        'CLASSES': classes,
+        'POINTERS': pointers,
+        'HIERARCHY': strings(modules['HIERARCHY']),
+    }
+
+
+def isEncoded(data):
+    return isinstance(data, dict) and STRINGS in data
+
+
+def decode(data):
+    "return the PYSMELLDICT a string table encoding was made from"
+    strings = list(map(intern, data[STRINGS]))
+    string = strings.__getitem__
+    argLists = [list(map(string, argIds)) for argIds in data['ARGS']]
+    argList = argLists.__getitem__
+    joined = {}
+    def dotted(module, last):
+        key = (module, last)
+        name = joined.get(key)
+        if name is None:
+            if strings[module]:
+                name = intern('%s.%s' % (strings[module], strings[last]))
+            else:
+                name = strings[last]
+            joined[key] = name
+        return name
+    def dottedRun(ids):
+        return list(map(dotted, ids[0::2], ids[1::2]))
+
+    functionIds = data['FUNCTIONS']
+    functions = list(zip(map(dotted, functionIds[0::4], functionIds[1::4]),
+                         map(argList, functionIds[2::4]), map(string, functionIds[3::4])))
+    classes = {}
+    for (module, name, constructor, bases, properties, methods, doc) in data['CLASSES']:
+        classes[dotted(module, name)] = {
+            'constructor': argLists[constructor],
+            'bases': dottedRun(bases),
+            'properties': list(map(string, properties)),
+            'methods': list(zip(map(string, methods[0::3]), map(argList, methods[1::3]), map(string, methods[2::3]))),
+            'docstring': strings[doc],
+        }
+    pointerIds = data['POINTERS']
+    return {
+        'CONSTANTS': dottedRun(data['CONSTANTS']),
+        'FUNCTIONS': functions,
+        'CLASSES': classes,
+        'POINTERS': dict(zip(map(dotted, pointerIds[0::4], pointerIds[1::4]),
+                             map(dotted, pointerIds[2::4], pointerIds[3::4]))),
+        'HIERARCHY': list(map(string, data['HIERARCHY'])),
+    }
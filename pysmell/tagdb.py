@@ -0,0 +1,351 @@
+# tagdb.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+Tags stored in an SQLite database (``pysmell --sqlite``), so that completions
+query what they need instead of loading every tag into memory.
+
+A TagDB stands in for a PYSMELLDICT: CLASSES and POINTERS look up single
+rows, while CONSTANTS, FUNCTIONS and HIERARCHY are read completely the first
+time somebody asks for them. The TagDBIndex getIndex returns for it answers
+the completion paths with indexed queries.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from sys import intern
+
+from pysmell.index import CompletionIndex, Completion, ModuleNode, sortRecords, _getCompForFunction
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+SCHEMA = """
+CREATE TABLE modules (name TEXT PRIMARY KEY, parent TEXT, part TEXT);
+CREATE INDEX modules_parent ON modules (parent);
+
+CREATE TABLE constants (module TEXT, name TEXT);
+CREATE INDEX constants_module ON constants (module);
+CREATE INDEX constants_name ON constants (name);
+CREATE INDEX constants_name_nocase ON constants (name COLLATE NOCASE);
+
+CREATE TABLE functions (module TEXT, name TEXT, args TEXT, docstring TEXT);
+CREATE INDEX functions_module ON functions (module);
+CREATE INDEX functions_name ON functions (name);
+CREATE INDEX functions_name_nocase ON functions (name COLLATE NOCASE);
+
+CREATE TABLE classes (id INTEGER PRIMARY KEY, fullName TEXT UNIQUE, module TEXT, name TEXT,
+                      constructor TEXT, bases TEXT, docstring TEXT);
+CREATE INDEX classes_module ON classes (module);
+CREATE INDEX classes_name ON classes (name);
+CREATE INDEX classes_name_nocase ON classes (name COLLATE NOCASE);
+
+CREATE TABLE methods (class INTEGER, name TEXT, args TEXT, docstring TEXT);
+CREATE INDEX methods_class ON methods (class);
+CREATE INDEX methods_name ON methods (name);
+CREATE INDEX methods_name_nocase ON methods (name COLLATE NOCASE);
+
+CREATE TABLE properties (class INTEGER, name TEXT);
+CREATE INDEX properties_class ON properties (class);
+CREATE INDEX properties_name ON properties (name);
+CREATE INDEX properties_name_nocase ON properties (name COLLATE NOCASE);
+
+CREATE TABLE pointers (name TEXT PRIMARY KEY, module TEXT, target TEXT);
+CREATE INDEX pointers_module ON pointers (module);
+"""
+
+
+def _split(name):
+    "split a dotted name into its module and its last part"
+    if '.' not in name:
+        return '', name
+    return tuple(name.rsplit('.', 1))
+
+
+def writeTagDB(path, modules):
+    "write the PYSMELLDICT ``modules`` into a new database at path, replacing any file there"
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        # the file is regenerated from scratch if anything goes wrong, don't wait for the disk
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.executescript('BEGIN;%sCOMMIT;' % SCHEMA)
+
+        hierarchy = {}
+        for module in modules['HIERARCHY']:
+            parts = module.split('.')
+            for end in range(1, len(parts) + 1):
+                name = '.'.join(parts[:end])
+                hierarchy[name] = ('.'.join(parts[:end - 1]), parts[end - 1])
+        connection.executemany('INSERT INTO modules VALUES (?, ?, ?)',
+            [(name, parent, part) for (name, (parent, part)) in hierarchy.items()])
+
+        connection.executemany('INSERT INTO constants VALUES (?, ?)',
+            [_split(const) for const in modules['CONSTANTS']])
+        connection.executemany('INSERT INTO functions VALUES (?, ?, ?, ?)',
+            [_split(func[0]) + (json.dumps(list(func[1])), func[2] or '') for func in modules['FUNCTIONS']])
+
+        for klass, klassDict in modules['CLASSES'].items():
+            module, name = _split(klass)
+            cursor = connection.execute('INSERT INTO classes VALUES (NULL, ?, ?, ?, ?, ?, ?)',
+                (klass, module, name, json.dumps(list(klassDict['constructor'])),
+                 json.dumps(list(klassDict['bases'])), klassDict.get('docstring') or ''))
+            classId = cursor.lastrowid
+            connection.executemany('INSERT INTO methods VALUES (?, ?, ?, ?)',
+                [(classId, method[0], json.dumps(list(method[1])), method[2] or '') for method in klassDict['methods']])
+            connection.executemany('INSERT INTO properties VALUES (?, ?)',
+                [(classId, prop) for prop in klassDict['properties']])
+
+        connection.executemany('INSERT INTO pointers VALUES (?, ?, ?)',
+            [(pointer, _split(pointer)[0], target) for (pointer, target) in modules['POINTERS'].items()])
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def isTagDB(path):
+    try:
+        tagsFile = open(path, 'rb')
+    except IOError:
+        return False
+    try:
+        return tagsFile.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    finally:
+        tagsFile.close()
+
+
+def _namePattern(column, prefix, ignoreCase):
+    "an indexable condition (and its parameter) for ``column`` starting with prefix"
+    if ignoreCase:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return "%s LIKE ? ESCAPE '\\'" % column, escaped + '%'
+    escaped = ''.join(c in '*?[' and '[%s]' % c or c for c in prefix)
+    return '%s GLOB ?' % column, escaped + '*'
+
+
+class DBMapping(object):
+    "a read-only mapping of one of the keyed sections (CLASSES or POINTERS) of a TagDB"
+    def __init__(self, db, lookup, names):
+        self.db = db
+        self._lookup = lookup
+        self._names = names
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            self._cache[key] = self._lookup(key)
+        value = self._cache[key]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        return iter(self._names())
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __len__(self):
+        return len(self._names())
+
+
+class TagDB(object):
+    """
+    A read-only PYSMELLDICT backed by the database written by writeTagDB.
+    """
+    def __init__(self, path):
+        self.path = path
+        # servers query from whichever worker thread completes, one at a
+        # time: the lock is held while completing (see idehelper.storeLock)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._sections = {
+            'CLASSES': DBMapping(self, self._lookupClass, self._classNames),
+            'POINTERS': DBMapping(self, self._lookupPointer, self._pointerNames),
+        }
+
+    def query(self, sql, *args):
+        return self.connection.execute(sql, args).fetchall()
+
+    def createIndex(self):
+        return TagDBIndex(self)
+
+    def _lookupClass(self, klass):
+        rows = self.query('SELECT id, constructor, bases, docstring FROM classes WHERE fullName = ?', klass)
+        if not rows:
+            return None
+        classId, constructor, bases, docstring = rows[0]
+        return dict(constructor=json.loads(constructor), bases=json.loads(bases), docstring=docstring,
+            properties=[name for (name,) in self.query('SELECT name FROM properties WHERE class = ?', classId)],
+            methods=[(name, json.loads(args), methodDoc) for (name, args, methodDoc)
+                        in self.query('SELECT name, args, docstring FROM methods WHERE class = ?', classId)])
+
+    def _classNames(self):
+        return [name for (name,) in self.query('SELECT fullName FROM classes')]
+
+    def _lookupPointer(self, pointer):
+        rows = self.query('SELECT target FROM pointers WHERE name = ?', pointer)
+        return rows and rows[0][0] or None
+
+    def _pointerNames(self):
+        return [name for (name,) in self.query('SELECT name FROM pointers')]
+
+    def __getitem__(self, key):
+        if key not in self._sections:
+            if key == 'CONSTANTS':
+                values = ['%s.%s' % row for row in self.query('SELECT module, name FROM constants')]
+            elif key == 'FUNCTIONS':
+                values = [('%s.%s' % (module, name), json.loads(args), docstring) for (module, name, args, docstring)
+                                in self.query('SELECT module, name, args, docstring FROM functions')]
+            elif key == 'HIERARCHY':
+                values = [name for (name,) in self.query('SELECT name FROM modules')]
+            else:
+                raise KeyError(key)
+            self._sections[key] = values
+        return self._sections[key]
+
+    def __contains__(self, key):
+        return key in ('CLASSES', 'FUNCTIONS', 'CONSTANTS', 'POINTERS', 'HIERARCHY')
+
+    def keys(self):
+        return ['CLASSES', 'FUNCTIONS', 'CONSTANTS', 'POINTERS', 'HIERARCHY']
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def close(self):
+        self.connection.close()
+
+
+class TagDBIndex(CompletionIndex):
+    """
+    The CompletionIndex of a TagDB. Class lookups, module nodes and prefix
+    searches (see candidates) are single indexed queries, so a completion
+    only reads the rows it is going to show.
+    """
+    queriesPrefixes = True
+
+    def __init__(self, db):
+        CompletionIndex.__init__(self, db)
+        self.db = db
+        self._nodes = {}
+
+    def _constantRecords(self, where='', *args):
+        return [Completion(name, 'd', module) for (module, name)
+                    in self.db.query('SELECT module, name FROM constants ' + where, *args)]
+
+    def _functionRecords(self, where='', *args):
+        return [_getCompForFunction((name, json.loads(argList)), 'f', module) for (module, name, argList)
+                    in self.db.query('SELECT module, name, args FROM functions ' + where, *args)]
+
+    def _constructorRecords(self, where='', *args):
+        return [_getCompForFunction((name, json.loads(constructor)), 't', module) for (module, name, constructor)
+                    in self.db.query('SELECT module, name, constructor FROM classes ' + where, *args)]
+
+    def _memberRecords(self, condition=None, *args):
+        "records for properties and methods, ``condition`` can refer to their table as %(table)s"
+        records = []
+        menus = {}
+        def menuOf(module, klass):
+            key = (module, klass)
+            if key not in menus:
+                menus[key] = intern('%s:%s' % key)
+            return menus[key]
+        def where(table):
+            return condition and 'WHERE ' + condition % dict(table=table) or ''
+        for (module, klass, name) in self.db.query('SELECT classes.module, classes.name, properties.name '
+                    'FROM properties JOIN classes ON properties.class = classes.id ' + where('properties'), *args):
+            records.append(Completion(name, 'm', menuOf(module, klass)))
+        for (module, klass, name, argList) in self.db.query('SELECT classes.module, classes.name, methods.name, '
+                    'methods.args FROM methods JOIN classes ON methods.class = classes.id ' + where('methods'), *args):
+            records.append(_getCompForFunction((name, json.loads(argList)), 'm', module=menuOf(module, klass)))
+        return records
+
+    def constants(self):
+        return self._section('CONSTANTS', self._constantRecords)
+
+    def functions(self):
+        return self._section('FUNCTIONS', self._functionRecords)
+
+    def constructors(self):
+        return self._section('CONSTRUCTORS', self._constructorRecords)
+
+    def allMembers(self):
+        return self._section('MEMBERS', self._memberRecords)
+
+    def candidates(self, section, prefix, ignoreCase):
+        if not prefix:
+            return CompletionIndex.candidates(self, section, prefix, ignoreCase)
+        if section == 'allMembers':
+            condition, pattern = _namePattern('%(table)s.name', prefix, ignoreCase)
+            return sortRecords(self._memberRecords(condition, pattern))
+        condition, pattern = _namePattern('name', prefix, ignoreCase)
+        where = 'WHERE ' + condition
+        records = self._functionRecords(where, pattern)
+        if section == 'topLevel':
+            records.extend(self._constantRecords(where, pattern))
+            records.extend(self._constructorRecords(where, pattern))
+        return sortRecords(records)
+
+    def moduleTree(self):
+        return self.findModule('')
+
+    def findModule(self, module):
+        if module in self._nodes:
+            return self._nodes[module]
+        node = ModuleNode()
+        for (part,) in self.db.query('SELECT part FROM modules WHERE parent = ?', module):
+            node.children[part] = ModuleNode()
+            node.children[part].inHierarchy = True
+        if module:
+            node.inHierarchy = bool(self.db.query('SELECT 1 FROM modules WHERE name = ?', module))
+            members = self._constantRecords('WHERE module = ?', module)
+            members.extend(self._functionRecords('WHERE module = ?', module))
+            members.extend(self._constructorRecords('WHERE module = ?', module))
+            node.members = sortRecords([record for record in members if not record.word.startswith('_')])
+            for (pointer, target) in self.db.query('SELECT name, target FROM pointers WHERE module = ?', module):
+                name = pointer.rsplit('.', 1)[1]
+                if name == '*':
+                    node.stars.append(target[:-2]) # remove .*
+                else:
+                    node.pointers[name] = target
+            if not (node.inHierarchy or node.members or node.pointers or node.stars or node.children):
+                node = None
+        self._nodes[module] = node
+        return node
+
+    def starTable(self):
+        if self._starTable is None:
+            table = {}
+            for (module, target) in self.db.query("SELECT module, target FROM pointers WHERE name GLOB '*.[*]'"):
+                table.setdefault(module, []).append(target[:-2])
+            self._starTable = table
+        return self._starTable
+
+    def invalidateModules(self, modules):
+        CompletionIndex.invalidateModules(self, modules)
+        self._nodes.clear()
@@ -10,20 +10,46 @@
 # Released subject to the BSD License 
 
 import pickle as pickle
+import json
 import os
 import sys
+import time
 from textwrap import dedent
 
 from pysmell.outputHandlers.PickleOut import PickleOut
 from pysmell.outputHandlers.EvalParser import EvalParser
 from pysmell.outputHandlers.FileOut import FileOut
-from pysmell.codefinder import ModuleDict, processFile
+from pysmell.outputHandlers.ShardedOut import ShardedOut
+from pysmell.outputHandlers.SQLiteOut import SQLiteOut
+from pysmell.outputHandlers.StringTableOut import StringTableOut
+from pysmell.outputHandlers.SectionedOut import SectionedOut
+from pysmell.codefinder import ModuleDict, processFile, moduleName
+from pysmell.docstore import DOCSFILE, stripDocstrings, writeDocstrings
+from pysmell.tagsfile import loadTags, PICKLE, EVAL, STRINGTABLE, SECTIONED, SQLITE
+from pysmell.tagslog import splitByModule, appendToLog, readLog, readLogFile, applyLog, logPath, logSize, removeLog
+from pysmell.tagdb import isTagDB
+from pysmell.shards import MANIFEST_SUFFIX
 #from pysmell.idehelper import findRootPackageList
 
 from pysmell import argparse
  
 version = __import__('pysmell').__version__
 
+# the handler writing each format readTags understands
+FORMATS = {
+    PICKLE: PickleOut,
+    EVAL: lambda path: EvalParser(FileOut(path)),
+    STRINGTABLE: StringTableOut,
+    SECTIONED: SectionedOut,
+}
+
+# convert can write tag databases too
+CONVERT_FORMATS = dict(FORMATS)
+CONVERT_FORMATS[SQLITE] = SQLiteOut
+
+# compact once the log grows past this fraction of the tags file
+COMPACT_RATIO = 0.5
+
 source = """
 class Aclass(object):
     def do_stuff(self):
@@ -41,27 +67,12 @@ def test(aname):
 """
 
 
-def process(filesOrDirectories, excluded=[], inputDict=None, verbose=False):
+def findPythonFiles(filesOrDirectories, excluded=[], verbose=False):
     """
-    Visit every package in ``filesOrDirectories`` and return a ModuleDict for everything,
-    that can be used to generate a PYSMELLTAGS file.
-
-    filesOrDirectories: list of paths to process. They can either be directories or files.
-                        Directories can either be packages or they can contain packages.
-
-    excluded: list of directories to exclude (eg. ['test', '.svn'])
-
-    inputDict: a ModuleDict instance to update with any new or updated python
-               namespaces.
-
-    verbose: flag that turns on verbose logging (print what is going on).
-
-    returns: The generated ModuleDict instance for the directories provided in
-             ``filesOrDirectories``.
+    The python files process analyses for ``filesOrDirectories``, as a list
+    of (absolute directory, filename).
     """
-    modules = ModuleDict()
-    if inputDict:
-        modules.update(inputDict)
+    found = []
     for rootPackage in filesOrDirectories:
         if os.path.isdir(rootPackage):
             for path, dirs, files in os.walk(rootPackage):
@@ -74,11 +85,7 @@ def process(filesOrDirectories, excluded=[], inputDict=None, verbose=False):
                     if not f.endswith(".py"):
                         continue
                     #path here is relative, make it absolute
-                    absPath = os.path.abspath(path)
-                    if verbose:
-                        print('processing', absPath, f)
-                    newmodules = processFile(f, absPath)
-                    modules.update(newmodules)
+                    found.append((os.path.abspath(path), f))
         else: # single file
             filename = rootPackage
             absPath, filename = os.path.split(filename)
@@ -86,17 +93,206 @@ def process(filesOrDirectories, excluded=[], inputDict=None, verbose=False):
                 absPath = os.path.abspath(".")
             else:
                 absPath = os.path.abspath(absPath)
-                
-            #path here is absolute
-            if verbose:
-                print('processing', absPath, filename)
-            newmodules = processFile(filename, absPath)
-            modules.update(newmodules)
-            
+            found.append((absPath, filename))
+    return found
+
+
+def process(filesOrDirectories, excluded=[], inputDict=None, verbose=False, progress=None):
+    """
+    Visit every package in ``filesOrDirectories`` and return a ModuleDict for everything,
+    that can be used to generate a PYSMELLTAGS file.
+
+    filesOrDirectories: list of paths to process. They can either be directories or files.
+                        Directories can either be packages or they can contain packages.
+
+    excluded: list of directories to exclude (eg. ['test', '.svn'])
+
+    inputDict: a ModuleDict instance to update with any new or updated python
+               namespaces.
+
+    verbose: flag that turns on verbose logging (print what is going on).
+
+    progress: called as progress(done, total, path) before each file is
+              analysed, and as progress(total, total, None) at the end. An
+              exception it raises stops the analysis (see indexer.Cancelled).
+
+    returns: The generated ModuleDict instance for the directories provided in
+             ``filesOrDirectories``.
+    """
+    modules = ModuleDict()
+    if inputDict:
+        modules.update(inputDict)
+    pythonFiles = findPythonFiles(filesOrDirectories, excluded, verbose)
+    for done, (absPath, filename) in enumerate(pythonFiles):
+        #path here is absolute
+        if progress is not None:
+            progress(done, len(pythonFiles), os.path.join(absPath, filename))
+        if verbose:
+            print('processing', absPath, filename)
+        newmodules = processFile(filename, absPath)
+        modules.update(newmodules)
+    if progress is not None:
+        progress(len(pythonFiles), len(pythonFiles), None)
     return modules
 
 
+def processChanges(fileList, excluded=[], verbose=False, progress=None):
+    """
+    Like process, for files that changed since the tags were written.
+
+    returns: The ModuleDict for the files in ``fileList`` that exist, and the
+             names of the modules whose python files in ``fileList`` were deleted.
+    """
+    deleted = []
+    for path in fileList:
+        if os.path.exists(path): continue
+        if path.endswith('.py'):
+            deleted.append(moduleName(os.path.abspath(path)))
+        else:
+            print("%s doesn't exist - only deleted python files can be logged" % path, file=sys.stderr)
+    modules = process([path for path in fileList if os.path.exists(path)], excluded, verbose=verbose,
+                      progress=progress)
+    return modules, deleted
+
+
+def appendModules(tagsPath, modules, deleted=[]):
+    """
+    Log the ModuleDict ``modules`` as the new tags of its modules, and
+    ``deleted`` as deleted, instead of rewriting the tags file at tagsPath
+    (see tagslog). The log is compacted once it grows past COMPACT_RATIO
+    of the tags file.
+    """
+    appendToLog(tagsPath, splitByModule(modules), deleted)
+    if logSize(tagsPath) > COMPACT_RATIO * os.path.getsize(tagsPath):
+        compact(tagsPath)
+
+
+def compact(tagsPath):
+    """
+    fold the log of tagsPath into a new tags file, in the format of the old one.
+    The log is moved aside first, so records appended meanwhile start a new
+    log over the new tags instead of being lost.
+    """
+    directory, filename = os.path.split(os.path.abspath(tagsPath))
+    # like the new tags file, this isn't a PYSMELLTAGS.* that readers would pick up
+    asidePath = os.path.join(directory, '.%s.log.compacting' % filename)
+    if os.path.exists(asidePath):
+        # left by a compaction that didn't finish, its records are older than the log
+        _fold(tagsPath, asidePath)
+    if not os.path.exists(logPath(tagsPath)):
+        return
+    os.replace(logPath(tagsPath), asidePath)
+    _fold(tagsPath, asidePath)
+
+
+def _fold(tagsPath, asidePath):
+    tagsFormat, tags = loadTags(tagsPath)
+    # read after the tags, so that writers which opened the log just before
+    # it was moved have finished
+    applyLog(tags, readLogFile(asidePath))
+    directory, filename = os.path.split(os.path.abspath(tagsPath))
+    # readers shouldn't see the new file before it's complete, so it isn't a PYSMELLTAGS.* yet
+    newPath = os.path.join(directory, '.%s.compacting' % filename)
+    FORMATS[tagsFormat](newPath).write(tags)
+    os.replace(newPath, tagsPath)
+    os.remove(asidePath)
+
+
+def compactMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell compact',
+        description="Fold the log written by pysmell --append back into the tags file.")
+    parser.add_argument('tagsFile', nargs='?', default='PYSMELLTAGS',
+        help="The tags file to compact")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.tagsFile):
+        parser.error("%s doesn't exist" % args.tagsFile)
+    compact(args.tagsFile)
+
+
+def convert(source, output, outputFormat):
+    """
+    Write the tags file at source, with its log applied, to output in
+    ``outputFormat`` (one of CONVERT_FORMATS). Return what was done as a dict.
+    """
+    start = time.time()
+    sourceFormat, tags = loadTags(source)
+    applyLog(tags, readLog(source))
+    loaded = time.time()
+    CONVERT_FORMATS[outputFormat](output).write(tags)
+    written = time.time()
+    return {
+        'source': os.path.abspath(source),
+        'sourceFormat': sourceFormat,
+        'sourceBytes': os.path.getsize(source),
+        'output': os.path.abspath(output),
+        'outputFormat': outputFormat,
+        'outputBytes': os.path.getsize(output),
+        'readSeconds': round(loaded - start, 6),
+        'writeSeconds': round(written - loaded, 6),
+    }
+
+
+def convertMain(argv):
+    parser = argparse.ArgumentParser(prog='pysmell convert',
+        description="Write a tags file in another format. Prints what was done as JSON.")
+    parser.add_argument('source', help="The tags file to convert, in any format but sqlite")
+    parser.add_argument('output', help="The file to write")
+    parser.add_argument('-f', '--format', required=True, choices=sorted(CONVERT_FORMATS),
+        help="The format to write")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        parser.error("%s doesn't exist" % args.source)
+    if isTagDB(args.source):
+        parser.error("tag databases can't be converted, regenerate the tags instead")
+    if os.path.abspath(args.source) == os.path.abspath(args.output):
+        parser.error("the output has to be a different file")
+    print(json.dumps(convert(args.source, args.output, args.format), sort_keys=True, indent=2))
+
+
+def indexMain(argv):
+    # the indexer builds on this module, so it is only imported when used
+    from pysmell.indexer import indexMain
+    return indexMain(argv)
+
+
+# the other commands pull in asyncio and the like, which plain tagging doesn't need
+def benchLoadMain(argv):
+    from pysmell.benchload import benchLoadMain
+    return benchLoadMain(argv)
+
+
+def serveMain(argv):
+    from pysmell.server import serveMain
+    return serveMain(argv)
+
+
+def completeMain(argv):
+    from pysmell.batch import completeMain
+    return completeMain(argv)
+
+
+def benchServeMain(argv):
+    from pysmell.benchserve import benchServeMain
+    return benchServeMain(argv)
+
+
+# pysmell <command> ...
+COMMANDS = {
+    'index': indexMain,
+    'compact': compactMain,
+    'convert': convertMain,
+    'bench-load': benchLoadMain,
+    'serve': serveMain,
+    'complete': completeMain,
+    'bench-serve': benchServeMain,
+}
+
+
 def main():
+    # a package called index or serve is still tagged, as before there were commands
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS and not os.path.exists(sys.argv[1]):
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+
     description = dedent("""\
         Generate a PYSMELLTAGS file with information about the
         Python code contained in the specified packages (recursively). This file is
@@ -110,8 +306,29 @@ def main():
         argument. Useful for excluding tests or version control directories."""))
     parser.add_argument('-p', '--pickle', action='store_true',
         help='Set to enable pickle output in stead og pparsed output')
+    parser.add_argument('--sqlite', action='store_true',
+        help=dedent("""Write the tags to an SQLite database that editors query
+        in place, instead of loading every tag."""))
+    parser.add_argument('--string-table', action='store_true',
+        help=dedent("""Write pickled tags that store every distinct string once.
+        Smaller and faster to load than the other formats."""))
+    parser.add_argument('--sections', action='store_true',
+        help=dedent("""Write pickled tags where the classes, functions, constants,
+        pointers and module list can each be read on their own, so that
+        editors only read what a completion needs."""))
+    parser.add_argument('--split-docstrings', action='store_true',
+        help=dedent("""Write the docstrings to a PYSMELLDOCS file next to the
+        output instead of the tags, which makes the tags smaller. Editors
+        read it only to show documentation."""))
     parser.add_argument('-o', '--output', default='PYSMELLTAGS',
         help="File to write the tags to")
+    parser.add_argument('-s', '--shard-by', choices=['package'],
+        help=dedent("""Write one tags file per top level package, plus a
+        manifest, so that editors only load the packages they need."""))
+    parser.add_argument('-a', '--append', action='store_true',
+        help=dedent("""Append the analysis of the given files to a log next to
+        the existing tags file, instead of rewriting it. Deleted files are
+        logged too. Run 'pysmell compact' to fold the log into the tags."""))
     parser.add_argument('-i', '--input',
         help="Preexisting tags file to update")
     parser.add_argument('-t', '--timing', action='store_true',
@@ -126,6 +343,18 @@ def main():
     verbose = args.debug
     inputFile = args.input
     pickle = args.pickle
+    shardBy = args.shard_by
+    sqlite = args.sqlite
+    stringTable = args.string_table
+    sections = args.sections
+    splitDocstrings = args.split_docstrings
+    append = args.append and os.path.exists(output)
+    if append and (isTagDB(output) or os.path.exists(output + MANIFEST_SUFFIX)):
+        parser.error("--append only works with unsharded pickle, eval, string table or sectioned tags")
+    if sqlite and shardBy:
+        parser.error("--sqlite and --shard-by can't be combined")
+    if len([chosen for chosen in (sqlite, stringTable, sections) if chosen]) > 1:
+        parser.error("only one of --sqlite, --string-table and --sections can be given")
     if inputFile:
         try:
             inputDict = eval(file(inputFile).read())
@@ -142,14 +371,34 @@ def main():
     if verbose:
         print('processing', fileList)
         print('ignoring', excluded)
-    modules = process(fileList, excluded, inputDict=inputDict, verbose=verbose)
-
-    if (pickle):
-        handler = PickleOut(output)
+    if append:
+        modules, deleted = processChanges(fileList, excluded, verbose=verbose)
     else:
-        handler = EvalParser(FileOut(output))
+        modules = process(fileList, excluded, inputDict=inputDict, verbose=verbose)
+    if splitDocstrings:
+        docsFile = os.path.join(os.path.dirname(output), DOCSFILE)
+        writeDocstrings(docsFile, stripDocstrings(modules), update=append)
 
-    handler.write(modules)
+    if (sqlite):
+        handlerFactory = SQLiteOut
+    elif (stringTable):
+        handlerFactory = StringTableOut
+    elif (sections):
+        handlerFactory = SectionedOut
+    elif (pickle):
+        handlerFactory = PickleOut
+    else:
+        handlerFactory = lambda path: EvalParser(FileOut(path))
+    if append:
+        appendModules(output, modules, deleted)
+    else:
+        if shardBy == 'package':
+            handler = ShardedOut(output, handlerFactory)
+        else:
+            handler = handlerFactory(output)
+        handler.write(modules)
+        # the log was about the old tags, readers would apply it to the new ones
+        removeLog(output)
 
 #    generateClassTag(modules, output)
     if timing:
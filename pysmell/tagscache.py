@@ -0,0 +1,233 @@
+# tagscache.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+PYSMELLDICTs kept loaded by long running processes (pysmell-lsp, pysmell
+serve), so that their indexes are built once and shared by every request
+and every client, until the tags change on disk.
+
+The tags of a project are published one Version after the other, and
+requests read the current one without waiting for each other. Only the
+first load of a project makes its requests wait: when its tags change, one
+request loads them again while the others go on with the version they had.
+Plain tags are kept in a snapshot.SnapshotStore, so when only their log
+grew (``pysmell --append``) the logged modules are replaced in the next
+snapshot, whose index starts from the previous one instead of from scratch.
+
+With a cache directory, the indexes also outlive the process: save() writes
+them there and they are read back instead of the tags after a restart, and
+prewarm() loads the tags of the projects used last (see indexcache).
+"""
+
+import os
+import threading
+
+from pysmell import idehelper
+from pysmell.index import getBaseIndex
+from pysmell.indexcache import addRecent, canSnapshot, dumpIndex, loadIndex, readRecent, snapshotPath
+from pysmell.shards import getShardSet
+from pysmell.snapshot import SnapshotStore
+from pysmell.tagslog import changesOf, isLog, logPath, readLog
+
+
+def tagsStamp(directory):
+    """
+    The tags files findPYSMELLDICT reads for a file in directory, with
+    their modification times. Files whose stamps are equal get the same tags.
+    """
+    stamp = []
+    while True:
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            names = []
+        for name in names:
+            if name.startswith('PYSMELLTAGS'):
+                path = os.path.join(directory, name)
+                stamp.append((path, os.path.getmtime(path)))
+        parent = os.path.dirname(directory)
+        if os.path.exists(os.path.join(directory, 'PYSMELLTAGS')) or parent == directory:
+            return stamp
+        directory = parent
+
+
+def _tagsFiles(stamp):
+    return tuple(path for path, _ in stamp if not isLog(path))
+
+
+def _loggedFile(previous, stamp):
+    "the tags file of stamp, if it is the only one and nothing but its log changed since previous"
+    tagsFiles = _tagsFiles(stamp)
+    if len(tagsFiles) != 1:
+        return None
+    unlogged = lambda stamp: [entry for entry in stamp if entry[0] != logPath(tagsFiles[0])]
+    if unlogged(previous) != unlogged(stamp):
+        return None
+    return tagsFiles[0]
+
+
+class Version(object):
+    "the tags of a project at one stamp"
+    def __init__(self, stamp, PYSMELLDICT, store=None, logged=0):
+        self.stamp = stamp
+        self.PYSMELLDICT = PYSMELLDICT
+        # plain tags are kept in a SnapshotStore, with the number of log records it has
+        self.store = store
+        self.logged = logged
+
+
+class Project(object):
+    "the tags read from the same files, whatever directory they were found from"
+    def __init__(self, tagsFiles):
+        self.tagsFiles = tagsFiles
+        self.current = None
+        # one request at a time loads the tags again
+        self.loading = threading.Lock()
+
+
+class TagsCache(object):
+    """
+    The PYSMELLDICT of every directory files were completed in. It is safe
+    to use from several threads, and so are the PYSMELLDICTs it hands out:
+    every completion shows the edited buffer on top of them in its own
+    index (see idehelper.detectCompletionType), and tags that load as they
+    are used hold their own lock while completing (see idehelper.storeLock).
+    """
+    def __init__(self, cacheDirectory=None):
+        # directory -> Project, and the tags files of a Project -> Project
+        self.directories = {}
+        self.projects = {}
+        # only held to look up and publish, never while loading
+        self.lock = threading.Lock()
+        self.cacheDirectory = cacheDirectory
+
+    def get(self, path):
+        "the PYSMELLDICT for the file at path, or None if it has no tags"
+        version = self._version(path)
+        if version is None:
+            return None
+        return version.PYSMELLDICT
+
+    def _version(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        stamp = tagsStamp(directory)
+        if not stamp:
+            return None
+        project = self._project(directory, stamp)
+        version = project.current
+        if version is not None and version.stamp == stamp:
+            return version
+        if version is None:
+            project.loading.acquire()
+        elif not project.loading.acquire(False):
+            # the new tags are being loaded, complete with these meanwhile
+            return version
+        try:
+            version = project.current
+            if version is None or version.stamp != stamp:
+                version = self._load(project, path, stamp)
+            return version
+        finally:
+            project.loading.release()
+
+    def _project(self, directory, stamp):
+        tagsFiles = _tagsFiles(stamp)
+        self.lock.acquire()
+        try:
+            project = self.projects.get(tagsFiles)
+            if project is None:
+                project = self.projects[tagsFiles] = Project(tagsFiles)
+            previous = self.directories.get(directory)
+            self.directories[directory] = project
+            if previous is not None and previous is not project and previous not in self.directories.values():
+                # tags files were added or removed, the old ones aren't read from anywhere
+                del self.projects[previous.tagsFiles]
+            return project
+        finally:
+            self.lock.release()
+
+    def _load(self, project, path, stamp):
+        previous = project.current
+        tagsPath = previous is not None and previous.store is not None and _loggedFile(previous.stamp, stamp)
+        if tagsPath:
+            records = readLog(tagsPath)
+            if len(records) >= previous.logged:
+                partials, deleted = changesOf(records[previous.logged:])
+                # requests go on with the previous snapshot while this one is indexed
+                snapshot = previous.store.replace(partials, deleted)
+                return self._publish(project, Version(stamp, snapshot.PYSMELLDICT, previous.store, len(records)))
+
+        # records logged while the tags are read are applied again by the next
+        # load, which is harmless, so count them first
+        tagsFiles = _tagsFiles(stamp)
+        logged = len(tagsFiles) == 1 and len(readLog(tagsFiles[0])) or 0
+        PYSMELLDICT = None
+        if self.cacheDirectory:
+            PYSMELLDICT = loadIndex(snapshotPath(self.cacheDirectory, stamp), stamp)
+        if PYSMELLDICT is None:
+            PYSMELLDICT = idehelper.findPYSMELLDICT(path)
+        store = None
+        if isinstance(PYSMELLDICT, dict) and getShardSet(PYSMELLDICT) is None:
+            store = SnapshotStore(PYSMELLDICT)
+        if PYSMELLDICT is not None:
+            if previous is not None:
+                # requests go on with the previous tags while these are indexed
+                getBaseIndex(PYSMELLDICT).precompute()
+            if self.cacheDirectory:
+                addRecent(self.cacheDirectory, os.path.dirname(os.path.abspath(path)), stamp)
+        return self._publish(project, Version(stamp, PYSMELLDICT, store, logged))
+
+    def _publish(self, project, version):
+        # the previous tags and their index go away with the last request using them
+        self.lock.acquire()
+        try:
+            project.current = version
+        finally:
+            self.lock.release()
+        return version
+
+    def _versions(self):
+        self.lock.acquire()
+        try:
+            return [project.current for project in self.projects.values()
+                    if project.current is not None and project.current.PYSMELLDICT is not None]
+        finally:
+            self.lock.release()
+
+    def prewarm(self):
+        "load the tags of the projects in the recent list and build their indexes"
+        if not self.cacheDirectory:
+            return
+        # loading moves each directory to the front, so go from the back to keep the order
+        for directory in reversed(readRecent(self.cacheDirectory)):
+            try:
+                PYSMELLDICT = self.get(os.path.join(directory, '__init__.py'))
+            except Exception:
+                # the project is gone or its tags are broken, a request will say so
+                continue
+            if PYSMELLDICT is None:
+                continue
+            lock = idehelper.storeLock(PYSMELLDICT)
+            lock.acquire()
+            try:
+                getBaseIndex(PYSMELLDICT).precompute()
+            finally:
+                lock.release()
+
+    def save(self):
+        "snapshot the index of every PYSMELLDICT whose tags haven't changed since it was loaded"
+        if not self.cacheDirectory:
+            return
+        for version in self._versions():
+            stamp = version.stamp
+            if not canSnapshot(version.PYSMELLDICT) or tagsStamp(os.path.dirname(stamp[0][0])) != stamp:
+                continue
+            # plain tags don't change, completions may go on meanwhile
+            getBaseIndex(version.PYSMELLDICT).precompute()
+            dumpIndex(snapshotPath(self.cacheDirectory, stamp), version.PYSMELLDICT, stamp)
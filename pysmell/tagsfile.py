@@ -0,0 +1,53 @@
+# tagsfile.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+import pickle
+
+from pysmell.stringtable import isEncoded, decode
+from pysmell.sections import SECTIONS_MAGIC, readSections
+from pysmell.tagslog import readLog, applyLog
+
+PICKLE = 'pickle'
+EVAL = 'eval'
+STRINGTABLE = 'string-table'
+SECTIONED = 'sections'
+# tagdb files are queried in place, loadTags doesn't read them
+SQLITE = 'sqlite'
+
+
+def loadTags(path):
+    """
+    Load a tags file written by any of the output handlers, without applying
+    its log. Return the format it is in (PICKLE for PickleOut files, EVAL for
+    EvalParser files, STRINGTABLE for StringTableOut files, SECTIONED for
+    SectionedOut files) and the tags.
+    """
+    tagsFile = open(path, 'rb')
+    try:
+        data = tagsFile.read()
+    finally:
+        tagsFile.close()
+    if data.startswith(SECTIONS_MAGIC):
+        return SECTIONED, readSections(path)
+    try:
+        tagsFormat, tags = PICKLE, pickle.loads(data)
+    except Exception:
+        tagsFormat, tags = EVAL, eval(data)
+    if isEncoded(tags):
+        return STRINGTABLE, decode(tags)
+    return tagsFormat, tags
+
+
+def readTags(path):
+    "load the tags file at path, with its log (see tagslog) applied"
+    tags = loadTags(path)[1]
+    records = readLog(path)
+    if records:
+        applyLog(tags, records)
+    return tags
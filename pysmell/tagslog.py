@@ -0,0 +1,159 @@
+# tagslog.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+An append-only log of changes to a tags file (``pysmell --append``), so
+that re-indexing a few modules doesn't rewrite the whole file. PYSMELLTAGS.log
+holds pickled records, one after the other:
+
+    ('replace', module, tags of module)   module was (re)analysed
+    ('delete', module, None)              module is gone
+
+readTags applies the log of a tags file over it, the last record of a module
+wins. ``pysmell compact`` folds the log back into the tags file.
+"""
+
+import os
+import pickle
+
+LOG_SUFFIX = '.log'
+REPLACE = 'replace'
+DELETE = 'delete'
+
+
+def logPath(tagsPath):
+    return tagsPath + LOG_SUFFIX
+
+
+def isLog(filename):
+    return filename.endswith(LOG_SUFFIX)
+
+
+def _moduleOf(name):
+    return name.rsplit('.', 1)[0]
+
+
+def splitByModule(modules):
+    "return the tags of every module in ``modules``, as a dict of module -> PYSMELLDICT"
+    partials = {}
+    def partialFor(module):
+        if module not in partials:
+            partials[module] = {'CONSTANTS': [], 'FUNCTIONS': [], 'CLASSES': {}, 'POINTERS': {}, 'HIERARCHY': []}
+        return partials[module]
+
+    for module in modules['HIERARCHY']:
+        partialFor(module)['HIERARCHY'].append(module)
+    for const in modules['CONSTANTS']:
+        partialFor(_moduleOf(const))['CONSTANTS'].append(const)
+    for func in modules['FUNCTIONS']:
+        partialFor(_moduleOf(func[0]))['FUNCTIONS'].append(func)
+    for klass, klassDict in modules['CLASSES'].items():
+        partialFor(_moduleOf(klass))['CLASSES'][klass] = klassDict
+    for pointer, target in modules['POINTERS'].items():
+        partialFor(_moduleOf(pointer))['POINTERS'][pointer] = target
+    return partials
+
+
+def appendToLog(tagsPath, replaced, deleted=()):
+    """
+    Append a replace record for every module -> PYSMELLDICT in ``replaced``
+    and a delete record for every module in ``deleted`` to the log of tagsPath.
+    """
+    logFile = open(logPath(tagsPath), 'ab')
+    try:
+        for module in sorted(replaced):
+            pickle.dump((REPLACE, module, replaced[module]), logFile, protocol=pickle.HIGHEST_PROTOCOL)
+        for module in deleted:
+            pickle.dump((DELETE, module, None), logFile, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        logFile.close()
+
+
+def removeLog(tagsPath):
+    "forget the log of tagsPath, once the tags have been rewritten in full"
+    if os.path.exists(logPath(tagsPath)):
+        os.remove(logPath(tagsPath))
+
+
+def readLog(tagsPath):
+    "the records in the log of tagsPath. A record cut short by a crash ends the log"
+    return readLogFile(logPath(tagsPath))
+
+
+def readLogFile(path):
+    "the records in the log file at path, like readLog"
+    records = []
+    if not os.path.exists(path):
+        return records
+    logFile = open(path, 'rb')
+    try:
+        while True:
+            try:
+                records.append(pickle.load(logFile))
+            except (EOFError, ValueError, pickle.UnpicklingError):
+                break
+    finally:
+        logFile.close()
+    return records
+
+
+def changesOf(records):
+    """
+    the module -> PYSMELLDICT the log ``records`` replace, and the modules they
+    delete, the last record of a module winning (see snapshot.Snapshot.replace)
+    """
+    partials = {}
+    deleted = set()
+    for operation, module, partial in records:
+        if operation == REPLACE:
+            partials[module] = partial
+            deleted.discard(module)
+        else:
+            partials.pop(module, None)
+            deleted.add(module)
+    return partials, deleted
+
+
+def applyLog(tags, records):
+    """
+    apply the log ``records`` to the PYSMELLDICT ``tags`` in place, and return it.
+    ``tags`` may hold only some of the sections, the others are left alone.
+    """
+    latest = {}
+    for operation, module, partial in records:
+        latest[module] = operation == REPLACE and partial or None
+    if not latest:
+        return tags
+
+    inChanged = lambda name: _moduleOf(name) in latest
+    if 'CONSTANTS' in tags:
+        tags['CONSTANTS'][:] = [const for const in tags['CONSTANTS'] if not inChanged(const)]
+    if 'FUNCTIONS' in tags:
+        tags['FUNCTIONS'][:] = [func for func in tags['FUNCTIONS'] if not inChanged(func[0])]
+    if 'HIERARCHY' in tags:
+        tags['HIERARCHY'][:] = [module for module in tags['HIERARCHY'] if module not in latest]
+    for key in ('CLASSES', 'POINTERS'):
+        if key not in tags: continue
+        for name in [name for name in tags[key] if inChanged(name)]:
+            del tags[key][name]
+
+    for partial in latest.values():
+        if partial is None: continue
+        for key, value in partial.items():
+            if key not in tags: continue
+            if isinstance(value, dict):
+                tags[key].update(value)
+            else:
+                tags[key].extend(value)
+    return tags
+
+
+def logSize(tagsPath):
+    path = logPath(tagsPath)
+    return os.path.exists(path) and os.path.getsize(path) or 0
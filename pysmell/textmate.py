@@ -1,8 +1,9 @@
 import os
+import subprocess
 import sys
 from pysmell import idehelper
-from pysmell import tags as tags_module
-from pysmell import tm_dialog
+from pysmell import indexer
+from pysmell.tmclient import TOOLTIP, showCompletions
 
 
 #tm_support_path = os.environ['TM_SUPPORT_PATH'] + '/lib'
@@ -15,12 +16,26 @@ def write(word):
 
 
 def tags(projectDir):
-    args = ['pysmell', projectDir, '-o', os.path.join(projectDir, 'PYSMELLTAGS')]
-    sys.argv = args
-    tags_module.main()
-    write('PYSMELLTAGS created in %s' % projectDir)
-
-TOOLTIP = 206
+    "generate the tags of projectDir in the background, or show how far that has got"
+    output = os.path.join(projectDir, 'PYSMELLTAGS')
+    statusFile = indexer.statusPath(output)
+    status = indexer.readStatus(statusFile)
+    if indexer.isRunning(status):
+        if status['total']:
+            write('Generating PYSMELLTAGS: %d of %d files done' % (status['done'], status['total']))
+        else:
+            write('Generating PYSMELLTAGS: looking for files')
+        return
+    if status is not None and status['state'] == indexer.FAILED:
+        write('Generating PYSMELLTAGS failed last time: %s\n' % status['error'])
+    devnull = open(os.devnull, 'r+b')
+    try:
+        subprocess.Popen([sys.executable, '-c', 'from pysmell.tags import main; main()',
+                          'index', projectDir, '-o', output, '--status-file', statusFile],
+                         stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True, start_new_session=True)
+    finally:
+        devnull.close()
+    write('Generating PYSMELLTAGS in %s in the background - run this command again to see the progress' % projectDir)
 
 def main():
     cur_file = os.environ.get("TM_FILEPATH")
@@ -30,11 +45,12 @@ def main():
     if result is not None:
         sys.exit(result)
 
-def _main(cur_file, line_no, cur_col):
+def _main(cur_file, line_no, cur_col, source=None):
     if not cur_file:
         write('No filename - is the file saved?')
         return TOOLTIP
-    source = sys.stdin.read()
+    if source is None:
+        source = sys.stdin.read()
 
     PYSMELLDICT = idehelper.findPYSMELLDICT(cur_file)
     if PYSMELLDICT is None:
@@ -46,26 +62,4 @@ def _main(cur_file, line_no, cur_col):
 
     options = idehelper.detectCompletionType(cur_file, source, line_no, cur_col, base, PYSMELLDICT)
     completions = idehelper.findCompletions(base, PYSMELLDICT, options)
-
-    if not completions:
-        write('No completions found')
-        return TOOLTIP
-    if len(completions) == 1:
-        new_word = completions[0]['word']
-        write(new_word[len(base):])
-    elif len(completions) > 1:
-        dialogTuples = [
-            (
-              "%s - %s" % (comp.get('abbr', comp['word']), comp.get('menu', '')),
-              index)
-            for index, comp in enumerate(completions)
-        ]
-        try:
-            compIndex = tm_dialog.menu(dialogTuples)
-        except Exception as e:
-            import traceback
-            write(traceback.format_exc(e))
-            return TOOLTIP
-        if compIndex is not None:
-            write(completions[compIndex]['word'][len(base):])
-
+    return showCompletions(completions, base)
@@ -0,0 +1,180 @@
+# tmclient.py
+# Copyright (C) 2008 Orestis Markou
+# All rights reserved
+# E-mail: orestis@orestis.gr
+
+# http://orestis.gr
+
+# Released subject to the BSD License
+
+"""
+The Complete command of the TextMate bundle. Instead of loading the tags in
+a new interpreter every time, it hands the buffer to a ``pysmell serve``
+daemon listening on a unix socket (SOCKET, or $PYSMELL_SOCKET) and shows
+its answer. The daemon is started the first time, and keeps the tags and
+their indexes loaded for the following completions. If it can't be
+started, the completions are found here by textmate._main; a daemon that
+answers with an error, or too late, only gets its error shown.
+
+Only the standard library is imported here, so that the command starts fast.
+"""
+
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLTIP = 206
+# how long to wait for a daemon that was just started, and for an answer
+STARTUP = 5.0
+TIMEOUT = 10.0
+# the deadline of the requests, so that the daemon says when it gives up before we do
+DEADLINE = TIMEOUT - 1.0
+
+# where pysmell serve listens by default (see server.defaultSocket)
+SOCKET = os.path.join(tempfile.gettempdir(), 'pysmell-%s' % getattr(os, 'getuid', lambda: 'user')(), 'serve.sock')
+
+
+def write(word):
+    sys.stdout.write(word)
+
+
+def socketPath():
+    return os.environ.get('PYSMELL_SOCKET') or SOCKET
+
+
+def startDaemon(path):
+    "start a pysmell serve daemon on the unix socket at path, in the background, and return its Popen"
+    # the daemon creates the directory of its default socket
+    argv = path != SOCKET and ['--socket', path] or []
+    devnull = open(os.devnull, 'r+b')
+    try:
+        return subprocess.Popen([sys.executable, '-c',
+                                 'from pysmell.server import serveMain; serveMain(%r)' % argv],
+                                stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True,
+                                start_new_session=True)
+    finally:
+        devnull.close()
+
+
+def _isOurs(path):
+    "whether the default socket at path is in a directory only this user can use"
+    try:
+        info = os.lstat(os.path.dirname(path))
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+def _connect(path, wait, daemon=None):
+    """
+    A socket connected to the daemon at path, waiting up to ``wait`` seconds
+    for it to come up, unless ``daemon``, the Popen of the daemon being
+    started, exits before.
+    """
+    deadline = time.time() + wait
+    while True:
+        # anyone can create the directory of the default socket before the daemon does
+        if path != SOCKET or _isOurs(path):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client.connect(path)
+                return client
+            except socket.error:
+                client.close()
+        if time.time() >= deadline or (daemon is not None and daemon.poll() is not None):
+            return None
+        time.sleep(0.05)
+
+
+def askDaemon(request, path=None, start=True):
+    """
+    The answer of the daemon at path to request (see pysmell.server), or
+    None if there is no daemon and none could be started. A daemon that
+    doesn't answer within TIMEOUT gets an error answer instead.
+    """
+    path = path or socketPath()
+    client = _connect(path, 0)
+    if client is None and start:
+        try:
+            daemon = startDaemon(path)
+        except Exception:
+            # no python to run it with, or one too old for Popen's arguments
+            return None
+        client = _connect(path, STARTUP, daemon)
+    if client is None:
+        return None
+    try:
+        client.settimeout(TIMEOUT)
+        client.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        response = b''
+        while not response.endswith(b'\n'):
+            data = client.recv(65536)
+            if not data:
+                return {'id': request.get('id'), 'error': 'pysmell serve closed the connection'}
+            response += data
+    except socket.timeout:
+        return {'id': request.get('id'), 'error': 'pysmell serve did not answer within %ss' % TIMEOUT}
+    except socket.error as e:
+        return {'id': request.get('id'), 'error': 'pysmell serve: %s' % e}
+    finally:
+        client.close()
+    return json.loads(response.decode('utf-8'))
+
+
+def showCompletions(completions, base):
+    "write the rest of the only completion, or let the user pick one of them"
+    if not completions:
+        write('No completions found')
+        return TOOLTIP
+    if len(completions) == 1:
+        new_word = completions[0]['word']
+        write(new_word[len(base):])
+    elif len(completions) > 1:
+        from pysmell import tm_dialog
+        dialogTuples = [
+            (
+              "%s - %s" % (comp.get('abbr', comp['word']), comp.get('menu', '')),
+              index)
+            for index, comp in enumerate(completions)
+        ]
+        try:
+            compIndex = tm_dialog.menu(dialogTuples)
+        except Exception as e:
+            import traceback
+            write(traceback.format_exc(e))
+            return TOOLTIP
+        if compIndex is not None:
+            write(completions[compIndex]['word'][len(base):])
+
+
+def main():
+    cur_file = os.environ.get("TM_FILEPATH")
+    line_no = int(os.environ.get("TM_LINE_NUMBER"))
+    cur_col = int(os.environ.get("TM_LINE_INDEX"))
+    result = _main(cur_file, line_no, cur_col)
+    if result is not None:
+        sys.exit(result)
+
+
+def _main(cur_file, line_no, cur_col, path=None):
+    if not cur_file:
+        write('No filename - is the file saved?')
+        return TOOLTIP
+    source = sys.stdin.read()
+    request = {'id': 1, 'path': cur_file, 'source': source, 'line': line_no, 'column': cur_col,
+               'deadline': DEADLINE}
+    response = askDaemon(request, path)
+    if response is None:
+        from pysmell import textmate
+        return textmate._main(cur_file, line_no, cur_col, source)
+    if 'error' in response:
+        # loading the tags here again would only be slower
+        write(response['error'])
+        return TOOLTIP
+    line = source.splitlines()[line_no - 1]
+    return showCompletions(response['completions'], line[response['start']:cur_col])
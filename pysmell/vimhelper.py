@@ -6,6 +6,10 @@
 # http://orestis.gr
 
 # Released subject to the BSD License 
+
+from pysmell import idehelper
+
+
 def findWord(vim, origCol, origLine):
     # vim moves the cursor and deletes the text by the time we are called
     # so we need the original position and the original line...
@@ -18,4 +22,38 @@ def findWord(vim, origCol, origLine):
     cword = origLine[index:origCol]
     return cword
 
-    
+
+def toVimExpression(value):
+    "value, made of dicts, lists, strings and numbers, as a Vimscript expression"
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(['%s: %s' % (toVimExpression(key), toVimExpression(item))
+                                   for key, item in value.items()])
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join([toVimExpression(item) for item in value])
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    escaped = escaped.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+    return '"%s"' % escaped
+
+
+def setCompletions(vim, variable, completions):
+    """
+    Make the vim variable the list of completion dicts. Vims with bindeval
+    get the dicts handed over directly, the others parse them from a
+    Vimscript literal.
+    """
+    if hasattr(vim, 'bindeval'):
+        vim.command('let %s = []' % variable)
+        vim.bindeval(variable).extend(completions)
+    else:
+        vim.command('let %s = %s' % (variable, toVimExpression(completions)))
+
+
+def showDocstring(vim, fullPath, completion):
+    "echo the docstring of completion, a completion dict like v:completed_item"
+    docstring = idehelper.findCompletionDocstring(fullPath, completion)
+    if docstring:
+        vim.command('echo %s' % toVimExpression(docstring))
+    else:
+        vim.command('echo "No docstring found"')
@@ -38,7 +38,8 @@ setup(
     author_email = 'orestis@orestis.gr',
     packages = ['pysmell'],
     entry_points = {
-        'console_scripts': [ 'pysmell = pysmell.tags:main' ]
+        'console_scripts': [ 'pysmell = pysmell.tags:main',
+                             'pysmell-lsp = pysmell.lsp:main' ]
     },
     include_package_data = True,
     test_suite = "Tests",
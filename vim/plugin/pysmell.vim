@@ -19,6 +19,19 @@
 "        'smartass'
 "        'fuzzy-ci'
 "        'fuzzy-cs'
+"   g:pysmell_limit : show at most this many completions, default 200, 0 for all of them
+"   g:pysmell_async : set to 1 to complete in a background `pysmell serve --stdio`
+"        process (needs vim with +job and +channel). The omnifunc returns at once
+"        and the completions pop up when they are ready, unless the cursor has
+"        moved or the buffer changed meanwhile. Without +job, or if the process
+"        can't be started, completions are found in vim as before.
+"   g:pysmell_server_command : the command starting the background process,
+"        default ['pysmell', 'serve', '--stdio']
+"   g:pysmell_async_limit : how many completions the background process sends,
+"        g:pysmell_limit by default
+"
+" Commands:
+"   :PySmellDoc : show the docstring of the completion inserted last
                 
 
 if !has('python')
@@ -32,6 +45,18 @@ endif
 if !exists('g:pysmell_matcher')
     let g:pysmell_matcher='case-insensitive'
 endif
+if !exists('g:pysmell_limit')
+    let g:pysmell_limit = 200
+endif
+if !exists('g:pysmell_async')
+    let g:pysmell_async = 0
+endif
+if !exists('g:pysmell_server_command')
+    let g:pysmell_server_command = ['pysmell', 'serve', '--stdio']
+endif
+if !exists('g:pysmell_async_limit')
+    let g:pysmell_async_limit = g:pysmell_limit
+endif
 
 python << eopython
 import vim
@@ -40,9 +65,6 @@ try:
     vim.command('let g:pysmell_exists=1')
 except:
     pass
-   
-import string
-TRANSLATEQUOTES = string.maketrans("\'\"", "\"\'")
 eopython
 
 if !exists('g:pysmell_exists')
@@ -54,6 +76,11 @@ endif
 
 function! pysmell#Complete(findstart, base)
     "findstart = 1 when we need to get the text length
+    if a:findstart == 1 && g:pysmell_async && s:StartServer()
+        call s:RequestCompletions()
+        " leave completion mode, complete() shows the completions later
+        return -3
+    endif
     if a:findstart == 1
 python << eopython
 row, col = vim.current.window.cursor
@@ -82,8 +109,17 @@ eopython
 endfunction
 
 python << eopython
+PYSMELLSESSION = idehelper.CompletionSession()
+
 def vimcompletePYSMELL(origSource, origLineNo, origCol, base):
     fullPath = vim.current.buffer.name
+    matcher = vim.eval('g:pysmell_matcher')
+    limit = int(vim.eval('g:pysmell_limit')) or None
+    records = PYSMELLSESSION.lookup(fullPath, origSource, origLineNo, origCol, base, matcher)
+    if records is not None:
+        setVimCompletions(idehelper.toCompletionDicts(records[:limit], PYSMELLSESSION.options))
+        return
+
     PYSMELLDICT = idehelper.findPYSMELLDICT(fullPath)
     if not PYSMELLDICT:
         vim.command("echoerr 'No PYSMELLTAGS found. You have to generate one.'")
@@ -106,9 +142,79 @@ def vimcompletePYSMELL(origSource, origLineNo, origCol, base):
                 b.append("%r" % options)
                 break
 
-    completions = idehelper.findCompletions(base, PYSMELLDICT, options, vim.eval('g:pysmell_matcher'))
-    output = repr(completions)
-    translated = output.translate(TRANSLATEQUOTES)
-    vim.command('let g:pysmell_completions = %s' % (translated, ))
+    records = idehelper.findCompletionRecords(base, PYSMELLDICT, options, matcher)
+    PYSMELLSESSION.store(fullPath, origSource, origLineNo, origCol, base, matcher, options, records)
+    setVimCompletions(idehelper.toCompletionDicts(records[:limit], options))
+
+def setVimCompletions(completions):
+    vimhelper.setCompletions(vim, 'g:pysmell_completions', completions)
 
 eopython
+
+function! pysmell#Docstring()
+python << eopython
+vimhelper.showDocstring(vim, vim.current.buffer.name, vim.eval('v:completed_item'))
+eopython
+endfunction
+
+command! PySmellDoc call pysmell#Docstring()
+
+
+" Asynchronous completion: requests go to a `pysmell serve --stdio` job, one
+" JSON object per line (see pysmell/server.py), and only the answer to the
+" last request is shown.
+
+let s:job = 0
+let s:lastId = 0
+let s:pending = {}
+
+function! s:StartServer()
+    if !has('job') || !has('channel')
+        return 0
+    endif
+    if type(s:job) == v:t_job && job_status(s:job) == 'run'
+        return 1
+    endif
+    let s:job = job_start(g:pysmell_server_command, {
+                \ 'in_mode': 'nl', 'out_mode': 'nl', 'err_io': 'null',
+                \ 'out_cb': function('s:OnResponse')})
+    return job_status(s:job) == 'run'
+endfunction
+
+function! s:RequestCompletions()
+    let l:col = col('.') - 1
+python << eopython
+row, col = vim.current.window.cursor
+vim.command('let l:start = %d' % idehelper.findBase(vim.current.buffer[row-1], col))
+eopython
+    let s:lastId += 1
+    let s:pending = {'id': s:lastId, 'buffer': bufnr('%'), 'line': line('.'), 'col': col('.'),
+                \ 'tick': b:changedtick, 'start': l:start + 1}
+    let l:request = {'id': s:lastId, 'path': expand('%:p'), 'source': join(getline(1, '$'), "\n"),
+                \ 'line': line('.'), 'column': l:col, 'matcher': g:pysmell_matcher,
+                \ 'limit': g:pysmell_async_limit ? g:pysmell_async_limit : v:null}
+    call ch_sendraw(job_getchannel(s:job), json_encode(l:request) . "\n")
+endfunction
+
+function! s:OnResponse(channel, message)
+    let l:response = json_decode(a:message)
+    if empty(s:pending) || l:response.id != s:pending.id
+        return
+    endif
+    let l:pending = s:pending
+    let s:pending = {}
+    " drop the answer if the cursor moved or the buffer changed since the request
+    if mode() !~# '^i' || bufnr('%') != l:pending.buffer || line('.') != l:pending.line
+                \ || col('.') != l:pending.col || b:changedtick != l:pending.tick
+        return
+    endif
+    if has_key(l:response, 'error')
+        if g:pysmell_debug
+            echomsg 'pysmell: ' . l:response.error
+        endif
+        return
+    endif
+    if !empty(l:response.completions)
+        call complete(l:pending.start, l:response.completions)
+    endif
+endfunction